@@ -0,0 +1,58 @@
+"""Compare per-call cost of PSL-aware normalize_domain with the old split/join.
+
+Run from backend/: python benchmarks/bench_normalize_domain.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.parsing import normalize_domain  # noqa: E402
+from services.public_suffix import SUFFIX_LIST_PATH, load_trie  # noqa: E402
+
+CALLS = 200_000
+
+
+def split_join(domain: str) -> str:
+    parts = [p for p in domain.split(".") if p]
+    if len(parts) <= 2:
+        return domain
+    return ".".join(parts[-2:])
+
+
+def sample_domains(count: int) -> list[str]:
+    rng = random.Random(7)
+    suffixes = ["com", "co.uk", "com.au", "github.io", "io", "de", "co.jp"]
+    prefixes = ["mail", "news", "accounts", "no-reply.mail", ""]
+    domains = []
+    for i in range(count):
+        prefix = rng.choice(prefixes)
+        host = f"brand{i}.{rng.choice(suffixes)}"
+        domains.append(f"{prefix}.{host}" if prefix else host)
+    return domains
+
+
+def per_call_ns(func, domains: list[str]) -> float:
+    start = time.perf_counter_ns()
+    for i in range(CALLS):
+        func(domains[i % len(domains)])
+    return (time.perf_counter_ns() - start) / CALLS
+
+
+def main() -> None:
+    start = time.perf_counter()
+    load_trie(SUFFIX_LIST_PATH)
+    print(f"trie build: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # A scan sees a few hundred distinct sender hosts, repeated many times.
+    domains = sample_domains(500)
+    print(f"split/join:             {per_call_ns(split_join, domains):7.0f} ns/call")
+    normalize_domain.cache_clear()
+    print(f"psl (uncached):         {per_call_ns(normalize_domain.__wrapped__, domains):7.0f} ns/call")
+    print(f"psl (lru, warm):        {per_call_ns(normalize_domain, domains):7.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Serialize 10k ServiceAccount rows: the old ORM + jsonable_encoder + json.dumps path vs the new ones.
+
+- orm+jsonable: what FastAPI did when list_services returned SQLModel objects.
+- response model: pydantic's dump_json over ServiceAccountRead, as for GET /services/{id}.
+- rows+orjson: column dicts from fetch_page encoded by cached_response.
+
+Run from backend/: python benchmarks/bench_serialization.py
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import orjson  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from models.service_account import ServiceAccount, ServiceAccountRead  # noqa: E402
+
+ROWS = 10_000
+ROUNDS = 5
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+ADAPTER = TypeAdapter(list[ServiceAccountRead])
+
+
+def sample_services(count: int) -> list[ServiceAccount]:
+    return [
+        ServiceAccount(
+            id=i,
+            user_id=1,
+            service_name=f"Service {i}",
+            domain=f"service{i}.example.com",
+            first_seen_at=T0 + timedelta(minutes=i),
+            last_seen_at=T0 + timedelta(hours=i),
+            evidence_count=i % 97,
+        )
+        for i in range(count)
+    ]
+
+
+def orm_jsonable(services: list[ServiceAccount]) -> bytes:
+    return json.dumps(jsonable_encoder(services)).encode()
+
+
+def response_model(services: list[ServiceAccount]) -> bytes:
+    return ADAPTER.dump_json(services)
+
+
+def rows_orjson(rows: list[dict]) -> bytes:
+    return orjson.dumps({"items": rows, "next_cursor": None})
+
+
+def best_ms(func, *args) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    services = sample_services(ROWS)
+    columns = list(ServiceAccountRead.model_fields)
+    rows = [{name: getattr(service, name) for name in columns} for service in services]
+    projected = [{"id": row["id"], "domain": row["domain"]} for row in rows]
+    print(f"{ROWS} rows")
+    for label, func, data in (
+        ("orm + jsonable_encoder + json", orm_jsonable, services),
+        ("response model dump_json", response_model, services),
+        ("rows + orjson", rows_orjson, rows),
+        ("rows + orjson, fields=id,domain", rows_orjson, projected),
+    ):
+        size = len(func(data))
+        print(f"{label:32s} {best_ms(func, data):8.1f} ms  {size / 1024:7.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,195 @@
+from typing import Any, Dict, List
+from sqlalchemy import delete, exists, func, inspect, select, update
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models.email_connection import EmailConnection
+from models.privacy_request import PrivacyRequest
+from models.service_account import ServiceAccount
+from services.parsing import normalize_domain
+from services.public_suffix import is_public_suffix
 from settings import settings
 
-engine = create_engine(settings.database_url, echo=False)
+
+def engine_options(database_url: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle_seconds,
+    }
+    # SQLite (tests, local dev) uses SQLAlchemy's own pool defaults.
+    if make_url(database_url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout_seconds,
+        )
+    return options
+
+
+def async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() != "asyncpg":
+        # psycopg 3 ships both drivers; SQLAlchemy picks its async dialect for async engines.
+        return url.set(drivername="postgresql+psycopg").render_as_string(hide_password=False)
+    return database_url
+
+
+engine = create_engine(settings.database_url, echo=False, **engine_options(settings.database_url))
+async_engine = create_async_engine(
+    async_database_url(settings.database_url),
+    echo=False,
+    **engine_options(settings.database_url),
+)
+
+
+def add_missing_columns(bind: Engine) -> None:
+    """Add nullable model columns that an existing table was created without.
+
+    create_all only creates missing tables, so columns added to a model later (e.g. the
+    EmailConnection checkpoint and watch fields) are added here, along with their indexes.
+    """
+    with bind.begin() as connection:
+        inspector = inspect(connection)
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            added = [c for c in table.columns if c.name not in existing and c.nullable]
+            for column in added:
+                column_type = column.type.compile(dialect=connection.dialect)
+                connection.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+                )
+            added_names = {column.name for column in added}
+            for index in table.indexes:
+                if {column.name for column in index.columns} <= added_names:
+                    index.create(connection)
+
+
+def merge_duplicate_services(connection: Connection) -> int:
+    """Fold repeated (user_id, domain) ServiceAccount rows into the oldest one.
+
+    Their evidence is summed and privacy requests are moved to the kept row. Returns the
+    number of domains that had duplicates.
+    """
+    table = ServiceAccount.__table__
+    duplicates = connection.execute(
+        select(table.c.user_id, table.c.domain)
+        .group_by(table.c.user_id, table.c.domain)
+        .having(func.count() > 1)
+    ).all()
+    for user_id, domain in duplicates:
+        _fold_services(connection, user_id, [domain])
+    return len(duplicates)
+
+
+def _fold_services(connection: Connection, user_id: int, domains: List[str]) -> int:
+    """Fold a user's rows for any of `domains` into the oldest one and return its id."""
+    table = ServiceAccount.__table__
+    rows = connection.execute(
+        select(table)
+        .where(table.c.user_id == user_id, table.c.domain.in_(domains))
+        .order_by(table.c.id)
+    ).all()
+    kept, extra_ids = rows[0].id, [row.id for row in rows[1:]]
+    if not extra_ids:
+        return kept
+    connection.execute(
+        update(table)
+        .where(table.c.id == kept)
+        .values(
+            first_seen_at=min(row.first_seen_at for row in rows),
+            last_seen_at=max(row.last_seen_at for row in rows),
+            evidence_count=sum(row.evidence_count for row in rows),
+        )
+    )
+    requests = PrivacyRequest.__table__
+    connection.execute(
+        update(requests)
+        .where(requests.c.service_account_id.in_(extra_ids))
+        .values(service_account_id=kept)
+    )
+    connection.execute(delete(table).where(table.c.id.in_(extra_ids)))
+    return kept
+
+
+def rekey_service_domains(bind: Engine) -> None:
+    """Move ServiceAccount rows stored under the old last-two-labels key to today's key.
+
+    Keys that normalize_domain now derives differently are renamed, merging into any row
+    newer scans created for the same domain. Keys that are a bare public suffix (e.g.
+    "co.uk" for mail.example.co.uk) lost the registrable label and cannot be re-derived:
+    those rows are dropped unless a privacy request refers to them, and the owner's scan
+    checkpoint is cleared so the next scan is a full one that rebuilds them. Once done
+    this is a no-op.
+    """
+    table = ServiceAccount.__table__
+    requests = PrivacyRequest.__table__
+    with bind.begin() as connection:
+        domains = connection.execute(select(table.c.domain).distinct()).scalars().all()
+        for old in domains:
+            new = normalize_domain(old)
+            if new == old:
+                continue
+            user_ids = connection.execute(
+                select(table.c.user_id).where(table.c.domain == old).distinct()
+            ).scalars().all()
+            for user_id in user_ids:
+                # Merge first so the rename cannot collide with the unique index.
+                kept = _fold_services(connection, user_id, [old, new])
+                connection.execute(update(table).where(table.c.id == kept).values(domain=new))
+
+        keys = {normalize_domain(domain) for domain in domains}
+        suffixes = [key for key in keys if "." in key and is_public_suffix(key)]
+        if not suffixes:
+            return
+        stale = connection.execute(
+            select(table.c.id, table.c.user_id).where(
+                table.c.domain.in_(suffixes),
+                ~exists().where(requests.c.service_account_id == table.c.id),
+            )
+        ).all()
+        if not stale:
+            return
+        connection.execute(delete(table).where(table.c.id.in_([row.id for row in stale])))
+        connections = EmailConnection.__table__
+        connection.execute(
+            update(connections)
+            .where(connections.c.user_id.in_({row.user_id for row in stale}))
+            .values(history_id=None)
+        )
+
+
+def add_service_domain_index(bind: Engine) -> None:
+    """Add the (user_id, domain) unique index scans upsert on to a table that predates it.
+
+    create_all skips indexes on existing tables, and the old per-message upsert could leave
+    duplicate rows that would block the index, so those are merged first.
+    """
+    table = ServiceAccount.__table__
+    index = next(i for i in table.indexes if i.name == "ix_serviceaccount_user_id_domain")
+    with bind.begin() as connection:
+        if index.name in {i["name"] for i in inspect(connection).get_indexes(table.name)}:
+            return
+        merge_duplicate_services(connection)
+        index.create(connection)
 
 
 def init_db() -> None:
     SQLModel.metadata.create_all(engine)
+    add_missing_columns(engine)
+    rekey_service_domains(engine)
+    add_service_domain_index(engine)
 
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
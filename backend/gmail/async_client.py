@@ -0,0 +1,194 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+import httpx
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from gmail.client import (
+    GMAIL_ROOT_URL,
+    LIST_PAGE_LIMIT,
+    METADATA_HEADERS,
+    NON_IDEMPOTENT_METHODS,
+    QUOTA_UNITS,
+    BatchResult,
+    HistoryExpiredError,
+    HistoryPage,
+    build_send_payload,
+    history_messages,
+)
+from gmail.mime import compact_message
+from settings import settings
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=settings.gmail_timeout_seconds,
+            limits=httpx.Limits(
+                max_connections=settings.gmail_max_connections,
+                max_keepalive_connections=settings.gmail_max_connections,
+            ),
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+class AsyncGmailClient:
+    def __init__(
+        self,
+        credentials: Credentials,
+        api_endpoint: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        governor: Optional[Any] = None,
+    ):
+        self._credentials = credentials
+        self._governor = governor
+        self._base_url = f"{(api_endpoint or GMAIL_ROOT_URL).rstrip('/')}/gmail/v1/users/me"
+        self._http = http_client or get_http_client()
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.gmail_max_concurrency)
+        self._refresh_lock = asyncio.Lock()
+
+    async def _refresh(self, force: bool = False) -> None:
+        async with self._refresh_lock:
+            if force or not self._credentials.valid:
+                await asyncio.to_thread(self._credentials.refresh, Request())
+
+    async def _send(self, method: str, path: str, **kwargs: Any) -> httpx.Response:
+        headers: Dict[str, str] = {}
+        self._credentials.apply(headers)
+        return await self._http.request(
+            method, f"{self._base_url}{path}", headers=headers, **kwargs
+        )
+
+    async def _request(self, api_method: str, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        if self._governor is None:
+            return await self._call(method, path, **kwargs)
+        return await self._governor.execute_async(
+            lambda: self._call(method, path, **kwargs),
+            QUOTA_UNITS[api_method],
+            api_method not in NON_IDEMPOTENT_METHODS,
+        )
+
+    async def _call(self, method: str, path: str, **kwargs: Any) -> Dict[str, Any]:
+        async with self._semaphore:
+            if not self._credentials.valid:
+                await self._refresh()
+            response = await self._send(method, path, **kwargs)
+            if response.status_code == 401:
+                await self._refresh(force=True)
+                response = await self._send(method, path, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+    async def list_candidate_messages(
+        self, query: str, max_results: int = 200
+    ) -> List[Dict[str, Any]]:
+        return [
+            message
+            async for message in self.iter_candidate_messages(
+                query, page_size=max_results, limit=max_results
+            )
+        ]
+
+    async def iter_candidate_messages(
+        self, query: str, page_size: int = 100, limit: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        page_size = max(1, min(page_size, LIST_PAGE_LIMIT))
+        page_token: Optional[str] = None
+        yielded = 0
+        while limit is None or yielded < limit:
+            params: Dict[str, Any] = {"q": query}
+            params["maxResults"] = page_size if limit is None else min(page_size, limit - yielded)
+            if page_token:
+                params["pageToken"] = page_token
+            result = await self._request("messages.list", "GET", "/messages", params=params)
+            for message in result.get("messages", []):
+                yield message
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return
+
+    async def get_profile(self) -> Dict[str, Any]:
+        return await self._request("getProfile", "GET", "/profile")
+
+    async def iter_history(
+        self, start_history_id: str, page_size: int = LIST_PAGE_LIMIT
+    ) -> AsyncIterator[HistoryPage]:
+        page_size = max(1, min(page_size, LIST_PAGE_LIMIT))
+        history_id = start_history_id
+        page_token: Optional[str] = None
+        while True:
+            params: Dict[str, Any] = {
+                "startHistoryId": start_history_id,
+                "historyTypes": "messageAdded",
+                "maxResults": page_size,
+            }
+            if page_token:
+                params["pageToken"] = page_token
+            try:
+                result = await self._request("history.list", "GET", "/history", params=params)
+            except httpx.HTTPStatusError as exc:
+                if exc.response.status_code == 404:
+                    raise HistoryExpiredError(start_history_id) from exc
+                raise
+            history_id = result.get("historyId", history_id)
+            yield history_messages(result), history_id
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return
+
+    async def get_message_metadata(
+        self, message_id: str, headers: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"format": "metadata"}
+        if headers:
+            params["metadataHeaders"] = headers
+        return await self._request("messages.get", "GET", f"/messages/{message_id}", params=params)
+
+    async def get_messages_metadata_batch(
+        self, message_ids: Iterable[str], headers: Optional[List[str]] = None
+    ) -> BatchResult:
+        metadata_headers = headers if headers is not None else METADATA_HEADERS
+        ids = list(dict.fromkeys(i for i in message_ids if i))
+        responses = await asyncio.gather(
+            *(self.get_message_metadata(i, metadata_headers) for i in ids),
+            return_exceptions=True,
+        )
+        result = BatchResult()
+        for message_id, response in zip(ids, responses):
+            if isinstance(response, Exception):
+                result.errors[message_id] = response
+            else:
+                result.items[message_id] = response
+        return result
+
+    async def send_email(
+        self, to: str, subject: str, body: str, thread_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        payload = build_send_payload(to, subject, body, thread_id)
+        return await self._request("messages.send", "POST", "/messages/send", json=payload)
+
+    async def list_thread_messages(
+        self, thread_id: str, body_max_bytes: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        message_format = "metadata" if body_max_bytes is None else "full"
+        thread = await self._request(
+            "threads.get", "GET", f"/threads/{thread_id}", params={"format": message_format}
+        )
+        messages = thread.get("messages", [])
+        if body_max_bytes is None:
+            return messages
+        return [compact_message(m, body_max_bytes) for m in messages]
@@ -1,51 +1,241 @@
-from typing import List, Optional, Dict, Any
+import json
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import BatchHttpRequest
+from gmail.mime import compact_message
+
+GMAIL_ROOT_URL = "https://gmail.googleapis.com/"
+BATCH_PATH = "batch/gmail/v1"
+BATCH_LIMIT = 100
+LIST_PAGE_LIMIT = 500
+METADATA_HEADERS = ["From", "Subject", "Date"]
+SKIPPED_HISTORY_LABELS = {"DRAFT", "SPAM", "TRASH"}
+
+# Gmail API quota units per method, see https://developers.google.com/gmail/api/reference/quota
+QUOTA_UNITS = {
+    "getProfile": 1,
+    "history.list": 2,
+    "messages.get": 5,
+    "messages.list": 5,
+    "messages.send": 100,
+    "threads.get": 10,
+    "watch": 100,
+}
+# Methods a retry could execute twice, so only rate-limit rejections are retried.
+NON_IDEMPOTENT_METHODS = {"messages.send"}
+
+
+# Messages added on one history.list page, and the mailbox historyId it reported.
+HistoryPage = Tuple[List[Dict[str, Any]], str]
+
+
+class HistoryExpiredError(Exception):
+    pass
+
+
+@lru_cache(maxsize=1)
+def gmail_discovery_document() -> Dict[str, Any]:
+    return json.loads(discovery_cache.get_static_doc("gmail", "v1"))
+
+
+def history_messages(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    added: Dict[str, Dict[str, Any]] = {}
+    for record in result.get("history", []):
+        for entry in record.get("messagesAdded", []):
+            message = entry.get("message", {})
+            labels = set(message.get("labelIds", []))
+            if message.get("id") and not labels & SKIPPED_HISTORY_LABELS:
+                added[message["id"]] = message
+    return list(added.values())
+
+
+def build_send_payload(
+    to: str, subject: str, body: str, thread_id: Optional[str] = None
+) -> Dict[str, Any]:
+    import base64
+    from email.mime.text import MIMEText
+
+    message = MIMEText(body)
+    message["to"] = to
+    message["subject"] = subject
+    raw = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
+    payload: Dict[str, Any] = {"raw": raw}
+    if thread_id:
+        payload["threadId"] = thread_id
+    return payload
+
+
+@dataclass
+class BatchResult:
+    items: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    errors: Dict[str, Exception] = field(default_factory=dict)
 
 
 class GmailClient:
-    def __init__(self, credentials: Credentials):
-        self._service = build("gmail", "v1", credentials=credentials, cache_discovery=False)
+    def __init__(
+        self,
+        credentials: Credentials,
+        api_endpoint: Optional[str] = None,
+        governor: Optional[Any] = None,
+    ):
+        self._credentials = credentials
+        self._api_endpoint = api_endpoint
+        self._governor = governor
+        root_url = api_endpoint or GMAIL_ROOT_URL
+        client_options = {"api_endpoint": root_url} if api_endpoint else None
+        self._service = build_from_document(
+            gmail_discovery_document(),
+            credentials=credentials,
+            client_options=client_options,
+        )
+        self._batch_uri = f"{root_url.rstrip('/')}/{BATCH_PATH}"
 
-    def list_candidate_messages(self, query: str, max_results: int = 200) -> List[Dict[str, Any]]:
-        result = (
-            self._service.users()
-            .messages()
-            .list(userId="me", q=query, maxResults=max_results)
-            .execute()
+    def clone(self) -> "GmailClient":
+        return GmailClient(self._credentials, self._api_endpoint, self._governor)
+
+    def _execute(self, request: Any, method: str) -> Dict[str, Any]:
+        if self._governor is None:
+            return request.execute()
+        return self._governor.execute(
+            request.execute, QUOTA_UNITS[method], method not in NON_IDEMPOTENT_METHODS
         )
-        return result.get("messages", [])
+
+    def list_candidate_messages(self, query: str, max_results: int = 200) -> List[Dict[str, Any]]:
+        return list(self.iter_candidate_messages(query, page_size=max_results, limit=max_results))
+
+    def iter_candidate_messages(
+        self, query: str, page_size: int = 100, limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        page_size = max(1, min(page_size, LIST_PAGE_LIMIT))
+        page_token: Optional[str] = None
+        yielded = 0
+        while limit is None or yielded < limit:
+            max_results = page_size if limit is None else min(page_size, limit - yielded)
+            request = (
+                self._service.users()
+                .messages()
+                .list(userId="me", q=query, maxResults=max_results, pageToken=page_token)
+            )
+            result = self._execute(request, "messages.list")
+            for message in result.get("messages", []):
+                yield message
+                yielded += 1
+                if limit is not None and yielded >= limit:
+                    return
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return
+
+    def get_profile(self) -> Dict[str, Any]:
+        return self._execute(self._service.users().getProfile(userId="me"), "getProfile")
+
+    def watch(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        body = {"topicName": topic_name, "labelIds": label_ids or ["INBOX"]}
+        return self._execute(self._service.users().watch(userId="me", body=body), "watch")
+
+    def iter_history(
+        self, start_history_id: str, page_size: int = LIST_PAGE_LIMIT
+    ) -> Iterator[HistoryPage]:
+        """Yield the messages added on each history page with the historyId it reported."""
+        page_size = max(1, min(page_size, LIST_PAGE_LIMIT))
+        history_id = start_history_id
+        page_token: Optional[str] = None
+        while True:
+            request = (
+                self._service.users()
+                .history()
+                .list(
+                    userId="me",
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    maxResults=page_size,
+                    pageToken=page_token,
+                )
+            )
+            try:
+                result = self._execute(request, "history.list")
+            except HttpError as exc:
+                if exc.resp.status == 404:
+                    raise HistoryExpiredError(start_history_id) from exc
+                raise
+            history_id = result.get("historyId", history_id)
+            yield history_messages(result), history_id
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return
 
     def get_message_metadata(self, message_id: str) -> Dict[str, Any]:
-        return (
-            self._service.users()
-            .messages()
-            .get(userId="me", id=message_id, format="metadata")
-            .execute()
-        )
+        request = self._service.users().messages().get(userId="me", id=message_id, format="metadata")
+        return self._execute(request, "messages.get")
+
+    def get_messages_metadata_batch(
+        self,
+        message_ids: Iterable[str],
+        headers: Optional[List[str]] = None,
+        batch_size: int = BATCH_LIMIT,
+    ) -> BatchResult:
+        if not 0 < batch_size <= BATCH_LIMIT:
+            raise ValueError(f"batch_size must be between 1 and {BATCH_LIMIT}")
+        metadata_headers = headers if headers is not None else METADATA_HEADERS
+        ids = list(dict.fromkeys(i for i in message_ids if i))
+        result = BatchResult()
+
+        def on_response(request_id: str, response: Dict[str, Any], exception: Exception | None):
+            if exception is not None:
+                result.errors[request_id] = exception
+            else:
+                result.items[request_id] = response
+
+        messages = self._service.users().messages()
+        for start in range(0, len(ids), batch_size):
+            pending = ids[start : start + batch_size]
+            attempt = 0
+            while pending:
+                batch = BatchHttpRequest(callback=on_response, batch_uri=self._batch_uri)
+                for message_id in pending:
+                    request = messages.get(
+                        userId="me",
+                        id=message_id,
+                        format="metadata",
+                        metadataHeaders=metadata_headers,
+                    )
+                    batch.add(request, request_id=message_id)
+                if self._governor is None:
+                    batch.execute()
+                    break
+                self._governor.execute(batch.execute, QUOTA_UNITS["messages.get"] * len(pending))
+                pending = [
+                    i for i in pending
+                    if i in result.errors and self._governor.should_retry(result.errors[i], attempt)
+                ]
+                if pending:
+                    for message_id in pending:
+                        del result.errors[message_id]
+                    time.sleep(self._governor.backoff(attempt))
+                    attempt += 1
+        return result
 
     def send_email(
         self, to: str, subject: str, body: str, thread_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        import base64
-        from email.mime.text import MIMEText
-
-        message = MIMEText(body)
-        message["to"] = to
-        message["subject"] = subject
-        raw = base64.urlsafe_b64encode(message.as_bytes()).decode("utf-8")
-        payload: Dict[str, Any] = {"raw": raw}
-        if thread_id:
-            payload["threadId"] = thread_id
-        return (
-            self._service.users().messages().send(userId="me", body=payload).execute()
-        )
+        payload = build_send_payload(to, subject, body, thread_id)
+        request = self._service.users().messages().send(userId="me", body=payload)
+        return self._execute(request, "messages.send")
 
-    def list_thread_messages(self, thread_id: str) -> List[Dict[str, Any]]:
-        thread = (
-            self._service.users()
-            .threads()
-            .get(userId="me", id=thread_id, format="metadata")
-            .execute()
-        )
-        return thread.get("messages", [])
+    def list_thread_messages(
+        self, thread_id: str, body_max_bytes: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Thread messages as metadata, or with a capped text/plain body when body_max_bytes is set."""
+        message_format = "metadata" if body_max_bytes is None else "full"
+        request = self._service.users().threads().get(userId="me", id=thread_id, format=message_format)
+        thread = self._execute(request, "threads.get")
+        messages = thread.get("messages", [])
+        if body_max_bytes is None:
+            return messages
+        return [compact_message(m, body_max_bytes) for m in messages]
@@ -0,0 +1,78 @@
+import binascii
+import codecs
+import re
+from typing import Any, Dict, Iterator, List
+
+URLSAFE_TO_STANDARD = bytes.maketrans(b"-_", b"+/")
+# Multiple of 4, so every slice but the last is a whole number of base64 quanta.
+DECODE_SLICE = 64 * 1024
+CHARSET_PATTERN = re.compile(r'charset="?([\w.:-]+)', re.IGNORECASE)
+
+
+def decode_base64url(data: str, limit: int) -> bytes:
+    """Decode at most `limit` bytes from the start of base64url `data`.
+
+    Only the prefix that can produce `limit` bytes is touched, a slice at a time, so a
+    multi-MB body costs no more than the cap.
+    """
+    if limit <= 0:
+        return b""
+    needed = min(len(data), -(-limit // 3) * 4)
+    buffer = bytearray()
+    for start in range(0, needed, DECODE_SLICE):
+        piece = data[start : min(start + DECODE_SLICE, needed)].encode("ascii", "ignore")
+        piece = piece.translate(URLSAFE_TO_STANDARD)
+        try:
+            buffer += binascii.a2b_base64(piece + b"=" * (-len(piece) % 4))
+        except binascii.Error:
+            break
+    del buffer[limit:]
+    return bytes(buffer)
+
+
+def _charset(part: Dict[str, Any]) -> str:
+    for header in part.get("headers", []):
+        if header.get("name", "").lower() == "content-type":
+            match = CHARSET_PATTERN.search(header.get("value", ""))
+            if match:
+                try:
+                    return codecs.lookup(match.group(1)).name
+                except LookupError:
+                    break
+    return "utf-8"
+
+
+def iter_text_parts(part: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    body = part.get("body", {})
+    if part.get("filename") or body.get("attachmentId"):
+        return
+    if part.get("mimeType") == "text/plain" and body.get("data"):
+        yield part
+    for child in part.get("parts", []):
+        yield from iter_text_parts(child)
+
+
+def extract_plain_text(payload: Dict[str, Any], max_bytes: int) -> str:
+    """text/plain body of a format=full message, capped at `max_bytes` decoded bytes."""
+    texts: List[str] = []
+    remaining = max_bytes
+    for part in iter_text_parts(payload):
+        if remaining <= 0:
+            break
+        raw = decode_base64url(part["body"]["data"], remaining)
+        remaining -= len(raw)
+        # A cap can cut a multi-byte character in half; drop the fragment.
+        texts.append(raw.decode(_charset(part), "ignore"))
+    return "\n".join(texts)
+
+
+def compact_message(message: Dict[str, Any], max_bytes: int) -> Dict[str, Any]:
+    """Keep headers, snippet and the capped plain-text body; drop every other part."""
+    payload = message.get("payload", {})
+    return {
+        "id": message.get("id"),
+        "threadId": message.get("threadId"),
+        "snippet": message.get("snippet", ""),
+        "payload": {"headers": payload.get("headers", [])},
+        "body_text": extract_plain_text(payload, max_bytes),
+    }
@@ -1,15 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from db import init_db
+from db import async_engine, engine, init_db
+from gmail.async_client import close_http_client
 from routers.auth import router as auth_router
 from routers.gmail import router as gmail_router
 from routers.services import router as services_router
 from routers.requests import router as requests_router
+from services.redis_client import close_redis
+from services.templates import get_template_registry
 from settings import settings
 from dotenv import load_dotenv
 load_dotenv()
 
-app = FastAPI(title="ZeroFootprint API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    get_template_registry()
+    yield
+    await close_http_client()
+    close_redis()
+    engine.dispose()
+    await async_engine.dispose()
+
+
+app = FastAPI(title="ZeroFootprint API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,11 +36,6 @@ app.add_middleware(
 )
 
 
-@app.on_event("startup")
-def on_startup() -> None:
-    init_db()
-
-
 @app.get("/")
 def root():
     return {"status": "ok"}
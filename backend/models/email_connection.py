@@ -10,4 +10,8 @@ class EmailConnection(SQLModel, table=True):
     provider: str = Field(index=True)
     refresh_token_encrypted: str
     scope: str
+    email_address: Optional[str] = Field(default=None, index=True)
+    history_id: Optional[str] = None
+    last_scan_at: Optional[datetime] = None
+    watch_expires_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=utcnow)
@@ -1,10 +1,25 @@
 from typing import Optional
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from models.base import utcnow
 
 
 class PrivacyRequest(SQLModel, table=True):
+    __table_args__ = (
+        # Covers GET /requests keyset pages, so Postgres can answer them index-only.
+        Index(
+            "ix_privacyrequest_user_id_updated_at_id",
+            "user_id",
+            "updated_at",
+            "id",
+            postgresql_include=["service_account_id", "request_type", "status", "created_at"],
+        ),
+        Index(
+            "ix_privacyrequest_user_id_status_updated_at_id", "user_id", "status", "updated_at", "id"
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(index=True)
     service_account_id: int = Field(index=True)
@@ -1,10 +1,23 @@
 from typing import Optional
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from models.base import utcnow
 
 
 class ServiceAccount(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_serviceaccount_user_id_domain", "user_id", "domain", unique=True),
+        # Covers GET /services keyset pages, so Postgres can answer them index-only.
+        Index(
+            "ix_serviceaccount_user_id_last_seen_at_id",
+            "user_id",
+            "last_seen_at",
+            "id",
+            postgresql_include=["service_name", "domain", "first_seen_at", "evidence_count"],
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(index=True)
     service_name: str
@@ -12,3 +25,14 @@ class ServiceAccount(SQLModel, table=True):
     first_seen_at: datetime = Field(default_factory=utcnow)
     last_seen_at: datetime = Field(default_factory=utcnow)
     evidence_count: int = 0
+
+
+class ServiceAccountRead(SQLModel):
+    """What the API exposes for a service; user_id stays server-side."""
+
+    id: int
+    service_name: str
+    domain: str
+    first_seen_at: datetime
+    last_seen_at: datetime
+    evidence_count: int
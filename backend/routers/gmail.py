@@ -1,21 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import RedirectResponse
+import asyncio
+import hmac
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse, StreamingResponse
 from google_auth_oauthlib.flow import Flow
 from sqlmodel import Session, select
 from uuid import uuid4
-from db import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import get_async_session, get_session
 from models.email_connection import EmailConnection
 from models.user import User
 from security.crypto import encrypt_text
-from security.deps import get_current_user
+from security.deps import get_current_user, idempotent, replayed_response
+from security.dev_api import require_dev_api_key
 from services.redis_client import get_redis
-from services.rate_limit import enforce_rate_limit, RateLimitError
-from services.gmail_service import get_gmail_client
-from services.scan import build_scan_query, collect_services
+from services.gmail_quota import governor
+from services.idempotency import IdempotentCall
+from services.gmail_service import (
+    get_async_gmail_client,
+    get_gmail_client,
+    invalidate_gmail_client,
+)
+from services.bulk_scan import bulk_scan_report, resume_bulk_scan, start_bulk_scan
+from services.jobs import SYNC_QUEUE, get_queue
+from services.push import handle_notification, parse_push_envelope, register_watch
+from services.scan import ScanCancelled, scan_mailbox_async
+from services.scan_status import (
+    TERMINAL_STATUSES,
+    ScanProgress,
+    claim_scan_job,
+    get_scan_job,
+    request_cancel,
+    scan_job_events,
+    start_scan_job,
+)
 from gmail.auth import GMAIL_SCOPES
 from settings import settings
 
 router = APIRouter(prefix="/gmail", tags=["gmail"])
+logger = logging.getLogger(__name__)
 
 
 def build_flow(redirect_uri: str, scopes: list[str]) -> Flow:
@@ -88,41 +111,140 @@ def connect_callback(request: Request, session: Session = Depends(get_session)):
         )
         session.add(connection)
     session.commit()
+    invalidate_gmail_client(int(user_id))
+    if settings.gmail_pubsub_topic:
+        # The connection is saved either way; renew_expiring_watches retries a missing watch.
+        try:
+            register_watch(session, get_gmail_client(session, int(user_id)), connection)
+            session.commit()
+        except Exception:
+            session.rollback()
+            logger.exception("Could not register Gmail watch for user %s", user_id)
 
     redirect = f"{settings.frontend_origin}/app?gmail=connected"
     return RedirectResponse(url=redirect)
 
 
 @router.post("/scan")
-def scan_inbox(
+async def scan_inbox(
     async_scan: bool = False,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    idempotency: IdempotentCall = Depends(idempotent("scan", rate_limited=True)),
 ):
+    replay = replayed_response(idempotency)
+    if replay:
+        return replay
     redis = get_redis()
+    if async_scan:
+        job_id, coalesced = await asyncio.to_thread(
+            start_scan_job, redis, get_queue(), current_user.id
+        )
+        body = {"queued": True, "job_id": job_id, "coalesced": coalesced}
+        return await idempotency.save_async(body)
+
+    # Inline scans hold the same per-user slot as queued ones; a busy user gets that job.
+    job_id, coalesced = await asyncio.to_thread(claim_scan_job, redis, current_user.id)
+    if coalesced:
+        body = {"queued": True, "job_id": job_id, "coalesced": True}
+        return await idempotency.save_async(body)
+    progress = await asyncio.to_thread(ScanProgress, redis, job_id, current_user.id)
     try:
-        enforce_rate_limit(redis, f"scan:{current_user.id}")
-    except RateLimitError as exc:
-        raise HTTPException(status_code=429, detail=str(exc))
+        client = await get_async_gmail_client(session, current_user.id)
+        result = await scan_mailbox_async(
+            session,
+            current_user.id,
+            client,
+            on_progress=progress.update,
+            is_cancelled=progress.cancelled,
+        )
+        await session.commit()
+    except ScanCancelled:
+        await session.rollback()
+        await asyncio.to_thread(progress.cancel)
+        # Not stored for Idempotency-Key replay, so a retry scans again.
+        return {"job_id": job_id, "status": "cancelled"}
+    except BaseException as exc:
+        await asyncio.to_thread(progress.fail, exc)
+        raise
+    await asyncio.to_thread(progress.finish, result)
+    return await idempotency.save_async(
+        {
+            "job_id": job_id,
+            "scanned": result.scanned,
+            "failed": result.failed,
+            "incremental": result.incremental,
+            "timings": result.stage_seconds(),
+        }
+    )
 
-    if async_scan:
-        from services.jobs import get_queue
-        from services.scan_job import run_scan_for_user
 
-        queue = get_queue()
-        job = queue.enqueue(run_scan_for_user, current_user.id)
-        return {"queued": True, "job_id": job.id}
+def _user_scan_job(job_id: str, user: User) -> dict:
+    state = get_scan_job(get_redis(), job_id)
+    if not state or state["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Scan job not found")
+    return state
 
-    client = get_gmail_client(session, current_user.id)
-    query = build_scan_query()
-    messages = client.list_candidate_messages(query)
 
-    metadata_map = {}
-    for msg in messages:
-        msg_id = msg.get("id")
-        if msg_id:
-            metadata_map[msg_id] = client.get_message_metadata(msg_id)
+@router.get("/scan/{job_id}")
+def scan_status(job_id: str, current_user: User = Depends(get_current_user)):
+    return _user_scan_job(job_id, current_user)
 
-    collect_services(session, current_user.id, messages, metadata_map)
-    session.commit()
-    return {"scanned": len(messages)}
+
+@router.delete("/scan/{job_id}", status_code=202)
+def cancel_scan(job_id: str, current_user: User = Depends(get_current_user)):
+    state = _user_scan_job(job_id, current_user)
+    active = state["status"] not in TERMINAL_STATUSES
+    if active:
+        request_cancel(get_redis(), job_id)
+    return {"job_id": job_id, "status": state["status"], "cancel_requested": active}
+
+
+@router.get("/scan/{job_id}/events")
+def scan_events(job_id: str, current_user: User = Depends(get_current_user)):
+    _user_scan_job(job_id, current_user)
+    return StreamingResponse(
+        scan_job_events(get_redis(), job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/push", status_code=204)
+def gmail_push(envelope: dict, token: str = "", session: Session = Depends(get_session)):
+    if not settings.gmail_push_token or not hmac.compare_digest(token, settings.gmail_push_token):
+        raise HTTPException(status_code=401, detail="Invalid push token")
+    notification = parse_push_envelope(envelope)
+    if notification:
+        email, history_id = notification
+        handle_notification(
+            session, get_redis(), get_queue(), get_queue(SYNC_QUEUE), email, history_id
+        )
+    return Response(status_code=204)
+
+
+@router.post("/bulk-scan", status_code=202)
+def bulk_scan(shards: int | None = None, _: None = Depends(require_dev_api_key)):
+    run_id = start_bulk_scan(get_redis(), get_queue, shards)
+    return {"run_id": run_id}
+
+
+@router.get("/bulk-scan/{run_id}")
+def bulk_scan_status(run_id: str, _: None = Depends(require_dev_api_key)):
+    report = bulk_scan_report(get_redis(), run_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Bulk scan not found")
+    return report
+
+
+@router.post("/bulk-scan/{run_id}/resume", status_code=202)
+def bulk_scan_resume(run_id: str, _: None = Depends(require_dev_api_key)):
+    pending = resume_bulk_scan(get_redis(), get_queue, run_id)
+    if pending is None:
+        raise HTTPException(status_code=404, detail="Bulk scan not found")
+    return {"run_id": run_id, "resumed_shards": pending}
+
+
+@router.get("/quota")
+def gmail_quota(_: None = Depends(require_dev_api_key)):
+    return governor.snapshot()
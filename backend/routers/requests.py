@@ -1,40 +1,87 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from db import get_session
-from models.user import User
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import get_async_session
 from models.privacy_request import PrivacyRequest
-from security.deps import get_current_user
-from services.requests import create_draft, create_request_record, list_requests, RequestError, log_request_event
-from services.gmail_service import get_gmail_client
-from services.status_sync import evaluate_status, update_request_status
+from models.user import User
+from security.deps import get_current_user, idempotent, rate_limit, replayed_response
+from services.idempotency import IdempotentCall
+from services.requests import (
+    create_draft_async,
+    create_drafts_async,
+    owned_services_query,
+    record_sent_requests,
+    RequestError,
+)
+from services.gmail_service import get_async_gmail_client
+from services.jobs import get_queue
+from services.pagination import PageError, fetch_page
+from services.response_cache import REQUESTS, cached_response
+from services.redis_client import get_redis
+from services.send_batch import (
+    check_send_items,
+    get_send_job,
+    get_send_results,
+    send_batch_events,
+    start_send_batch,
+    unknown_services,
+)
+from services.status_sync import apply_status_updates, check_requests, pending_requests
+from settings import settings
 
 router = APIRouter(prefix="/requests", tags=["requests"])
 
 
 @router.post("/draft")
-def draft_request(
+async def draft_request(
     payload: dict,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
     try:
-        return create_draft(
+        return await create_draft_async(
             session,
             current_user.id,
             payload.get("service_account_id"),
             payload.get("request_type"),
             payload.get("regime"),
+            payload.get("locale"),
+        )
+    except RequestError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.post("/draft/batch")
+async def draft_requests(
+    payload: dict,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        return await create_drafts_async(
+            session,
+            current_user.id,
+            payload.get("service_account_ids") or [],
+            payload.get("request_type"),
+            payload.get("regime"),
+            payload.get("locale"),
         )
     except RequestError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
 
 @router.post("/send")
-def send_request(
+async def send_request(
     payload: dict,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    idempotency: IdempotentCall = Depends(idempotent("send", rate_limited=True)),
 ):
+    replay = replayed_response(idempotency)
+    if replay:
+        return replay
     if not payload.get("confirm"):
         raise HTTPException(status_code=400, detail="Confirmation required")
 
@@ -48,45 +95,110 @@ def send_request(
     if request_type not in {"unsubscribe", "delete_close"}:
         raise HTTPException(status_code=400, detail="Invalid request type")
 
-    client = get_gmail_client(session, current_user.id)
-    response = client.send_email(to_addr, subject, body)
-    request = create_request_record(
-        session,
-        current_user.id,
-        service_account_id,
-        request_type,
-        response.get("threadId"),
-        response.get("id"),
+    client = await get_async_gmail_client(session, current_user.id)
+    response = await client.send_email(to_addr, subject, body)
+    item = {"service_account_id": service_account_id, "request_type": request_type}
+    [request] = await session.run_sync(record_sent_requests, current_user.id, [(item, response)])
+    return await idempotency.save_async({"id": request.id, "status": request.status})
+
+
+@router.post("/send/batch", status_code=202)
+async def send_requests(
+    payload: dict,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+    idempotency: IdempotentCall = Depends(idempotent("send_batch", rate_limited=True)),
+):
+    replay = replayed_response(idempotency)
+    if replay:
+        return replay
+    if not payload.get("confirm"):
+        raise HTTPException(status_code=400, detail="Confirmation required")
+    try:
+        items = check_send_items(payload.get("items"))
+        ids = [item["service_account_id"] for item in items]
+        owned = await session.exec(owned_services_query(current_user.id, ids))
+    except RequestError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    unknown = unknown_services(items, {service.id for service in owned})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown services: {unknown}")
+    job_id = await asyncio.to_thread(
+        start_send_batch, get_redis(), get_queue(), current_user.id, items
+    )
+    body = {"queued": True, "job_id": job_id, "total": len(items)}
+    return await idempotency.save_async(body, 202)
+
+
+def _user_send_job(job_id: str, user: User) -> dict:
+    state = get_send_job(get_redis(), job_id)
+    if not state or state["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Send job not found")
+    return state
+
+
+@router.get("/send/batch/{job_id}")
+def send_batch_status(job_id: str, current_user: User = Depends(get_current_user)):
+    state = _user_send_job(job_id, current_user)
+    return {**state, "results": get_send_results(get_redis(), job_id)}
+
+
+@router.get("/send/batch/{job_id}/events")
+def send_batch_stream(job_id: str, current_user: User = Depends(get_current_user)):
+    _user_send_job(job_id, current_user)
+    return StreamingResponse(
+        send_batch_events(get_redis(), job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    log_request_event(session, request.id, "sent", "{}")
-    return {"id": request.id, "status": request.status}
 
 
 @router.post("/sync")
-def sync_requests(
-    session: Session = Depends(get_session),
+async def sync_requests(
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
+    _: None = Depends(rate_limit("sync")),
 ):
-    client = get_gmail_client(session, current_user.id)
-    statement = select(PrivacyRequest).where(
-        PrivacyRequest.user_id == current_user.id,
-        PrivacyRequest.status.in_(["pending", "needs_info"]),
-        PrivacyRequest.gmail_thread_id.is_not(None),
-    )
-    pending = list(session.exec(statement))
-    updated = 0
-    for req in pending:
-        messages = client.list_thread_messages(req.gmail_thread_id)
-        status = evaluate_status(messages)
-        if status:
-            update_request_status(session, req, status)
-            updated += 1
-    return {"checked": len(pending), "updated": updated}
+    client = await get_async_gmail_client(session, current_user.id)
+    pending = await session.run_sync(pending_requests, current_user.id)
+    outcomes = await check_requests(client, pending)
+    results = [
+        {
+            "id": o.request.id,
+            "status": o.status or o.request.status,
+            "updated": o.changed,
+            "elapsed_ms": o.elapsed_ms,
+            "error": o.error,
+        }
+        for o in outcomes
+    ]
+    updated = await session.run_sync(apply_status_updates, outcomes)
+    return {"checked": len(pending), "updated": updated, "results": results}
 
 
 @router.get("")
-def get_requests(
-    session: Session = Depends(get_session),
+async def get_requests(
+    request: Request,
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    request_type: Optional[str] = None,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    return list_requests(session, current_user.id)
+    filters = [PrivacyRequest.user_id == current_user.id]
+    if status:
+        filters.append(PrivacyRequest.status == status)
+    if request_type:
+        filters.append(PrivacyRequest.request_type == request_type)
+
+    async def page() -> dict:
+        try:
+            return await fetch_page(
+                session, PrivacyRequest, "updated_at", filters, limit, cursor, fields
+            )
+        except PageError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+    return await cached_response(request, current_user.id, REQUESTS, page)
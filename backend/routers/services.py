@@ -1,28 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
-from db import get_session
-from models.service_account import ServiceAccount
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import get_async_session
+from models.service_account import ServiceAccount, ServiceAccountRead
 from models.user import User
 from security.deps import get_current_user
+from services.pagination import PageError, fetch_page
+from services.response_cache import SERVICES, cached_response
+from settings import settings
 
 router = APIRouter(prefix="/services", tags=["services"])
 
 
 @router.get("")
-def list_services(
-    session: Session = Depends(get_session), current_user: User = Depends(get_current_user)
+async def list_services(
+    request: Request,
+    limit: int = Query(settings.page_default_size, ge=1, le=settings.page_max_size),
+    cursor: Optional[str] = None,
+    domain: Optional[str] = None,
+    fields: Optional[str] = None,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
 ):
-    statement = select(ServiceAccount).where(ServiceAccount.user_id == current_user.id)
-    return list(session.exec(statement))
+    filters = [ServiceAccount.user_id == current_user.id]
+    if domain:
+        filters.append(ServiceAccount.domain.startswith(domain.lower(), autoescape=True))
+
+    async def page() -> dict:
+        try:
+            return await fetch_page(
+                session, ServiceAccount, "last_seen_at", filters, limit, cursor, fields
+            )
+        except PageError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+    return await cached_response(request, current_user.id, SERVICES, page)
 
 
-@router.get("/{service_id}")
-def get_service(
+@router.get("/{service_id}", response_model=ServiceAccountRead)
+async def get_service(
     service_id: int,
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(get_current_user),
 ):
-    service = session.get(ServiceAccount, service_id)
+    service = await session.get(ServiceAccount, service_id)
     if not service or service.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Service not found")
     return service
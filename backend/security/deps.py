@@ -1,13 +1,20 @@
-from fastapi import Depends, HTTPException, Header
-from sqlmodel import Session
-from db import get_session
+import asyncio
+import math
+from typing import AsyncIterator, Callable, Optional
+from fastapi import Depends, HTTPException, Header, Request
+from fastapi.responses import JSONResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from db import get_async_session
 from models.user import User
 from security.jwt import decode_token
+from services.idempotency import IdempotencyError, IdempotentCall, request_fingerprint
+from services.rate_limit import RateLimit, RateLimitError, enforce_rate_limit
+from services.redis_client import get_redis
 from settings import settings
 
 
-def get_current_user(
-    session: Session = Depends(get_session),
+async def get_current_user(
+    session: AsyncSession = Depends(get_async_session),
     authorization: str | None = Header(default=None),
     x_dev_api_key: str | None = Header(default=None),
     x_user_id: str | None = Header(default=None),
@@ -15,7 +22,7 @@ def get_current_user(
     if x_dev_api_key and x_user_id:
         if not settings.dev_api_key or x_dev_api_key != settings.dev_api_key:
             raise HTTPException(status_code=401, detail="Invalid dev key")
-        user = session.get(User, int(x_user_id))
+        user = await session.get(User, int(x_user_id))
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
@@ -30,7 +37,75 @@ def get_current_user(
     user_id = payload.get("sub")
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user = session.get(User, int(user_id))
+    user = await session.get(User, int(user_id))
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     return user
+
+
+def _check_rate_limit(route: str, user_id: int) -> None:
+    limit = RateLimit.parse(
+        getattr(settings, f"rate_limit_{route}"),
+        getattr(settings, f"rate_limit_{route}_cost"),
+    )
+    try:
+        enforce_rate_limit(get_redis(), f"{route}:{user_id}", limit=limit)
+    except RateLimitError as exc:
+        retry_after = max(1, math.ceil(exc.retry_after))
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(retry_after)}
+        )
+
+
+def rate_limit(route: str) -> Callable[..., None]:
+    def dependency(current_user: User = Depends(get_current_user)) -> None:
+        _check_rate_limit(route, current_user.id)
+
+    return dependency
+
+
+def idempotent(
+    scope: str, rate_limited: bool = False
+) -> Callable[..., AsyncIterator[IdempotentCall]]:
+    """Load or lock the request's Idempotency-Key for the route.
+
+    With `rate_limited`, the `scope` route limit is taken here rather than by `rate_limit`,
+    and only when the call will run: a replayed response costs no tokens.
+    """
+
+    async def dependency(
+        request: Request,
+        current_user: User = Depends(get_current_user),
+        idempotency_key: str | None = Header(default=None),
+    ) -> AsyncIterator[IdempotentCall]:
+        if idempotency_key is None:
+            if rate_limited:
+                await asyncio.to_thread(_check_rate_limit, scope, current_user.id)
+            yield IdempotentCall(None, scope, current_user.id, None)
+            return
+        fingerprint = request_fingerprint(
+            request.method, request.url.path, request.url.query, await request.body()
+        )
+        try:
+            call = IdempotentCall(get_redis(), scope, current_user.id, idempotency_key, fingerprint)
+            await asyncio.to_thread(call.begin)
+        except IdempotencyError as exc:
+            raise HTTPException(status_code=exc.status_code, detail=str(exc))
+        try:
+            if rate_limited and call.stored is None:
+                await asyncio.to_thread(_check_rate_limit, scope, current_user.id)
+            yield call
+        finally:
+            await asyncio.to_thread(call.release)
+
+    return dependency
+
+
+def replayed_response(call: IdempotentCall) -> Optional[JSONResponse]:
+    if call.stored is None:
+        return None
+    return JSONResponse(
+        call.stored["body"],
+        status_code=call.stored["status_code"],
+        headers={"Idempotent-Replayed": "true"},
+    )
@@ -0,0 +1,178 @@
+import hashlib
+import time
+from bisect import bisect
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+from redis import Redis
+from rq import Queue, Retry
+from sqlmodel import Session, select
+from db import engine
+from models.email_connection import EmailConnection
+from services.gmail_service import get_gmail_client
+from services.jobs import get_queue, scan_shard_queue
+from services.redis_client import get_redis
+from services.scan import ScanResult, scan_mailbox
+from services.scan_status import ScanProgress, claim_scan_job
+from settings import settings
+
+RUN_KEY = "bulkscan:{run_id}"
+CURSOR_KEY = "bulkscan:{run_id}:cursor"
+DONE_KEY = "bulkscan:{run_id}:done"
+
+ScanUser = Callable[[Session, int], ScanResult]
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+@lru_cache(maxsize=8)
+def hash_ring(shards: int, replicas: int) -> Tuple[List[int], List[int]]:
+    points = sorted(
+        (_hash(f"shard-{shard}:{replica}"), shard)
+        for shard in range(shards)
+        for replica in range(replicas)
+    )
+    return [point for point, _ in points], [shard for _, shard in points]
+
+
+def shard_for_user(user_id: int, shards: int) -> int:
+    # Consistent hashing: changing the shard count only moves about 1/N of the users.
+    points, owners = hash_ring(shards, settings.scan_ring_replicas)
+    return owners[bisect(points, _hash(f"user-{user_id}")) % len(points)]
+
+
+def start_bulk_scan(
+    redis: Redis, queue_for: Callable[[str], Queue], shards: Optional[int] = None
+) -> str:
+    shards = shards or settings.scan_shards
+    run_id = str(uuid4())
+    key = RUN_KEY.format(run_id=run_id)
+    redis.hset(key, mapping={"shards": shards, "started_at": time.time(), "messages": 0, "users": 0})
+    redis.expire(key, settings.bulk_scan_ttl_seconds)
+    for shard in range(shards):
+        enqueue_shard(queue_for, run_id, shard, shards)
+    return run_id
+
+
+def enqueue_shard(queue_for: Callable[[str], Queue], run_id: str, shard: int, shards: int) -> None:
+    queue_for(scan_shard_queue(shard)).enqueue(
+        scan_shard,
+        run_id,
+        shard,
+        shards,
+        job_timeout=settings.scan_job_timeout_seconds * 4,
+        retry=Retry(max=settings.scan_shard_max_retries, interval=30),
+    )
+
+
+def resume_bulk_scan(
+    redis: Redis, queue_for: Callable[[str], Queue], run_id: str
+) -> Optional[List[int]]:
+    """Re-enqueue the shards of a run that have not finished, e.g. after a worker crash.
+
+    RQ does not retry jobs whose worker died, so this is the way to pick such a run back
+    up; each shard restarts after the last user it recorded. None if the run is unknown.
+    """
+    shards = redis.hget(RUN_KEY.format(run_id=run_id), "shards")
+    if shards is None:
+        return None
+    shards = int(shards)
+    done = {int(shard) for shard in redis.smembers(DONE_KEY.format(run_id=run_id))}
+    pending = [shard for shard in range(shards) if shard not in done]
+    for shard in pending:
+        enqueue_shard(queue_for, run_id, shard, shards)
+    return pending
+
+
+def _scan_user(session: Session, user_id: int) -> ScanResult:
+    return scan_mailbox(session, user_id, get_gmail_client(session, user_id))
+
+
+def run_shard(
+    session: Session,
+    redis: Redis,
+    run_id: str,
+    shard: int,
+    shards: int,
+    scan_user: ScanUser = _scan_user,
+) -> int:
+    run_key = RUN_KEY.format(run_id=run_id)
+    cursor_key = CURSOR_KEY.format(run_id=run_id)
+    cursor = int(redis.hget(cursor_key, shard) or 0)
+    scanned_users = 0
+    while True:
+        statement = (
+            select(EmailConnection.user_id)
+            .where(EmailConnection.provider == "google", EmailConnection.user_id > cursor)
+            .order_by(EmailConnection.user_id)
+            .limit(settings.scan_shard_page_size)
+        )
+        user_ids = list(session.exec(statement))
+        if not user_ids:
+            break
+        for user_id in user_ids:
+            cursor = user_id
+            if shard_for_user(user_id, shards) != shard:
+                continue
+            # One scan per user at a time, shared with on-demand scans from the API.
+            job_id, busy = claim_scan_job(redis, user_id)
+            if busy:
+                redis.hincrby(run_key, "skipped", 1)
+            else:
+                progress = ScanProgress(redis, job_id, user_id)
+                try:
+                    result = scan_user(session, user_id)
+                    session.commit()
+                except Exception as exc:
+                    session.rollback()
+                    progress.fail(exc)
+                    redis.hincrby(run_key, "failed", 1)
+                except BaseException as exc:
+                    # The worker is going down; free the user for the resumed shard.
+                    progress.fail(exc)
+                    raise
+                else:
+                    progress.finish(result)
+                    redis.hincrby(run_key, "messages", result.scanned)
+                    redis.hincrby(run_key, "users", 1)
+                    scanned_users += 1
+            # Persist progress per user so a crashed shard resumes right after it.
+            redis.hset(cursor_key, shard, user_id)
+            redis.expire(cursor_key, settings.bulk_scan_ttl_seconds)
+    redis.sadd(DONE_KEY.format(run_id=run_id), shard)
+    redis.expire(DONE_KEY.format(run_id=run_id), settings.bulk_scan_ttl_seconds)
+    if redis.scard(DONE_KEY.format(run_id=run_id)) >= shards:
+        redis.hsetnx(run_key, "finished_at", time.time())
+    return scanned_users
+
+
+def scan_shard(run_id: str, shard: int, shards: int) -> int:
+    with Session(engine) as session:
+        return run_shard(session, get_redis(), run_id, shard, shards)
+
+
+def scan_all_users(shards: Optional[int] = None) -> str:
+    return start_bulk_scan(get_redis(), get_queue, shards)
+
+
+def bulk_scan_report(redis: Redis, run_id: str, now: Optional[float] = None) -> Optional[Dict]:
+    data = redis.hgetall(RUN_KEY.format(run_id=run_id))
+    if not data:
+        return None
+    finished_at = float(data["finished_at"]) if "finished_at" in data else None
+    elapsed = (finished_at or now or time.time()) - float(data["started_at"])
+    messages = int(data.get("messages", 0))
+    return {
+        "run_id": run_id,
+        "shards": int(data["shards"]),
+        "shards_done": redis.scard(DONE_KEY.format(run_id=run_id)),
+        "users": int(data.get("users", 0)),
+        "skipped": int(data.get("skipped", 0)),
+        "failed": int(data.get("failed", 0)),
+        "messages": messages,
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(messages / elapsed, 2) if elapsed > 0 else 0.0,
+        "finished": finished_at is not None,
+    }
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Awaitable, Callable, Optional, TypeVar
+import httpx
+from googleapiclient.errors import HttpError
+from redis import Redis
+from services.rate_limit import RateLimit, take_tokens
+from services.redis_client import get_redis
+from settings import settings
+
+T = TypeVar("T")
+
+QUOTA_KEY = "gmail:quota"
+STATS_KEY = "gmail:quota:stats"
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+@dataclass
+class QuotaStats:
+    units_spent: int = 0
+    throttle_waits: int = 0
+    throttle_wait_seconds: float = 0.0
+    retries: int = 0
+
+
+def _error_reasons(content: bytes | str) -> set[str]:
+    try:
+        error = json.loads(content).get("error", {})
+    except (ValueError, AttributeError):
+        return set()
+    return {e.get("reason") for e in error.get("errors", []) if isinstance(e, dict)}
+
+
+def is_retryable(exc: BaseException, idempotent: bool = True) -> bool:
+    """Whether a failed Gmail call may be sent again.
+
+    Calls that are not idempotent, like messages.send, are only retried when rejected
+    for rate limits: a 5xx or a timeout may come after Gmail already executed them.
+    """
+    if isinstance(exc, HttpError):
+        status, content = exc.resp.status, exc.content
+    elif isinstance(exc, httpx.HTTPStatusError):
+        status, content = exc.response.status_code, exc.response.content
+    else:
+        return idempotent and isinstance(exc, httpx.TransportError)
+    if status == 429:
+        return True
+    if status >= 500:
+        return idempotent
+    return status == 403 and bool(_error_reasons(content) & RATE_LIMIT_REASONS)
+
+
+class QuotaGovernor:
+    """Spends Gmail quota units from a bucket shared by every API process and worker."""
+
+    def __init__(
+        self,
+        redis_factory: Optional[Callable[[], Redis]] = None,
+        units_per_second: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self._redis_factory = redis_factory
+        self._units_per_second = units_per_second or settings.gmail_quota_units_per_second
+        self.max_retries = settings.gmail_max_retries if max_retries is None else max_retries
+
+    def _redis(self) -> Redis:
+        return self._redis_factory() if self._redis_factory else get_redis()
+
+    def _count(self, **deltas: float) -> None:
+        # Counters live next to the bucket so every process reports the same totals.
+        pipe = self._redis().pipeline(transaction=False)
+        for name, delta in deltas.items():
+            if isinstance(delta, float):
+                pipe.hincrbyfloat(STATS_KEY, name, delta)
+            else:
+                pipe.hincrby(STATS_KEY, name, delta)
+        pipe.execute()
+
+    def _try_take(self, units: int) -> float:
+        limit = RateLimit(self._units_per_second, 1, units)
+        allowed, _, retry_after = take_tokens(self._redis(), QUOTA_KEY, limit)
+        if allowed:
+            self._count(units_spent=units)
+            return 0.0
+        self._count(throttle_waits=1, throttle_wait_seconds=float(retry_after))
+        return retry_after
+
+    def _parts(self, units: int) -> list[int]:
+        # A batch can cost more than one second of budget; spend it in slices.
+        full, rest = divmod(units, self._units_per_second)
+        return [self._units_per_second] * full + ([rest] if rest else [])
+
+    def acquire(self, units: int) -> None:
+        for part in self._parts(units):
+            while wait := self._try_take(part):
+                time.sleep(wait)
+
+    async def acquire_async(self, units: int) -> None:
+        for part in self._parts(units):
+            while wait := await asyncio.to_thread(self._try_take, part):
+                await asyncio.sleep(wait)
+
+    def backoff(self, attempt: int) -> float:
+        delay = min(
+            settings.gmail_retry_base_seconds * (2 ** attempt), settings.gmail_retry_max_seconds
+        )
+        self._count(retries=1)
+        return random.uniform(0, delay)
+
+    def should_retry(self, exc: BaseException, attempt: int, idempotent: bool = True) -> bool:
+        return attempt < self.max_retries and is_retryable(exc, idempotent)
+
+    def execute(self, call: Callable[[], T], units: int, idempotent: bool = True) -> T:
+        attempt = 0
+        while True:
+            self.acquire(units)
+            try:
+                return call()
+            except Exception as exc:
+                if not self.should_retry(exc, attempt, idempotent):
+                    raise
+            time.sleep(self.backoff(attempt))
+            attempt += 1
+
+    async def execute_async(
+        self, call: Callable[[], Awaitable[T]], units: int, idempotent: bool = True
+    ) -> T:
+        attempt = 0
+        while True:
+            await self.acquire_async(units)
+            try:
+                return await call()
+            except Exception as exc:
+                if not self.should_retry(exc, attempt, idempotent):
+                    raise
+            await asyncio.sleep(await asyncio.to_thread(self.backoff, attempt))
+            attempt += 1
+
+    def snapshot(self) -> dict:
+        stored = self._redis().hgetall(STATS_KEY)
+        values = {
+            f.name: f.type(float(stored[f.name])) for f in fields(QuotaStats) if f.name in stored
+        }
+        return asdict(QuotaStats(**values))
+
+
+governor = QuotaGovernor()
@@ -1,15 +1,75 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models.email_connection import EmailConnection
-from security.crypto import decrypt_text
+from security.crypto import decrypt_text, encrypt_text
+from services.gmail_quota import governor
+from services.redis_client import get_redis
 from gmail.auth import credentials_from_refresh_token, GMAIL_SCOPES
+from gmail.async_client import AsyncGmailClient
 from gmail.client import GmailClient
+from settings import settings
+
+TOKEN_KEY = "gmail:token:{user_id}"
 
 
 class GmailConnectionError(Exception):
     pass
 
 
-def get_gmail_client(session: Session, user_id: int) -> GmailClient:
+@dataclass
+class CachedGmailAuth:
+    credentials: Credentials
+    expires_at: float
+    async_client: Optional[AsyncGmailClient] = None
+
+
+class GmailClientCache:
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[int, CachedGmailAuth]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CachedGmailAuth]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.time():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry
+
+    def put(self, user_id: int, entry: CachedGmailAuth) -> None:
+        with self._lock:
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+client_cache = GmailClientCache(settings.gmail_client_cache_size)
+
+
+def get_gmail_credentials(session: Session, user_id: int) -> Credentials:
     statement = select(EmailConnection).where(
         EmailConnection.user_id == user_id, EmailConnection.provider == "google"
     )
@@ -17,5 +77,68 @@ def get_gmail_client(session: Session, user_id: int) -> GmailClient:
     if not connection:
         raise GmailConnectionError("Gmail not connected")
     refresh_token = decrypt_text(connection.refresh_token_encrypted)
-    credentials = credentials_from_refresh_token(refresh_token, GMAIL_SCOPES)
-    return GmailClient(credentials)
+    return credentials_from_refresh_token(refresh_token, GMAIL_SCOPES)
+
+
+def _expiry_timestamp(credentials: Credentials) -> float:
+    # google-auth keeps expiry as a naive UTC datetime.
+    expiry = credentials.expiry.replace(tzinfo=timezone.utc)
+    return expiry.timestamp() - settings.gmail_token_expiry_skew_seconds
+
+
+def _load_access_token(user_id: int, credentials: Credentials) -> bool:
+    cached = get_redis().get(TOKEN_KEY.format(user_id=user_id))
+    if not cached:
+        return False
+    data = json.loads(decrypt_text(cached))
+    credentials.token = data["token"]
+    credentials.expiry = datetime.fromisoformat(data["expiry"])
+    return credentials.valid
+
+
+def _store_access_token(user_id: int, credentials: Credentials) -> None:
+    ttl = int(_expiry_timestamp(credentials) - time.time())
+    if ttl <= 0:
+        return
+    payload = json.dumps({"token": credentials.token, "expiry": credentials.expiry.isoformat()})
+    get_redis().setex(TOKEN_KEY.format(user_id=user_id), ttl, encrypt_text(payload))
+
+
+def _authorize(user_id: int, credentials: Credentials) -> CachedGmailAuth:
+    if not _load_access_token(user_id, credentials):
+        credentials.refresh(Request())
+        _store_access_token(user_id, credentials)
+    entry = CachedGmailAuth(credentials, _expiry_timestamp(credentials))
+    client_cache.put(user_id, entry)
+    return entry
+
+
+def _authorized_entry(session: Session, user_id: int) -> CachedGmailAuth:
+    entry = client_cache.get(user_id)
+    if entry is not None:
+        return entry
+    return _authorize(user_id, get_gmail_credentials(session, user_id))
+
+
+def get_authorized_credentials(session: Session, user_id: int) -> Credentials:
+    return _authorized_entry(session, user_id).credentials
+
+
+def get_gmail_client(session: Session, user_id: int) -> GmailClient:
+    return GmailClient(get_authorized_credentials(session, user_id), governor=governor)
+
+
+async def get_async_gmail_client(session: AsyncSession, user_id: int) -> AsyncGmailClient:
+    entry = client_cache.get(user_id)
+    if entry is None:
+        credentials = await session.run_sync(get_gmail_credentials, user_id)
+        # The token refresh and Redis calls block, so they stay off the event loop.
+        entry = await asyncio.to_thread(_authorize, user_id, credentials)
+    if entry.async_client is None:
+        entry.async_client = AsyncGmailClient(entry.credentials, governor=governor)
+    return entry.async_client
+
+
+def invalidate_gmail_client(user_id: int) -> None:
+    client_cache.invalidate(user_id)
+    get_redis().delete(TOKEN_KEY.format(user_id=user_id))
@@ -0,0 +1,95 @@
+import asyncio
+import hashlib
+import json
+from typing import Any, Optional
+from uuid import uuid4
+from redis import Redis
+from settings import settings
+
+RESPONSE_KEY = "idem:{scope}:{user_id}:{key}"
+LOCK_KEY = "idem:{scope}:{user_id}:{key}:lock"
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def request_fingerprint(method: str, path: str, query: str, body: bytes) -> str:
+    digest = hashlib.sha256(f"{method} {path}?{query}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class IdempotentCall:
+    """One attempt at a request carrying an Idempotency-Key.
+
+    The first attempt takes a short lock and runs; `save` stores its response so retries
+    with the same key get it back instead of running again. A retry that arrives while
+    the first attempt still holds the lock is rejected rather than run twice.
+    """
+
+    def __init__(
+        self,
+        redis: Optional[Redis],
+        scope: str,
+        user_id: int,
+        key: Optional[str],
+        fingerprint: str = "",
+    ):
+        self._redis = redis
+        self._fingerprint = fingerprint
+        self._token = str(uuid4())
+        self._locked = False
+        self.key = key
+        self.stored: Optional[dict] = None
+        if key is not None:
+            if not key or len(key) > MAX_KEY_LENGTH:
+                raise IdempotencyError("Invalid Idempotency-Key", 400)
+            names = {"scope": scope, "user_id": user_id, "key": key}
+            self._response_key = RESPONSE_KEY.format(**names)
+            self._lock_key = LOCK_KEY.format(**names)
+
+    def begin(self) -> None:
+        """Load a stored response, or take the lock so this attempt can run."""
+        if self.key is None:
+            return
+        self.stored = self._load()
+        if self.stored is not None:
+            return
+        lock_ttl = settings.idempotency_lock_seconds
+        if not self._redis.set(self._lock_key, self._token, nx=True, ex=lock_ttl):
+            raise IdempotencyError("A request with this Idempotency-Key is in progress", 409)
+        self._locked = True
+        # The first attempt may have finished between the lookup and the lock.
+        try:
+            self.stored = self._load()
+        except IdempotencyError:
+            self.release()
+            raise
+
+    def _load(self) -> Optional[dict]:
+        raw = self._redis.get(self._response_key)
+        if not raw:
+            return None
+        stored = json.loads(raw)
+        if stored["fingerprint"] != self._fingerprint:
+            raise IdempotencyError("Idempotency-Key was used with a different request", 422)
+        return stored
+
+    def save(self, body: Any, status_code: int = 200) -> Any:
+        if self.key is not None:
+            stored = {"fingerprint": self._fingerprint, "status_code": status_code, "body": body}
+            ttl = settings.idempotency_ttl_seconds
+            self._redis.set(self._response_key, json.dumps(stored), ex=ttl)
+        return body
+
+    async def save_async(self, body: Any, status_code: int = 200) -> Any:
+        return await asyncio.to_thread(self.save, body, status_code)
+
+    def release(self) -> None:
+        if self._locked and self._redis.get(self._lock_key) == self._token:
+            self._redis.delete(self._lock_key)
+        self._locked = False
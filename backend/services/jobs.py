@@ -1,8 +1,14 @@
 from rq import Queue
-from redis import Redis
-from settings import settings
+from services.redis_client import get_queue_connection
 
+DEFAULT_QUEUE = "default"
+SYNC_QUEUE = "sync"
+SCAN_QUEUE_PREFIX = "scan"
 
-def get_queue() -> Queue:
-    redis = Redis.from_url(settings.redis_url)
-    return Queue("default", connection=redis)
+
+def scan_shard_queue(shard: int) -> str:
+    return f"{SCAN_QUEUE_PREFIX}-{shard}"
+
+
+def get_queue(name: str = DEFAULT_QUEUE) -> Queue:
+    return Queue(name, connection=get_queue_connection())
@@ -0,0 +1,47 @@
+import re
+from typing import Dict, Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+END = ""
+
+Trie = Dict[str, "Trie"]
+
+
+def _trie_pattern(node: Trie) -> str:
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # Greedy optional suffix: at a given start the longest pattern wins.
+    return f"(?:{body})?" if END in node else body
+
+
+class KeywordMatcher(Generic[T]):
+    """Multi-pattern matcher compiled once from a keyword trie.
+
+    The trie is emitted as a single regular expression, so one left-to-right pass of
+    the C regex engine finds every keyword: leftmost match first, longest keyword at
+    a given position, no overlaps. "not deleted" therefore swallows the "deleted" it
+    contains, which is what negation rules rely on.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[str, T]]):
+        trie: Trie = {}
+        self._values: Dict[str, List[T]] = {}
+        for pattern, value in patterns:
+            if not pattern:
+                raise ValueError("empty pattern")
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[END] = {}
+            self._values.setdefault(pattern, []).append(value)
+        self._regex = re.compile(_trie_pattern(trie)) if trie else None
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, T]]:
+        if self._regex is None:
+            return
+        for match in self._regex.finditer(text):
+            for value in self._values[match.group()]:
+                yield match.start(), match.end(), value
@@ -0,0 +1,69 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Iterable, List, Optional, Tuple, Type
+from sqlalchemy import tuple_
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class PageError(Exception):
+    pass
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    raw = json.dumps([sort_value.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise PageError("Invalid cursor")
+
+
+def projected_fields(model: Type[SQLModel], fields: Optional[str]) -> List[str]:
+    columns = list(model.__table__.columns.keys())
+    if not fields:
+        return columns
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise PageError(f"Unknown fields: {', '.join(unknown)}")
+    if not names:
+        raise PageError("No fields selected")
+    return names
+
+
+async def fetch_page(
+    session: AsyncSession,
+    model: Type[SQLModel],
+    sort: str,
+    filters: Iterable[Any],
+    limit: int,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> dict:
+    """One page of rows, newest `sort` first, as plain dicts of the requested columns.
+
+    Pages are keyset-based on (sort, id): the cursor holds the last row's values, so each
+    page is an index range scan no matter how deep the client has paged.
+    """
+    names = projected_fields(model, fields)
+    sort_column, id_column = getattr(model, sort), getattr(model, "id")
+    selected = list(dict.fromkeys([*names, sort, "id"]))
+    statement = select(*(getattr(model, name) for name in selected)).where(*filters)
+    if cursor:
+        statement = statement.where(tuple_(sort_column, id_column) < tuple_(*decode_cursor(cursor)))
+    statement = statement.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)
+    rows = (await session.exec(statement)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]._mapping
+        next_cursor = encode_cursor(last[sort], last["id"])
+    items = [{name: row._mapping[name] for name in names} for row in rows]
+    return {"items": items, "next_cursor": next_cursor}
@@ -1,18 +1,25 @@
 from email.utils import parseaddr
+from functools import lru_cache
+from services.public_suffix import registrable_domain
+
+
+def clean_host(host: str) -> str:
+    return host.strip().strip(".").lower()
 
 
 def extract_domain(from_header: str) -> str:
     _, email_addr = parseaddr(from_header)
     if "@" not in email_addr:
         return ""
-    return email_addr.split("@", 1)[1].strip().lower()
+    return clean_host(email_addr.split("@", 1)[1])
 
 
+@lru_cache(maxsize=8192)
 def normalize_domain(domain: str) -> str:
-    parts = [p for p in domain.split(".") if p]
-    if len(parts) <= 2:
+    host = clean_host(domain)
+    if not host:
         return domain
-    return ".".join(parts[-2:])
+    return registrable_domain(host)
 
 
 def infer_service_name(from_header: str, domain: str) -> str:
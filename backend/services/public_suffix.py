@@ -0,0 +1,73 @@
+from pathlib import Path
+from typing import Dict
+
+SUFFIX_LIST_PATH = Path(__file__).resolve().parent.parent / "data" / "public_suffix_list.dat"
+
+RULE = "\0"
+EXCEPTION = "!"
+WILDCARD = "*"
+
+Trie = Dict[str, "Trie"]
+
+
+def _rule_variants(rule: str) -> set[str]:
+    variants = {rule}
+    try:
+        variants.add(rule.encode("idna").decode("ascii"))
+    except UnicodeError:
+        pass
+    return variants
+
+
+def load_trie(path: Path = SUFFIX_LIST_PATH) -> Trie:
+    root: Trie = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            rule = line.split(maxsplit=1)[0] if line.strip() else ""
+            if not rule or rule.startswith("//"):
+                continue
+            marker = RULE
+            if rule.startswith(EXCEPTION):
+                marker, rule = EXCEPTION, rule[1:]
+            for variant in _rule_variants(rule.lower()):
+                node = root
+                for label in reversed(variant.split(".")):
+                    node = node.setdefault(label, {})
+                node[marker] = {}
+    return root
+
+
+SUFFIX_TRIE = load_trie()
+
+
+def public_suffix_length(labels: list[str], trie: Trie = SUFFIX_TRIE) -> int:
+    # labels are ordered right to left; an unlisted TLD counts as a suffix ("*" rule).
+    length = 1
+    node = trie
+    for depth, label in enumerate(labels, start=1):
+        child = node.get(label)
+        if child is not None and EXCEPTION in child:
+            return depth - 1
+        if WILDCARD in node:
+            length = depth
+        if child is None:
+            break
+        if RULE in child:
+            length = depth
+        node = child
+    return length
+
+
+def registrable_domain(host: str, trie: Trie = SUFFIX_TRIE) -> str:
+    labels = host.split(".")
+    labels.reverse()
+    suffix = public_suffix_length(labels, trie)
+    if len(labels) <= suffix:
+        return host
+    return ".".join(reversed(labels[: suffix + 1]))
+
+
+def is_public_suffix(host: str, trie: Trie = SUFFIX_TRIE) -> bool:
+    labels = host.split(".")
+    labels.reverse()
+    return len(labels) <= public_suffix_length(labels, trie)
@@ -0,0 +1,104 @@
+import base64
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from redis import Redis
+from rq import Queue
+from sqlmodel import Session, select
+from db import engine
+from gmail.client import GmailClient
+from models.email_connection import EmailConnection
+from services.gmail_service import get_gmail_client
+from services.scan_status import start_scan_job
+from services.sync_scheduler import enqueue_user_sync
+from settings import settings
+
+PENDING_KEY = "push:pending:{user_id}"
+# Highest historyId pushed per user, so a scan that started earlier can tell it missed one.
+PUSHED_KEY = "push:history"
+
+logger = logging.getLogger(__name__)
+
+
+def register_watch(session: Session, client: GmailClient, connection: EmailConnection) -> None:
+    response = client.watch(settings.gmail_pubsub_topic)
+    profile = client.get_profile()
+    connection.email_address = profile.get("emailAddress", "").lower() or None
+    connection.watch_expires_at = datetime.fromtimestamp(
+        int(response["expiration"]) / 1000, tz=timezone.utc
+    )
+    session.add(connection)
+
+
+def renew_expiring_watches() -> int:
+    if not settings.gmail_pubsub_topic:
+        return 0
+    cutoff = datetime.now(timezone.utc) + timedelta(
+        seconds=settings.gmail_watch_renew_before_seconds
+    )
+    renewed = 0
+    with Session(engine) as session:
+        statement = select(EmailConnection).where(
+            EmailConnection.provider == "google",
+            (EmailConnection.watch_expires_at.is_(None))
+            | (EmailConnection.watch_expires_at < cutoff),
+        )
+        for connection in session.exec(statement).all():
+            user_id = connection.user_id
+            try:
+                register_watch(session, get_gmail_client(session, user_id), connection)
+                session.commit()
+            except Exception:
+                # A revoked token or a failing watch must not stop the other renewals.
+                session.rollback()
+                logger.exception("Could not renew Gmail watch for user %s", user_id)
+                continue
+            renewed += 1
+    return renewed
+
+
+def pushed_history_id(redis: Redis, user_id: int) -> Optional[int]:
+    score = redis.zscore(PUSHED_KEY, str(user_id))
+    return int(score) if score is not None else None
+
+
+def parse_push_envelope(envelope: dict) -> Optional[Tuple[str, str]]:
+    data = envelope.get("message", {}).get("data")
+    if not data:
+        return None
+    try:
+        notification = json.loads(base64.b64decode(data))
+    except (ValueError, TypeError):
+        return None
+    email = notification.get("emailAddress")
+    history_id = notification.get("historyId")
+    if not email or not history_id:
+        return None
+    return email.lower(), str(history_id)
+
+
+def handle_notification(
+    session: Session,
+    redis: Redis,
+    scan_queue: Queue,
+    sync_queue: Queue,
+    email: str,
+    history_id: str,
+) -> bool:
+    statement = select(EmailConnection).where(
+        EmailConnection.email_address == email, EmailConnection.provider == "google"
+    )
+    connection = session.exec(statement).first()
+    if not connection:
+        return False
+    if connection.history_id and int(history_id) <= int(connection.history_id):
+        return False
+    redis.zadd(PUSHED_KEY, {str(connection.user_id): int(history_id)}, gt=True)
+    # Gmail sends one notification per mailbox change; one scan covers a burst of them.
+    key = PENDING_KEY.format(user_id=connection.user_id)
+    if not redis.set(key, history_id, nx=True, ex=settings.gmail_push_coalesce_seconds):
+        return False
+    start_scan_job(redis, scan_queue, connection.user_id)
+    enqueue_user_sync(session, sync_queue, connection.user_id)
+    return True
@@ -1,17 +1,75 @@
-import time
+from dataclasses import dataclass
 from redis import Redis
+from redis.commands.core import Script
+
+# Token bucket: refill, take `cost` tokens if available, and report how long until
+# enough tokens exist otherwise. Runs atomically on the server using Redis TIME.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "ts")
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(tokens), tostring(retry_after)}
+"""
 
 
 class RateLimitError(Exception):
-    pass
-
-
-def enforce_rate_limit(redis: Redis, key: str, window_seconds: int = 60) -> None:
-    now = int(time.time())
-    bucket = now // window_seconds
-    redis_key = f"rate:{key}:{bucket}"
-    count = redis.incr(redis_key)
-    if count == 1:
-        redis.expire(redis_key, window_seconds)
-    if count > 5:
-        raise RateLimitError("Too many requests, slow down")
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    capacity: int
+    window_seconds: int
+    cost: int = 1
+
+    @classmethod
+    def parse(cls, spec: str, cost: int = 1) -> "RateLimit":
+        capacity, window = spec.split("/", 1)
+        return cls(int(capacity), int(window), cost)
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.window_seconds
+
+
+_token_bucket: Script | None = None
+
+
+def take_tokens(redis: Redis, key: str, limit: RateLimit) -> tuple[bool, float, float]:
+    global _token_bucket
+    if _token_bucket is None:
+        _token_bucket = redis.register_script(TOKEN_BUCKET_LUA)
+    # Script calls EVALSHA and only falls back to loading the source on NOSCRIPT.
+    allowed, tokens, retry_after = _token_bucket(
+        keys=[f"rate:{key}"],
+        args=[limit.capacity, limit.refill_per_second, limit.cost],
+        client=redis,
+    )
+    return bool(allowed), float(tokens), float(retry_after)
+
+
+def enforce_rate_limit(
+    redis: Redis, key: str, window_seconds: int = 60, limit: RateLimit | None = None
+) -> None:
+    limit = limit or RateLimit(5, window_seconds)
+    allowed, _, retry_after = take_tokens(redis, key, limit)
+    if not allowed:
+        raise RateLimitError("Too many requests, slow down", retry_after)
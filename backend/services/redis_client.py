@@ -1,6 +1,42 @@
-from redis import Redis
+import threading
+from typing import Dict
+from redis import BlockingConnectionPool, Redis
 from settings import settings
 
+_pools: Dict[bool, BlockingConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(decode_responses: bool) -> BlockingConnectionPool:
+    pool = _pools.get(decode_responses)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        if decode_responses not in _pools:
+            _pools[decode_responses] = BlockingConnectionPool.from_url(
+                settings.redis_url,
+                decode_responses=decode_responses,
+                max_connections=settings.redis_max_connections,
+                timeout=settings.redis_pool_timeout_seconds,
+                socket_timeout=settings.redis_socket_timeout_seconds,
+                socket_connect_timeout=settings.redis_socket_timeout_seconds,
+                socket_keepalive=True,
+                health_check_interval=settings.redis_health_check_interval,
+            )
+        return _pools[decode_responses]
+
 
 def get_redis() -> Redis:
-    return Redis.from_url(settings.redis_url, decode_responses=True)
+    return Redis(connection_pool=_get_pool(decode_responses=True))
+
+
+def get_queue_connection() -> Redis:
+    # RQ pickles job payloads, so its connection must return raw bytes.
+    return Redis(connection_pool=_get_pool(decode_responses=False))
+
+
+def close_redis() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.disconnect()
+        _pools.clear()
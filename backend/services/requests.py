@@ -1,10 +1,13 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Iterable, List, Optional, Sequence, Tuple
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models.privacy_request import PrivacyRequest
 from models.request_log import RequestLog
 from models.service_account import ServiceAccount
-from services.templates import draft_template
+from services.response_cache import REQUESTS, mark_changed
+from services.templates import REQUEST_TYPES, draft_template
+from settings import settings
 
 
 class RequestError(Exception):
@@ -17,17 +20,94 @@ def create_draft(
     service_account_id: int,
     request_type: str,
     regime: Optional[str] = None,
+    locale: Optional[str] = None,
 ) -> dict:
-    if request_type not in {"unsubscribe", "delete_close"}:
-        raise RequestError("Invalid request type")
+    check_request_type(request_type)
     service = session.get(ServiceAccount, service_account_id)
+    return render_draft(service, user_id, request_type, regime, locale)
+
+
+async def create_draft_async(
+    session: AsyncSession,
+    user_id: int,
+    service_account_id: int,
+    request_type: str,
+    regime: Optional[str] = None,
+    locale: Optional[str] = None,
+) -> dict:
+    check_request_type(request_type)
+    service = await session.get(ServiceAccount, service_account_id)
+    return render_draft(service, user_id, request_type, regime, locale)
+
+
+async def create_drafts_async(
+    session: AsyncSession,
+    user_id: int,
+    service_account_ids: Iterable[int],
+    request_type: str,
+    regime: Optional[str] = None,
+    locale: Optional[str] = None,
+) -> dict:
+    ids = check_draft_batch(service_account_ids, request_type)
+    services = await session.exec(owned_services_query(user_id, ids))
+    return render_drafts(services, ids, user_id, request_type, regime, locale)
+
+
+def check_request_type(request_type: str) -> None:
+    if request_type not in REQUEST_TYPES:
+        raise RequestError("Invalid request type")
+
+
+def check_draft_batch(service_account_ids: Iterable[int], request_type: str) -> List[int]:
+    check_request_type(request_type)
+    try:
+        ids = list(dict.fromkeys(int(i) for i in service_account_ids))
+    except (TypeError, ValueError):
+        raise RequestError("service_account_ids must be a list of ids")
+    if not ids:
+        raise RequestError("No services selected")
+    if len(ids) > settings.draft_batch_max_services:
+        raise RequestError(f"At most {settings.draft_batch_max_services} services per batch")
+    return ids
+
+
+def owned_services_query(user_id: int, ids: List[int]):
+    return select(ServiceAccount).where(
+        ServiceAccount.user_id == user_id, ServiceAccount.id.in_(ids)
+    )
+
+
+def render_draft(
+    service: Optional[ServiceAccount],
+    user_id: int,
+    request_type: str,
+    regime: Optional[str],
+    locale: Optional[str] = None,
+) -> dict:
     if not service or service.user_id != user_id:
         raise RequestError("Service not found")
-    subject, body = draft_template(service, request_type, regime)
+    subject, body = draft_template(service, request_type, regime, locale)
     to_address = f"support@{service.domain}"
     return {"to": to_address, "subject": subject, "body": body}
 
 
+def render_drafts(
+    services: Iterable[ServiceAccount],
+    ids: List[int],
+    user_id: int,
+    request_type: str,
+    regime: Optional[str],
+    locale: Optional[str],
+) -> dict:
+    by_id = {service.id: service for service in services}
+    drafts = [
+        {"service_account_id": i, **render_draft(by_id[i], user_id, request_type, regime, locale)}
+        for i in ids
+        if i in by_id
+    ]
+    return {"drafts": drafts, "missing": [i for i in ids if i not in by_id]}
+
+
 def create_request_record(
     session: Session,
     user_id: int,
@@ -35,9 +115,25 @@ def create_request_record(
     request_type: str,
     gmail_thread_id: Optional[str],
     gmail_message_id: Optional[str],
+) -> PrivacyRequest:
+    request = new_request(user_id, service_account_id, request_type, gmail_thread_id, gmail_message_id)
+    session.add(request)
+    mark_changed(session, user_id, REQUESTS)
+    session.commit()
+    session.refresh(request)
+    return request
+
+
+
+def new_request(
+    user_id: int,
+    service_account_id: int,
+    request_type: str,
+    gmail_thread_id: Optional[str],
+    gmail_message_id: Optional[str],
 ) -> PrivacyRequest:
     now = datetime.now(timezone.utc)
-    request = PrivacyRequest(
+    return PrivacyRequest(
         user_id=user_id,
         service_account_id=service_account_id,
         request_type=request_type,
@@ -47,10 +143,31 @@ def create_request_record(
         created_at=now,
         updated_at=now,
     )
-    session.add(request)
+
+
+def record_sent_requests(
+    session: Session, user_id: int, sent: Sequence[Tuple[dict, dict]]
+) -> List[PrivacyRequest]:
+    """Insert the request and its "sent" log for each (item, Gmail response) in one commit."""
+    requests = [
+        new_request(
+            user_id,
+            item["service_account_id"],
+            item["request_type"],
+            response.get("threadId"),
+            response.get("id"),
+        )
+        for item, response in sent
+    ]
+    session.add_all(requests)
+    mark_changed(session, user_id, REQUESTS)
+    session.flush()
+    session.add_all(
+        RequestLog(privacy_request_id=request.id, event_type="sent", payload_json="{}")
+        for request in requests
+    )
     session.commit()
-    session.refresh(request)
-    return request
+    return requests
 
 
 def log_request_event(session: Session, request_id: int, event_type: str, payload: str) -> None:
@@ -63,6 +180,7 @@ def log_request_event(session: Session, request_id: int, event_type: str, payloa
     session.commit()
 
 
+
 def list_requests(session: Session, user_id: int) -> list[PrivacyRequest]:
     statement = select(PrivacyRequest).where(PrivacyRequest.user_id == user_id)
     return list(session.exec(statement))
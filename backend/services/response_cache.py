@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import Request, Response
+import orjson
+from redis import Redis, RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from services.redis_client import get_redis
+from settings import settings
+
+VERSION_KEY = "version:{resource}:{user_id}"
+BODY_KEY = "cache:{resource}:{user_id}:{etag}"
+PENDING_BUMPS = "response_cache_bumps"
+
+SERVICES = "services"
+REQUESTS = "requests"
+
+
+def mark_changed(session: Any, user_id: int, resource: str) -> None:
+    """Bump the user's `resource` version once the session's transaction commits.
+
+    Bumping before the commit would let a concurrent reader cache pre-commit rows under
+    the new version, so the bump waits for `after_commit`.
+    """
+    session.info.setdefault(PENDING_BUMPS, set()).add((resource, user_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed(session: Session) -> None:
+    bumps = session.info.pop(PENDING_BUMPS, None)
+    if not bumps:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for resource, user_id in bumps:
+            pipe.incr(VERSION_KEY.format(resource=resource, user_id=user_id))
+        pipe.execute()
+    except RedisError:
+        # The commit already happened; cached bodies expire after RESPONSE_CACHE_TTL_SECONDS.
+        pass
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_bumps(session: Session) -> None:
+    session.info.pop(PENDING_BUMPS, None)
+
+
+def response_etag(version: int, user_id: int, resource: str, request: Request) -> str:
+    # The same version serves many pages and filters, so the query is part of the tag.
+    query = "&".join(sorted(str(request.query_params).split("&")))
+    digest = hashlib.blake2b(f"{resource}:{user_id}:{query}".encode(), digest_size=8).hexdigest()
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in header.split(","))
+
+
+def _lookup(
+    redis: Redis, user_id: int, resource: str, request: Request
+) -> Tuple[str, Optional[str]]:
+    version = int(redis.get(VERSION_KEY.format(resource=resource, user_id=user_id)) or 0)
+    etag = response_etag(version, user_id, resource, request)
+    if etag_matches(request, etag):
+        return etag, None
+    return etag, redis.get(BODY_KEY.format(resource=resource, user_id=user_id, etag=etag))
+
+
+async def cached_response(
+    request: Request,
+    user_id: int,
+    resource: str,
+    produce: Callable[[], Awaitable[dict]],
+) -> Response:
+    """Answer a read route from its ETag or cached body, falling back to `produce`.
+
+    Without Redis there is no version to tag, so the page is produced with no ETag.
+    """
+    redis = get_redis()
+    try:
+        etag, body = await asyncio.to_thread(_lookup, redis, user_id, resource, request)
+    except RedisError:
+        return Response(content=orjson.dumps(await produce()), media_type="application/json")
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if body is None:
+        # Pages are plain dicts of column values, which orjson encodes without a
+        # jsonable_encoder pass.
+        body = orjson.dumps(await produce())
+        key = BODY_KEY.format(resource=resource, user_id=user_id, etag=etag)
+        try:
+            await asyncio.to_thread(redis.set, key, body, ex=settings.response_cache_ttl_seconds)
+        except RedisError:
+            pass
+    return Response(content=body, media_type="application/json", headers=headers)
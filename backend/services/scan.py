@@ -1,70 +1,519 @@
+import asyncio
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Dict, List
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Union,
+)
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from gmail.async_client import AsyncGmailClient
+from gmail.client import (
+    LIST_PAGE_LIMIT,
+    BatchResult,
+    GmailClient,
+    HistoryExpiredError,
+    HistoryPage,
+)
+from models.email_connection import EmailConnection
 from models.service_account import ServiceAccount
 from services.parsing import extract_domain, normalize_domain, infer_service_name
+from services.response_cache import SERVICES, mark_changed
+from settings import settings
 
 
-SUBJECT_QUERY = "subject:(welcome OR verify OR account OR subscription OR confirm)"
+SUBJECT_KEYWORDS = ["welcome", "verify", "account", "subscription", "confirm"]
+SUBJECT_QUERY = f"subject:({' OR '.join(SUBJECT_KEYWORDS)})"
+SUBJECT_PATTERN = re.compile(rf"\b({'|'.join(SUBJECT_KEYWORDS)})\b", re.IGNORECASE)
 
 
 def build_scan_query() -> str:
     return f"{SUBJECT_QUERY} newer_than:1y"
 
 
+def matches_scan_query(headers: Dict[str, str]) -> bool:
+    return bool(SUBJECT_PATTERN.search(headers.get("Subject", "")))
+
+
+def parse_headers(payload: dict) -> Dict[str, str]:
+    headers = payload.get("payload", {}).get("headers", [])
+    return {h.get("name"): h.get("value") for h in headers if h.get("name")}
+
+
+def message_time(payload: dict, headers: Dict[str, str]) -> datetime:
+    internal_date = payload.get("internalDate")
+    if internal_date:
+        return datetime.fromtimestamp(int(internal_date) / 1000, tz=timezone.utc)
+    try:
+        sent = parsedate_to_datetime(headers.get("Date", ""))
+    except (TypeError, ValueError):
+        return datetime.now(timezone.utc)
+    if sent.tzinfo is None:
+        return sent.replace(tzinfo=timezone.utc)
+    return sent.astimezone(timezone.utc)
+
+
+@dataclass
+class DomainEvidence:
+    domain: str
+    count: int
+    first_seen_at: datetime
+    last_seen_at: datetime
+    names: Counter = field(default_factory=Counter)
+
+    @property
+    def service_name(self) -> str:
+        return self.names.most_common(1)[0][0]
+
+    def add(self, name: str, seen_at: datetime) -> None:
+        self.count += 1
+        self.names[name] += 1
+        self.first_seen_at = min(self.first_seen_at, seen_at)
+        self.last_seen_at = max(self.last_seen_at, seen_at)
+
+
+def aggregate_evidence(
+    messages: List[dict], metadata_map: Dict[str, dict], match_subject: bool = False
+) -> Dict[str, DomainEvidence]:
+    evidence: Dict[str, DomainEvidence] = {}
+    for msg in messages:
+        msg_id = msg.get("id")
+        if not msg_id or msg_id not in metadata_map:
+            continue
+        metadata = metadata_map[msg_id]
+        headers = parse_headers(metadata)
+        if match_subject and not matches_scan_query(headers):
+            continue
+        from_header = headers.get("From", "")
+        domain = extract_domain(from_header)
+        if not domain:
+            continue
+        normalized = normalize_domain(domain)
+        seen_at = message_time(metadata, headers)
+        entry = evidence.get(normalized)
+        if entry is None:
+            entry = evidence[normalized] = DomainEvidence(normalized, 0, seen_at, seen_at)
+        entry.add(infer_service_name(from_header, domain), seen_at)
+    return evidence
+
+
+def bulk_upsert_services(
+    session: Session,
+    user_id: int,
+    evidence: Iterable[DomainEvidence],
+    replace_counts: bool = False,
+) -> None:
+    rows = [
+        {
+            "user_id": user_id,
+            "service_name": item.service_name,
+            "domain": item.domain,
+            "first_seen_at": item.first_seen_at,
+            "last_seen_at": item.last_seen_at,
+            "evidence_count": item.count,
+        }
+        for item in evidence
+    ]
+    if not rows:
+        return
+    mark_changed(session, user_id, SERVICES)
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        statement = postgresql_insert(ServiceAccount).values(rows)
+        earliest, latest = func.least, func.greatest
+    elif dialect == "sqlite":
+        statement = sqlite_insert(ServiceAccount).values(rows)
+        earliest, latest = func.min, func.max
+    else:
+        _upsert_rows(session, rows, replace_counts)
+        return
+    table = ServiceAccount.__table__
+    excluded = statement.excluded
+    evidence_count = excluded.evidence_count
+    if not replace_counts:
+        evidence_count = table.c.evidence_count + excluded.evidence_count
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id", "domain"],
+        set_={
+            "first_seen_at": earliest(table.c.first_seen_at, excluded.first_seen_at),
+            "last_seen_at": latest(table.c.last_seen_at, excluded.last_seen_at),
+            "evidence_count": evidence_count,
+        },
+    )
+    session.exec(statement)
+
+
 def upsert_service(
     session: Session, user_id: int, domain: str, service_name: str
 ) -> ServiceAccount:
+    """Record one piece of evidence for a sender domain and return its service row."""
     normalized = normalize_domain(domain)
+    now = datetime.now(timezone.utc)
+    evidence = DomainEvidence(normalized, 1, now, now, Counter({service_name: 1}))
+    bulk_upsert_services(session, user_id, [evidence])
     statement = select(ServiceAccount).where(
         ServiceAccount.user_id == user_id, ServiceAccount.domain == normalized
     )
-    existing = session.exec(statement).first()
-    now = datetime.now(timezone.utc)
-    if existing:
-        existing.last_seen_at = now
-        existing.evidence_count += 1
+    return session.exec(statement.execution_options(populate_existing=True)).one()
+
+
+def _upsert_rows(session: Session, rows: List[dict], replace_counts: bool) -> None:
+    for row in rows:
+        statement = select(ServiceAccount).where(
+            ServiceAccount.user_id == row["user_id"], ServiceAccount.domain == row["domain"]
+        )
+        existing = session.exec(statement).first()
+        if not existing:
+            session.add(ServiceAccount(**row))
+            continue
+        existing.first_seen_at = min(_aware(existing.first_seen_at), row["first_seen_at"])
+        existing.last_seen_at = max(_aware(existing.last_seen_at), row["last_seen_at"])
+        if replace_counts:
+            existing.evidence_count = row["evidence_count"]
+        else:
+            existing.evidence_count += row["evidence_count"]
         session.add(existing)
-        return existing
-    service = ServiceAccount(
-        user_id=user_id,
-        service_name=service_name,
-        domain=normalized,
-        first_seen_at=now,
-        last_seen_at=now,
-        evidence_count=1,
-    )
-    session.add(service)
-    return service
 
 
-def process_message_headers(
-    session: Session, user_id: int, headers: Dict[str, str]
-) -> ServiceAccount | None:
-    from_header = headers.get("From", "")
-    domain = extract_domain(from_header)
-    if not domain:
-        return None
-    service_name = infer_service_name(from_header, domain)
-    return upsert_service(session, user_id, domain, service_name)
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
 
 
-def parse_headers(payload: dict) -> Dict[str, str]:
-    headers = payload.get("payload", {}).get("headers", [])
-    return {h.get("name"): h.get("value") for h in headers if h.get("name")}
+@dataclass
+class ScanResult:
+    scanned: int = 0
+    fetched: int = 0
+    failed: int = 0
+    services: int = 0
+    incremental: bool = False
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def stage_seconds(self) -> Dict[str, float]:
+        return {stage: round(seconds, 3) for stage, seconds in self.timings.items()}
+
+
+class ScanCancelled(Exception):
+    pass
+
+
+SessionLike = Union[Session, AsyncSession]
+Messages = Union[Iterable[dict], AsyncIterable[dict]]
+ProgressCallback = Callable[[ScanResult], None]
+CancelCheck = Callable[[], bool]
+
+_DONE = object()
+
+
+def iter_chunks(items: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+async def aiter_chunks(items: AsyncIterable[dict], size: int) -> AsyncIterator[List[dict]]:
+    chunk: List[dict] = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _chunks(messages: Messages, size: int) -> AsyncIterator[List[dict]]:
+    if hasattr(messages, "__aiter__"):
+        async for chunk in aiter_chunks(messages, size):
+            yield chunk
+        return
+    # Sync sources (the RQ path) page through Gmail off the event loop.
+    chunks = iter_chunks(messages, size)
+    while chunk := await asyncio.to_thread(next, chunks, None):
+        yield chunk
+
+
+async def _run_db(session: SessionLike, fn: Callable[..., Any], *args: Any) -> Any:
+    if isinstance(session, AsyncSession):
+        return await session.run_sync(fn, *args)
+    return fn(session, *args)
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+class ThreadedGmailClient:
+    """Async facade over GmailClient so the RQ worker runs the same scan pipeline."""
+
+    def __init__(self, client: GmailClient):
+        self._client = client
+        self._local = threading.local()
+
+    def _thread_client(self) -> GmailClient:
+        # httplib2 is not thread-safe: every fetch thread gets its own client.
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._client.clone()
+        return client
+
+    async def get_profile(self) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._client.get_profile)
+
+    async def iter_history(
+        self, start_history_id: str, page_size: int = LIST_PAGE_LIMIT
+    ) -> AsyncIterator[HistoryPage]:
+        pages = self._client.iter_history(start_history_id, page_size)
+        while page := await asyncio.to_thread(next, pages, None):
+            yield page
+
+    def iter_candidate_messages(
+        self, query: str, page_size: int = 100, limit: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        return self._client.iter_candidate_messages(query, page_size=page_size, limit=limit)
+
+    async def get_messages_metadata_batch(self, message_ids: Iterable[str]) -> BatchResult:
+        ids = list(message_ids)
+        return await asyncio.to_thread(
+            lambda: self._thread_client().get_messages_metadata_batch(ids)
+        )
+
+
+def write_chunk(
+    session: Session,
+    user_id: int,
+    chunk: List[dict],
+    metadata: BatchResult,
+    result: ScanResult,
+    touched: Set[str],
+    recount: bool = False,
+    match_subject: bool = False,
+) -> None:
+    evidence = aggregate_evidence(chunk, metadata.items, match_subject)
+    if recount:
+        fresh = [e for domain, e in evidence.items() if domain not in touched]
+        seen = [e for domain, e in evidence.items() if domain in touched]
+        bulk_upsert_services(session, user_id, fresh, replace_counts=True)
+        bulk_upsert_services(session, user_id, seen)
+    else:
+        bulk_upsert_services(session, user_id, evidence.values())
+    touched.update(evidence)
+    result.scanned += len(chunk)
+    result.fetched += len(metadata.items)
+    result.failed += len(metadata.errors)
+    result.services = len(touched)
+
+
+async def collect_services_async(
+    session: SessionLike,
+    user_id: int,
+    client: Union[AsyncGmailClient, ThreadedGmailClient],
+    messages: Messages,
+    chunk_size: Optional[int] = None,
+    recount: bool = False,
+    match_subject: bool = False,
+    on_progress: Optional[ProgressCallback] = None,
+    is_cancelled: Optional[CancelCheck] = None,
+) -> ScanResult:
+    """Lister -> concurrent metadata fetchers -> single DB writer, over bounded queues.
+
+    Only the chunks in flight are held in memory; a slow writer backs up the fetchers,
+    which in turn stall the lister. Stage timings are busy seconds summed per stage.
+    """
+    result = ScanResult()
+    touched: Set[str] = set()
+    workers = max(1, settings.scan_fetch_concurrency)
+    fetch_queue: asyncio.Queue = asyncio.Queue(settings.scan_queue_size)
+    write_queue: asyncio.Queue = asyncio.Queue(settings.scan_queue_size)
+
+    async def check_cancelled() -> None:
+        # The callbacks may do blocking I/O (scan job state lives in Redis), so they run in
+        # a thread whether the scan is on the API's loop or in a worker.
+        if is_cancelled and await asyncio.to_thread(is_cancelled):
+            raise ScanCancelled()
+
+    async def list_stage() -> None:
+        chunks = _chunks(messages, chunk_size or settings.scan_chunk_size)
+        while True:
+            await check_cancelled()
+            with _timed(result.timings, "list"):
+                chunk = await anext(chunks, None)
+            if chunk is None:
+                break
+            await fetch_queue.put(chunk)
+        for _ in range(workers):
+            await fetch_queue.put(_DONE)
+
+    async def fetch_stage() -> None:
+        while (chunk := await fetch_queue.get()) is not _DONE:
+            with _timed(result.timings, "fetch"):
+                metadata = await client.get_messages_metadata_batch(m.get("id") for m in chunk)
+            await write_queue.put((chunk, metadata))
+        await write_queue.put(_DONE)
+
+    async def write_stage() -> None:
+        running = workers
+        while running:
+            item = await write_queue.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            await check_cancelled()
+            chunk, metadata = item
+            with _timed(result.timings, "write"):
+                await _run_db(
+                    session, write_chunk, user_id, chunk, metadata, result, touched,
+                    recount, match_subject,
+                )
+            if on_progress:
+                await asyncio.to_thread(on_progress, result)
+
+    with _timed(result.timings, "total"):
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(list_stage())
+                for _ in range(workers):
+                    group.create_task(fetch_stage())
+                group.create_task(write_stage())
+        except BaseExceptionGroup as errors:
+            raise errors.exceptions[0] from None
+    return result
 
 
 def collect_services(
-    session: Session, user_id: int, messages: List[dict], metadata_map: Dict[str, dict]
-) -> List[ServiceAccount]:
-    seen = []
-    for msg in messages:
-        msg_id = msg.get("id")
-        if not msg_id:
-            continue
-        metadata = metadata_map.get(msg_id, {})
-        headers = parse_headers(metadata)
-        service = process_message_headers(session, user_id, headers)
-        if service:
-            seen.append(service)
-    return seen
+    session: Session,
+    user_id: int,
+    client: GmailClient,
+    messages: Iterable[dict],
+    chunk_size: Optional[int] = None,
+    recount: bool = False,
+    match_subject: bool = False,
+    on_progress: Optional[ProgressCallback] = None,
+) -> ScanResult:
+    return asyncio.run(
+        collect_services_async(
+            session, user_id, ThreadedGmailClient(client), messages, chunk_size,
+            recount, match_subject, on_progress,
+        )
+    )
+
+
+def scan_limit() -> Optional[int]:
+    return settings.scan_message_limit if settings.scan_message_limit > 0 else None
+
+
+def get_connection(session: Session, user_id: int) -> Optional[EmailConnection]:
+    statement = select(EmailConnection).where(
+        EmailConnection.user_id == user_id, EmailConnection.provider == "google"
+    )
+    return session.exec(statement).first()
+
+
+class HistoryStream:
+    """Messages added since a checkpoint, handed to the scan pipeline page by page.
+
+    Only the ids already yielded are kept, so a message listed on two pages is counted
+    once. `history_id` is the latest one Gmail reported on the pages read so far.
+    """
+
+    def __init__(self, pages: AsyncIterator[HistoryPage]):
+        self._pages = pages
+        self._first: Optional[HistoryPage] = None
+        self.history_id: Optional[str] = None
+
+    async def start(self) -> None:
+        # An expired checkpoint fails on the first page, before any scan work starts.
+        self._first = await anext(self._pages)
+        self.history_id = self._first[1]
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        seen: Set[str] = set()
+        page = self._first
+        while page is not None:
+            messages, self.history_id = page
+            for message in messages:
+                if message["id"] not in seen:
+                    seen.add(message["id"])
+                    yield message
+            page = await anext(self._pages, None)
+
+
+async def scan_mailbox_async(
+    session: SessionLike,
+    user_id: int,
+    client: Union[AsyncGmailClient, ThreadedGmailClient],
+    on_progress: Optional[ProgressCallback] = None,
+    is_cancelled: Optional[CancelCheck] = None,
+) -> ScanResult:
+    connection = await _run_db(session, get_connection, user_id)
+    if connection and connection.history_id:
+        history = HistoryStream(
+            client.iter_history(connection.history_id, page_size=settings.scan_page_size)
+        )
+        try:
+            await history.start()
+        except HistoryExpiredError:
+            pass
+        else:
+            result = await collect_services_async(
+                session, user_id, client, history, match_subject=True,
+                on_progress=on_progress, is_cancelled=is_cancelled,
+            )
+            result.incremental = True
+            await _run_db(session, save_checkpoint, connection, history.history_id)
+            return result
+
+    history_id = (await client.get_profile()).get("historyId")
+    messages = client.iter_candidate_messages(
+        build_scan_query(), page_size=settings.scan_page_size, limit=scan_limit()
+    )
+    result = await collect_services_async(
+        session, user_id, client, messages, recount=True,
+        on_progress=on_progress, is_cancelled=is_cancelled,
+    )
+    if connection:
+        await _run_db(session, save_checkpoint, connection, history_id)
+    return result
+
+
+def scan_mailbox(
+    session: Session,
+    user_id: int,
+    client: GmailClient,
+    on_progress: Optional[ProgressCallback] = None,
+    is_cancelled: Optional[CancelCheck] = None,
+) -> ScanResult:
+    return asyncio.run(
+        scan_mailbox_async(session, user_id, ThreadedGmailClient(client), on_progress, is_cancelled)
+    )
+
+
+def save_checkpoint(
+    session: Session, connection: EmailConnection, history_id: Optional[str]
+) -> None:
+    connection.history_id = str(history_id) if history_id else None
+    connection.last_scan_at = datetime.now(timezone.utc)
+    session.add(connection)
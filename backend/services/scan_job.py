@@ -1,19 +1,48 @@
+from typing import Optional
 from sqlmodel import Session
 from db import engine
 from services.gmail_service import get_gmail_client
-from services.scan import build_scan_query, collect_services
+from services.push import pushed_history_id
+from services.redis_client import get_redis
+from services.scan import ScanCancelled, get_connection, scan_mailbox
+from services.scan_status import ScanProgress
 
 
-def run_scan_for_user(user_id: int) -> int:
-    with Session(engine) as session:
-        client = get_gmail_client(session, user_id)
-        query = build_scan_query()
-        messages = client.list_candidate_messages(query)
-        metadata_map = {}
-        for msg in messages:
-            msg_id = msg.get("id")
-            if msg_id:
-                metadata_map[msg_id] = client.get_message_metadata(msg_id)
-        collect_services(session, user_id, messages, metadata_map)
-        session.commit()
-        return len(messages)
+def _checkpoint(session: Session, user_id: int) -> Optional[int]:
+    connection = get_connection(session, user_id)
+    return int(connection.history_id) if connection and connection.history_id else None
+
+
+def run_scan_for_user(user_id: int, job_id: Optional[str] = None) -> int:
+    progress = ScanProgress(get_redis(), job_id, user_id) if job_id else None
+    try:
+        with Session(engine) as session:
+            client = get_gmail_client(session, user_id)
+            scanned, checkpoint = 0, None
+            while True:
+                result = scan_mailbox(
+                    session,
+                    user_id,
+                    client,
+                    on_progress=progress.update if progress else None,
+                    is_cancelled=progress.cancelled if progress else None,
+                )
+                session.commit()
+                scanned += result.scanned
+                previous, checkpoint = checkpoint, _checkpoint(session, user_id)
+                # A push that arrived while this pass was listing is not in it: scan again
+                # from the new checkpoint, as long as the checkpoint keeps moving.
+                pushed = pushed_history_id(get_redis(), user_id)
+                if pushed is None or checkpoint in (None, previous) or pushed <= checkpoint:
+                    break
+    except ScanCancelled:
+        # The cancelled pass is not committed; the next scan starts from the last checkpoint.
+        progress.cancel()
+        return 0
+    except Exception as exc:
+        if progress:
+            progress.fail(exc)
+        raise
+    if progress:
+        progress.finish(result)
+    return scanned
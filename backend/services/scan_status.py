@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional, Tuple
+from uuid import uuid4
+from redis import Redis
+from rq import Queue
+from services.scan import ScanResult
+from settings import settings
+
+JOB_KEY = "scan:job:{job_id}"
+ACTIVE_KEY = "scan:active:{user_id}"
+CANCEL_KEY = "scan:cancel:{job_id}"
+TERMINAL_STATUSES = {"finished", "failed", "cancelled"}
+
+
+def _save(redis: Redis, state: dict, ttl: int) -> None:
+    state["updated_at"] = time.time()
+    redis.set(JOB_KEY.format(job_id=state["job_id"]), json.dumps(state), ex=ttl)
+
+
+def get_scan_job(redis: Redis, job_id: str) -> Optional[dict]:
+    raw = redis.get(JOB_KEY.format(job_id=job_id))
+    return json.loads(raw) if raw else None
+
+
+def request_cancel(redis: Redis, job_id: str) -> None:
+    redis.set(CANCEL_KEY.format(job_id=job_id), 1, ex=settings.scan_job_timeout_seconds)
+
+
+def claim_scan_job(redis: Redis, user_id: int) -> Tuple[str, bool]:
+    """Record a queued scan job as the user's active scan, or return the active one.
+
+    Every scan trigger claims a job here, so the id held in ACTIVE_KEY can always be
+    looked up with `get_scan_job`.
+    """
+    active_key = ACTIVE_KEY.format(user_id=user_id)
+    job_id = str(uuid4())
+    while not redis.set(active_key, job_id, nx=True, ex=settings.scan_job_timeout_seconds):
+        existing = redis.get(active_key)
+        if existing:
+            return existing, True
+        # The active scan ended between the two calls; claim again rather than overwrite
+        # a key another caller may have just taken.
+    state = {
+        "job_id": job_id,
+        "user_id": user_id,
+        "status": "queued",
+        "listed": 0,
+        "fetched": 0,
+        "services": 0,
+        "failed": 0,
+        "result": None,
+        "error": None,
+    }
+    _save(redis, state, settings.scan_job_timeout_seconds)
+    return job_id, False
+
+
+def start_scan_job(redis: Redis, queue: Queue, user_id: int) -> Tuple[str, bool]:
+    """Enqueue a scan for the user, or return the one already queued or running."""
+    from services.scan_job import run_scan_for_user
+
+    job_id, coalesced = claim_scan_job(redis, user_id)
+    if coalesced:
+        return job_id, True
+    queue.enqueue(
+        run_scan_for_user,
+        user_id,
+        job_id,
+        job_id=job_id,
+        job_timeout=settings.scan_job_timeout_seconds,
+    )
+    return job_id, False
+
+
+class ScanProgress:
+    def __init__(self, redis: Redis, job_id: str, user_id: int):
+        self._redis = redis
+        self._state = get_scan_job(redis, job_id) or {"job_id": job_id, "user_id": user_id}
+        self._state.update(status="running", error=None)
+        _save(redis, self._state, settings.scan_job_timeout_seconds)
+
+    def _record(self, result: ScanResult) -> None:
+        self._state.update(
+            listed=result.scanned,
+            fetched=result.fetched,
+            services=result.services,
+            failed=result.failed,
+        )
+
+    def update(self, result: ScanResult) -> None:
+        self._record(result)
+        _save(self._redis, self._state, settings.scan_job_timeout_seconds)
+
+    def finish(self, result: ScanResult) -> None:
+        self._record(result)
+        self._state.update(
+            status="finished",
+            result={
+                "scanned": result.scanned,
+                "failed": result.failed,
+                "services": result.services,
+                "incremental": result.incremental,
+                "timings": result.stage_seconds(),
+            },
+        )
+        self._close()
+
+    def cancelled(self) -> bool:
+        return bool(self._redis.exists(CANCEL_KEY.format(job_id=self._state["job_id"])))
+
+    def cancel(self) -> None:
+        self._state.update(status="cancelled")
+        self._close()
+
+    def fail(self, error: BaseException) -> None:
+        self._state.update(status="failed", error=str(error) or type(error).__name__)
+        self._close()
+
+    def _close(self) -> None:
+        _save(self._redis, self._state, settings.scan_result_ttl_seconds)
+        active_key = ACTIVE_KEY.format(user_id=self._state["user_id"])
+        if self._redis.get(active_key) == self._state["job_id"]:
+            self._redis.delete(active_key)
+        self._redis.delete(CANCEL_KEY.format(job_id=self._state["job_id"]))
+
+
+async def scan_job_events(redis: Redis, job_id: str) -> AsyncIterator[str]:
+    """Server-sent events for a scan job: one event per state change until it ends."""
+    last_update = None
+    while True:
+        state = await asyncio.to_thread(get_scan_job, redis, job_id)
+        if state is None:
+            yield "event: expired\ndata: {}\n\n"
+            return
+        if state["updated_at"] != last_update:
+            last_update = state["updated_at"]
+            yield f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
+        if state["status"] in TERMINAL_STATUSES:
+            return
+        await asyncio.sleep(settings.scan_events_poll_seconds)
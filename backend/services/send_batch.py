@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import json
+import time
+from email.utils import parseaddr
+from typing import AsyncIterator, Callable, Collection, List, Optional, Tuple
+from uuid import uuid4
+from redis import Redis
+from rq import Queue
+from sqlmodel import Session
+from db import engine
+from gmail.client import GmailClient
+from services.gmail_service import get_gmail_client
+from services.rate_limit import RateLimit, take_tokens
+from services.redis_client import get_redis
+from services.requests import RequestError, check_request_type, record_sent_requests
+from settings import settings
+
+SEND_JOB_KEY = "send:job:{job_id}"
+SEND_RESULTS_KEY = "send:job:{job_id}:results"
+USER_PACE_KEY = "send:{user_id}"
+DOMAIN_PACE_KEY = "send:{user_id}:domain:{domain}"
+SEND_FIELDS = ("to", "subject", "body", "service_account_id", "request_type")
+TERMINAL_STATUSES = {"finished", "failed"}
+
+
+def recipient_domain(address: str) -> str:
+    return parseaddr(address)[1].rpartition("@")[2].lower()
+
+
+def check_send_items(items: object) -> List[dict]:
+    if not isinstance(items, list) or not items:
+        raise RequestError("No requests to send")
+    if len(items) > settings.send_batch_max_items:
+        raise RequestError(f"At most {settings.send_batch_max_items} requests per batch")
+    checked = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not all(item.get(name) for name in SEND_FIELDS):
+            raise RequestError(f"Missing fields in item {index}")
+        check_request_type(item["request_type"])
+        if not recipient_domain(item["to"]):
+            raise RequestError(f"Invalid recipient in item {index}")
+        checked_item = {name: item[name] for name in SEND_FIELDS}
+        try:
+            checked_item["service_account_id"] = int(item["service_account_id"])
+        except (TypeError, ValueError):
+            raise RequestError(f"Invalid service_account_id in item {index}")
+        checked.append(checked_item)
+    return checked
+
+
+def unknown_services(items: List[dict], owned: Collection[int]) -> List[int]:
+    return sorted({item["service_account_id"] for item in items} - set(owned))
+
+
+def _save(redis: Redis, state: dict) -> None:
+    state["updated_at"] = time.time()
+    key = SEND_JOB_KEY.format(job_id=state["job_id"])
+    redis.set(key, json.dumps(state), ex=settings.send_batch_ttl_seconds)
+
+
+def _new_state(job_id: str, user_id: int, total: int) -> dict:
+    return {"job_id": job_id, "user_id": user_id, "total": total, "sent": 0, "failed": 0}
+
+
+def get_send_job(redis: Redis, job_id: str) -> Optional[dict]:
+    raw = redis.get(SEND_JOB_KEY.format(job_id=job_id))
+    return json.loads(raw) if raw else None
+
+
+def get_send_results(redis: Redis, job_id: str, start: int = 0) -> List[dict]:
+    raw_results = redis.lrange(SEND_RESULTS_KEY.format(job_id=job_id), start, -1)
+    return [json.loads(raw) for raw in raw_results]
+
+
+def start_send_batch(redis: Redis, queue: Queue, user_id: int, items: List[dict]) -> str:
+    job_id = str(uuid4())
+    _save(redis, {**_new_state(job_id, user_id, len(items)), "status": "queued"})
+    queue.enqueue(
+        run_send_batch,
+        user_id,
+        job_id,
+        items,
+        job_id=job_id,
+        job_timeout=settings.send_batch_job_timeout_seconds,
+    )
+    return job_id
+
+
+class BatchSender:
+    """Sends a batch in pacing order and records what was sent in bulk.
+
+    Items whose recipient domain is out of budget are pushed back until it refills, so
+    one slow domain does not hold up the rest. Rows are written whenever the sender is
+    about to wait, every SEND_BATCH_FLUSH_SIZE sends, and when the run ends or fails, and
+    each item's result is published only after its rows are committed.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        redis: Redis,
+        user_id: int,
+        client: GmailClient,
+        state: dict,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._session = session
+        self._redis = redis
+        self._user_id = user_id
+        self._client = client
+        self._state = state
+        self._sleep = sleep
+        self._user_limit = RateLimit.parse(settings.send_pace_per_user)
+        self._domain_limit = RateLimit.parse(settings.send_pace_per_domain)
+        self._sent: List[Tuple[int, dict, dict]] = []
+
+    def run(self, items: List[dict]) -> None:
+        try:
+            self._run(items)
+        finally:
+            # Emails already sent must get their rows even if pacing fails mid-batch.
+            self.flush()
+
+    def _run(self, items: List[dict]) -> None:
+        ready: List[Tuple[float, int]] = [(0.0, index) for index in range(len(items))]
+        while ready:
+            wait = ready[0][0] - time.monotonic()
+            if wait > 0:
+                self._pause(wait)
+            _, index = heapq.heappop(ready)
+            item = items[index]
+            key = DOMAIN_PACE_KEY.format(user_id=self._user_id, domain=recipient_domain(item["to"]))
+            allowed, _, retry_after = take_tokens(self._redis, key, self._domain_limit)
+            if not allowed:
+                heapq.heappush(ready, (time.monotonic() + retry_after, index))
+                continue
+            while True:
+                allowed, _, retry_after = take_tokens(
+                    self._redis, USER_PACE_KEY.format(user_id=self._user_id), self._user_limit
+                )
+                if allowed:
+                    break
+                self._pause(retry_after)
+            self._send(index, item)
+
+    def _pause(self, seconds: float) -> None:
+        self.flush()
+        self._sleep(seconds)
+
+    def _send(self, index: int, item: dict) -> None:
+        try:
+            response = self._client.send_email(item["to"], item["subject"], item["body"])
+        except Exception as exc:
+            self._state["failed"] += 1
+            error = str(exc) or type(exc).__name__
+            self._publish([self._result(index, item, status="failed", error=error)])
+            return
+        self._sent.append((index, item, response))
+        if len(self._sent) >= settings.send_batch_flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._sent:
+            return
+        sent, self._sent = self._sent, []
+        requests = record_sent_requests(
+            self._session, self._user_id, [(item, response) for _, item, response in sent]
+        )
+        self._state["sent"] += len(sent)
+        self._publish(
+            [
+                self._result(index, item, status="sent", id=request.id)
+                for (index, item, _), request in zip(sent, requests)
+            ]
+        )
+
+    def _result(self, index: int, item: dict, **fields) -> dict:
+        return {"index": index, "service_account_id": item["service_account_id"], **fields}
+
+    def _publish(self, results: List[dict]) -> None:
+        key = SEND_RESULTS_KEY.format(job_id=self._state["job_id"])
+        pipe = self._redis.pipeline()
+        pipe.rpush(key, *(json.dumps(result) for result in results))
+        pipe.expire(key, settings.send_batch_ttl_seconds)
+        pipe.execute()
+        _save(self._redis, self._state)
+
+
+def run_send_batch(user_id: int, job_id: str, items: List[dict]) -> int:
+    redis = get_redis()
+    state = get_send_job(redis, job_id) or _new_state(job_id, user_id, len(items))
+    state.update(status="running", error=None)
+    _save(redis, state)
+    try:
+        with Session(engine) as session:
+            client = get_gmail_client(session, user_id)
+            BatchSender(session, redis, user_id, client, state).run(items)
+    except Exception as exc:
+        state.update(status="failed", error=str(exc) or type(exc).__name__)
+        _save(redis, state)
+        raise
+    state.update(status="finished")
+    _save(redis, state)
+    return state["sent"]
+
+
+async def send_batch_events(redis: Redis, job_id: str) -> AsyncIterator[str]:
+    """Server-sent events: one `item` event per result, then the job's final state."""
+    offset = 0
+    while True:
+        state = await asyncio.to_thread(get_send_job, redis, job_id)
+        if state is None:
+            yield "event: expired\ndata: {}\n\n"
+            return
+        results = await asyncio.to_thread(get_send_results, redis, job_id, offset)
+        for result in results:
+            yield f"event: item\ndata: {json.dumps(result)}\n\n"
+        offset += len(results)
+        if state["status"] in TERMINAL_STATUSES:
+            # Results are pushed before the final state is saved, so none are left behind.
+            yield f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
+            return
+        await asyncio.sleep(settings.scan_events_poll_seconds)
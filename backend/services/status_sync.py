@@ -1,41 +1,162 @@
+import asyncio
+import json
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import List
-from sqlmodel import Session
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from sqlmodel import Session, select
+from gmail.async_client import AsyncGmailClient
+from gmail.mime import extract_plain_text
 from models.privacy_request import PrivacyRequest
 from models.request_log import RequestLog
+from services.keyword_matcher import KeywordMatcher
+from services.response_cache import REQUESTS, mark_changed
+from settings import settings
 
-COMPLETED_KEYWORDS = ["deleted", "removed", "closed your account"]
-NEEDS_INFO_KEYWORDS = ["verify", "additional information"]
+SYNCABLE_STATUSES = ["pending", "needs_info"]
 
+STATUS_RULES_PATH = Path(__file__).resolve().parent.parent / "data" / "status_rules.json"
 
-def _message_text(payload: dict) -> str:
-    headers = payload.get("payload", {}).get("headers", [])
-    subject = ""
-    for header in headers:
+
+@dataclass(frozen=True)
+class StatusRule:
+    status: str
+    priority: int
+    patterns: Tuple[str, ...]
+    negations: Tuple[str, ...] = ()
+
+
+def load_status_rules(path: Optional[Path] = None) -> List[StatusRule]:
+    path = path or Path(settings.status_rules_path or STATUS_RULES_PATH)
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    return [
+        StatusRule(
+            status=rule["status"],
+            priority=int(rule.get("priority", 0)),
+            patterns=tuple(p.lower() for p in rule["patterns"]),
+            negations=tuple(n.lower() for n in rule.get("negations", ())),
+        )
+        for rule in data["rules"]
+    ]
+
+
+def message_texts(message: dict) -> Iterator[str]:
+    payload = message.get("payload", {})
+    for header in payload.get("headers", []):
         if header.get("name") == "Subject":
-            subject = header.get("value", "")
-    return subject.lower()
+            yield header.get("value", "")
+    if message.get("snippet"):
+        yield message["snippet"]
+    if "body_text" in message:
+        yield message["body_text"]
+    elif payload.get("parts") or payload.get("body", {}).get("data"):
+        yield extract_plain_text(payload, settings.status_body_max_bytes)
+
+
+class StatusClassifier:
+    def __init__(self, rules: List[StatusRule]):
+        self._rules = sorted(rules, key=lambda rule: -rule.priority)
+        patterns: List[Tuple[str, Tuple[int, bool]]] = []
+        for index, rule in enumerate(self._rules):
+            patterns += [(pattern, (index, False)) for pattern in rule.patterns]
+            patterns += [(pattern, (index, True)) for pattern in rule.negations]
+        self._matcher: KeywordMatcher[Tuple[int, bool]] = KeywordMatcher(patterns)
+
+    def classify(self, messages: List[dict]) -> Optional[str]:
+        best: Optional[int] = None
+        for message in messages:
+            for text in message_texts(message):
+                # A negation ("not deleted") consumes the keyword it contains, so only
+                # uncovered keywords show up as positive matches.
+                for _, _, (index, negation) in self._matcher.iter_matches(text.lower()):
+                    if not negation and (best is None or index < best):
+                        best = index
+                if best == 0:
+                    return self._rules[0].status
+        return None if best is None else self._rules[best].status
+
+
+_classifier: Optional[StatusClassifier] = None
+
+
+def get_classifier() -> StatusClassifier:
+    global _classifier
+    if _classifier is None:
+        _classifier = StatusClassifier(load_status_rules())
+    return _classifier
 
 
 def evaluate_status(messages: List[dict]) -> str | None:
-    combined = " ".join(_message_text(m) for m in messages)
-    if any(k in combined for k in COMPLETED_KEYWORDS):
-        return "completed"
-    if any(k in combined for k in NEEDS_INFO_KEYWORDS):
-        return "needs_info"
-    return None
+    return get_classifier().classify(messages)
 
 
-def update_request_status(session: Session, request: PrivacyRequest, new_status: str) -> None:
+def _apply_status(session: Session, request: PrivacyRequest, new_status: str, now: datetime) -> None:
     request.status = new_status
-    request.updated_at = datetime.now(timezone.utc)
+    request.updated_at = now
     session.add(request)
+    mark_changed(session, request.user_id, REQUESTS)
+    session.add(
+        RequestLog(
+            privacy_request_id=request.id,
+            event_type="sync",
+            payload_json=f"status:{new_status}",
+        )
+    )
+
+
+def update_request_status(session: Session, request: PrivacyRequest, new_status: str) -> None:
+    _apply_status(session, request, new_status, datetime.now(timezone.utc))
     session.commit()
 
-    log = RequestLog(
-        privacy_request_id=request.id,
-        event_type="sync",
-        payload_json=f"status:{new_status}",
+
+@dataclass
+class SyncOutcome:
+    request: PrivacyRequest
+    status: Optional[str] = None
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def changed(self) -> bool:
+        return self.status is not None and self.status != self.request.status
+
+
+def pending_requests(session: Session, user_id: int) -> List[PrivacyRequest]:
+    statement = select(PrivacyRequest).where(
+        PrivacyRequest.user_id == user_id,
+        PrivacyRequest.status.in_(SYNCABLE_STATUSES),
+        PrivacyRequest.gmail_thread_id.is_not(None),
     )
-    session.add(log)
-    session.commit()
+    return list(session.exec(statement))
+
+
+async def check_request(client: AsyncGmailClient, request: PrivacyRequest) -> SyncOutcome:
+    started = time.perf_counter()
+    outcome = SyncOutcome(request)
+    try:
+        messages = await client.list_thread_messages(
+            request.gmail_thread_id, body_max_bytes=settings.status_body_max_bytes or None
+        )
+        outcome.status = evaluate_status(messages)
+    except Exception as exc:
+        outcome.error = str(exc)
+    outcome.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    return outcome
+
+
+async def check_requests(
+    client: AsyncGmailClient, requests: List[PrivacyRequest]
+) -> List[SyncOutcome]:
+    return list(await asyncio.gather(*(check_request(client, r) for r in requests)))
+
+
+def apply_status_updates(session: Session, outcomes: List[SyncOutcome]) -> int:
+    now = datetime.now(timezone.utc)
+    changed = [o for o in outcomes if o.changed]
+    for outcome in changed:
+        _apply_status(session, outcome.request, outcome.status, now)
+    if changed:
+        session.commit()
+    return len(changed)
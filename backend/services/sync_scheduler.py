@@ -0,0 +1,151 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional
+import httpx
+from redis import Redis
+from rq import Queue
+from sqlmodel import Session, select
+from db import engine
+from gmail.async_client import AsyncGmailClient
+from models.privacy_request import PrivacyRequest
+from services.gmail_quota import governor
+from services.gmail_service import get_authorized_credentials
+from services.jobs import SYNC_QUEUE, get_queue
+from services.redis_client import get_redis
+from services.status_sync import (
+    SYNCABLE_STATUSES,
+    SyncOutcome,
+    apply_status_updates,
+    check_requests,
+)
+from settings import settings
+
+DUE_KEY = "sync:due"
+ATTEMPTS_KEY = "sync:attempts"
+TICK_LOCK_KEY = "sync:tick"
+CHAIN_KEY = "sync:chain"
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(
+        settings.sync_backoff_base_seconds * (2 ** attempts),
+        settings.sync_backoff_max_seconds,
+    )
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def plan_sync(
+    session: Session, redis: Redis, now: Optional[float] = None
+) -> Dict[int, List[int]]:
+    now = time.time() if now is None else now
+    statement = (
+        select(PrivacyRequest.id, PrivacyRequest.user_id)
+        .where(
+            PrivacyRequest.status.in_(SYNCABLE_STATUSES),
+            PrivacyRequest.gmail_thread_id.is_not(None),
+        )
+        .order_by(PrivacyRequest.updated_at, PrivacyRequest.id)
+    )
+    candidates = list(session.exec(statement))
+    if not candidates:
+        return {}
+    due_at = redis.zmscore(DUE_KEY, [str(request_id) for request_id, _ in candidates])
+    plan: Dict[int, List[int]] = defaultdict(list)
+    budget = settings.sync_budget_per_tick
+    for (request_id, user_id), due in zip(candidates, due_at):
+        if budget <= 0:
+            break
+        if due is not None and due > now:
+            continue
+        if len(plan[user_id]) >= settings.sync_max_per_user:
+            continue
+        plan[user_id].append(request_id)
+        budget -= 1
+    return dict(plan)
+
+
+def record_outcomes(redis: Redis, outcomes: List[SyncOutcome], now: Optional[float] = None) -> None:
+    now = time.time() if now is None else now
+    pipe = redis.pipeline()
+    for outcome in outcomes:
+        request_id = str(outcome.request.id)
+        if outcome.changed and outcome.status not in SYNCABLE_STATUSES:
+            pipe.zrem(DUE_KEY, request_id)
+            pipe.hdel(ATTEMPTS_KEY, request_id)
+        elif outcome.changed:
+            pipe.hset(ATTEMPTS_KEY, request_id, 0)
+            pipe.zadd(DUE_KEY, {request_id: now + backoff_seconds(0)})
+        else:
+            attempts = int(redis.hget(ATTEMPTS_KEY, request_id) or 0)
+            pipe.hset(ATTEMPTS_KEY, request_id, attempts + 1)
+            pipe.zadd(DUE_KEY, {request_id: now + backoff_seconds(attempts)})
+    pipe.execute()
+
+
+async def _check_with_fresh_client(credentials, requests: List[PrivacyRequest]) -> List[SyncOutcome]:
+    # RQ jobs run each sync in a new event loop, so they cannot share the API's HTTP pool.
+    async with httpx.AsyncClient(http2=True, timeout=settings.gmail_timeout_seconds) as http:
+        client = AsyncGmailClient(credentials, http_client=http, governor=governor)
+        return await check_requests(client, requests)
+
+
+def sync_user_requests(user_id: int, request_ids: List[int]) -> int:
+    redis = get_redis()
+    with Session(engine) as session:
+        statement = select(PrivacyRequest).where(
+            PrivacyRequest.user_id == user_id,
+            PrivacyRequest.id.in_(request_ids),
+            PrivacyRequest.status.in_(SYNCABLE_STATUSES),
+        )
+        requests = list(session.exec(statement))
+        if not requests:
+            return 0
+        credentials = get_authorized_credentials(session, user_id)
+        outcomes = asyncio.run(_check_with_fresh_client(credentials, requests))
+        record_outcomes(redis, outcomes)
+        return apply_status_updates(session, outcomes)
+
+
+def enqueue_user_sync(session: Session, queue: Queue, user_id: int) -> int:
+    statement = select(PrivacyRequest.id).where(
+        PrivacyRequest.user_id == user_id,
+        PrivacyRequest.status.in_(SYNCABLE_STATUSES),
+        PrivacyRequest.gmail_thread_id.is_not(None),
+    )
+    request_ids = list(session.exec(statement))
+    if request_ids:
+        queue.enqueue(sync_user_requests, user_id, request_ids)
+    return len(request_ids)
+
+
+def run_status_sync_tick(session: Session, redis: Redis, queue: Queue) -> int:
+    plan = plan_sync(session, redis)
+    for user_id, request_ids in plan.items():
+        queue.enqueue(sync_user_requests, user_id, request_ids)
+    return sum(len(ids) for ids in plan.values())
+
+
+def status_sync_tick() -> int:
+    redis = get_redis()
+    interval = settings.sync_interval_seconds
+    # A second scheduler chain (e.g. after CHAIN_KEY expired) fails the lock and dies out.
+    if not redis.set(TICK_LOCK_KEY, "1", nx=True, ex=max(interval - 1, 1)):
+        return 0
+    queue = get_queue(SYNC_QUEUE)
+    redis.set(CHAIN_KEY, "1", ex=interval * 2)
+    queue.enqueue_in(timedelta(seconds=interval), status_sync_tick)
+    if settings.gmail_pubsub_topic:
+        from services.push import renew_expiring_watches
+
+        queue.enqueue(renew_expiring_watches)
+    with Session(engine) as session:
+        return run_status_sync_tick(session, redis, queue)
+
+
+def ensure_status_sync_scheduled(queue: Queue) -> None:
+    redis = get_redis()
+    if redis.set(CHAIN_KEY, "1", nx=True, ex=settings.sync_interval_seconds * 2):
+        queue.enqueue(status_sync_tick)
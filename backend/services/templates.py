@@ -1,42 +1,78 @@
-from typing import Tuple
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 from models.service_account import ServiceAccount
+from settings import settings
 
+TEMPLATES_PATH = Path(__file__).resolve().parent.parent / "data" / "request_templates.json"
+REQUEST_TYPES = ("unsubscribe", "delete_close")
 
-def draft_template(service: ServiceAccount, request_type: str, regime: str | None = None) -> Tuple[str, str]:
-    subject = f"Privacy request for {service.service_name}"
-    if request_type == "unsubscribe":
-        body = (
-            f"Hello {service.service_name} team,\n\n"
-            "Please unsubscribe me from all marketing emails and mailing lists. "
-            "Please confirm once complete.\n\n"
-            "Thank you"
-        )
-        return subject, body
-
-    if regime == "gdpr":
-        body = (
-            f"Hello {service.service_name} team,\n\n"
-            "I am requesting deletion of my personal data and closure of my account. "
-            "This request is made under GDPR. "
-            "Please confirm once complete.\n\n"
-            "Thank you"
-        )
-        return subject, body
-
-    if regime == "ccpa":
-        body = (
-            f"Hello {service.service_name} team,\n\n"
-            "I am requesting deletion of my personal data and closure of my account. "
-            "This request is made under CCPA. "
-            "Please confirm once complete.\n\n"
-            "Thank you"
-        )
-        return subject, body
-
-    body = (
-        f"Hello {service.service_name} team,\n\n"
-        "I am requesting deletion of my personal data and closure of my account. "
-        "Please confirm once complete.\n\n"
-        "Thank you"
-    )
-    return subject, body
+
+@dataclass(frozen=True)
+class DraftTemplate:
+    """Subject and body with everything but the service name already filled in."""
+
+    subject: Tuple[str, ...]
+    body: Tuple[str, ...]
+
+    @classmethod
+    def compile(cls, subject: str, body: str) -> "DraftTemplate":
+        return cls(tuple(subject.split("{service_name}")), tuple(body.split("{service_name}")))
+
+    def render(self, service_name: str) -> Tuple[str, str]:
+        return service_name.join(self.subject), service_name.join(self.body)
+
+
+class TemplateRegistry:
+    def __init__(self, data: dict):
+        self.default_locale = data["default_locale"]
+        self.regimes: Dict[str, str] = data["regimes"]
+        self._templates: Dict[Tuple[str, str, Optional[str]], DraftTemplate] = {}
+        for locale, strings in data["locales"].items():
+            for request_type in REQUEST_TYPES:
+                for regime in (None, *self.regimes):
+                    clause = ""
+                    if regime is not None:
+                        clause = strings["regime_clause"].replace("{regime}", self.regimes[regime])
+                    body = strings[request_type].replace("{regime_clause}", clause)
+                    key = (locale.lower(), request_type, regime)
+                    self._templates[key] = DraftTemplate.compile(strings["subject"], body)
+        self.locales = frozenset(locale for locale, _, _ in self._templates)
+        if self.default_locale not in self.locales:
+            raise ValueError(f"Default locale {self.default_locale!r} has no templates")
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> "TemplateRegistry":
+        path = path or Path(settings.request_templates_path or TEMPLATES_PATH)
+        with open(path, encoding="utf-8") as handle:
+            return cls(json.load(handle))
+
+    def resolve_locale(self, locale: Optional[str]) -> str:
+        """Best available locale: exact tag, then its language ("pt-BR" -> "pt"), then the default."""
+        if locale:
+            tag = locale.replace("_", "-").lower()
+            for candidate in (tag, tag.split("-", 1)[0]):
+                if candidate in self.locales:
+                    return candidate
+        return self.default_locale
+
+    def get(self, request_type: str, regime: Optional[str] = None, locale: Optional[str] = None) -> DraftTemplate:
+        # Unknown regimes fall back to the plain request, as the hand-written drafts did.
+        regime = regime.lower() if regime and regime.lower() in self.regimes else None
+        return self._templates[(self.resolve_locale(locale), request_type, regime)]
+
+
+@lru_cache(maxsize=1)
+def get_template_registry() -> TemplateRegistry:
+    return TemplateRegistry.load()
+
+
+def draft_template(
+    service: ServiceAccount,
+    request_type: str,
+    regime: str | None = None,
+    locale: str | None = None,
+) -> Tuple[str, str]:
+    return get_template_registry().get(request_type, regime, locale).render(service.service_name)
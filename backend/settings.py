@@ -18,6 +18,69 @@ class Settings:
     encryption_key: str = os.getenv("ENCRYPTION_KEY", "")
     dev_api_key: str = os.getenv("DEV_API_KEY", "")
     jwt_secret: str = os.getenv("JWT_SECRET", "")
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    db_pool_timeout_seconds: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    db_pool_recycle_seconds: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    redis_max_connections: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+    redis_pool_timeout_seconds: float = float(os.getenv("REDIS_POOL_TIMEOUT_SECONDS", "5"))
+    redis_socket_timeout_seconds: float = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "5"))
+    redis_health_check_interval: int = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+    scan_page_size: int = int(os.getenv("SCAN_PAGE_SIZE", "100"))
+    scan_chunk_size: int = int(os.getenv("SCAN_CHUNK_SIZE", "100"))
+    scan_message_limit: int = int(os.getenv("SCAN_MESSAGE_LIMIT", "0"))
+    scan_fetch_concurrency: int = int(os.getenv("SCAN_FETCH_CONCURRENCY", "4"))
+    scan_queue_size: int = int(os.getenv("SCAN_QUEUE_SIZE", "4"))
+    scan_job_timeout_seconds: int = int(os.getenv("SCAN_JOB_TIMEOUT_SECONDS", "1800"))
+    scan_result_ttl_seconds: int = int(os.getenv("SCAN_RESULT_TTL_SECONDS", "3600"))
+    scan_shards: int = int(os.getenv("SCAN_SHARDS", "4"))
+    scan_shard_page_size: int = int(os.getenv("SCAN_SHARD_PAGE_SIZE", "100"))
+    scan_shard_max_retries: int = int(os.getenv("SCAN_SHARD_MAX_RETRIES", "3"))
+    scan_ring_replicas: int = int(os.getenv("SCAN_RING_REPLICAS", "64"))
+    bulk_scan_ttl_seconds: int = int(os.getenv("BULK_SCAN_TTL_SECONDS", "604800"))
+    scan_events_poll_seconds: float = float(os.getenv("SCAN_EVENTS_POLL_SECONDS", "0.5"))
+    gmail_max_concurrency: int = int(os.getenv("GMAIL_MAX_CONCURRENCY", "10"))
+    gmail_max_connections: int = int(os.getenv("GMAIL_MAX_CONNECTIONS", "20"))
+    gmail_timeout_seconds: float = float(os.getenv("GMAIL_TIMEOUT_SECONDS", "30"))
+    gmail_client_cache_size: int = int(os.getenv("GMAIL_CLIENT_CACHE_SIZE", "1024"))
+    gmail_token_expiry_skew_seconds: int = int(os.getenv("GMAIL_TOKEN_EXPIRY_SKEW_SECONDS", "60"))
+    gmail_quota_units_per_second: int = int(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "15000"))
+    gmail_max_retries: int = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+    gmail_retry_base_seconds: float = float(os.getenv("GMAIL_RETRY_BASE_SECONDS", "0.5"))
+    gmail_retry_max_seconds: float = float(os.getenv("GMAIL_RETRY_MAX_SECONDS", "32"))
+    sync_interval_seconds: int = int(os.getenv("SYNC_INTERVAL_SECONDS", "300"))
+    sync_budget_per_tick: int = int(os.getenv("SYNC_BUDGET_PER_TICK", "200"))
+    sync_max_per_user: int = int(os.getenv("SYNC_MAX_PER_USER", "50"))
+    sync_backoff_base_seconds: int = int(os.getenv("SYNC_BACKOFF_BASE_SECONDS", "900"))
+    sync_backoff_max_seconds: int = int(os.getenv("SYNC_BACKOFF_MAX_SECONDS", "86400"))
+    status_rules_path: str = os.getenv("STATUS_RULES_PATH", "")
+    status_body_max_bytes: int = int(os.getenv("STATUS_BODY_MAX_BYTES", "16384"))
+    request_templates_path: str = os.getenv("REQUEST_TEMPLATES_PATH", "")
+    page_default_size: int = int(os.getenv("PAGE_DEFAULT_SIZE", "50"))
+    page_max_size: int = int(os.getenv("PAGE_MAX_SIZE", "500"))
+    response_cache_ttl_seconds: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "300"))
+    draft_batch_max_services: int = int(os.getenv("DRAFT_BATCH_MAX_SERVICES", "500"))
+    send_batch_max_items: int = int(os.getenv("SEND_BATCH_MAX_ITEMS", "500"))
+    send_batch_flush_size: int = int(os.getenv("SEND_BATCH_FLUSH_SIZE", "25"))
+    send_batch_job_timeout_seconds: int = int(os.getenv("SEND_BATCH_JOB_TIMEOUT_SECONDS", "7200"))
+    send_batch_ttl_seconds: int = int(os.getenv("SEND_BATCH_TTL_SECONDS", "86400"))
+    send_pace_per_user: str = os.getenv("SEND_PACE_PER_USER", "20/60")
+    send_pace_per_domain: str = os.getenv("SEND_PACE_PER_DOMAIN", "2/60")
+    idempotency_ttl_seconds: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    idempotency_lock_seconds: int = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+    rate_limit_scan: str = os.getenv("RATE_LIMIT_SCAN", "5/60")
+    rate_limit_scan_cost: int = int(os.getenv("RATE_LIMIT_SCAN_COST", "1"))
+    rate_limit_send: str = os.getenv("RATE_LIMIT_SEND", "30/60")
+    rate_limit_send_cost: int = int(os.getenv("RATE_LIMIT_SEND_COST", "1"))
+    rate_limit_send_batch: str = os.getenv("RATE_LIMIT_SEND_BATCH", "3/60")
+    rate_limit_send_batch_cost: int = int(os.getenv("RATE_LIMIT_SEND_BATCH_COST", "1"))
+    rate_limit_sync: str = os.getenv("RATE_LIMIT_SYNC", "6/60")
+    rate_limit_sync_cost: int = int(os.getenv("RATE_LIMIT_SYNC_COST", "1"))
+    gmail_pubsub_topic: str = os.getenv("GMAIL_PUBSUB_TOPIC", "")
+    gmail_push_token: str = os.getenv("GMAIL_PUSH_TOKEN", "")
+    gmail_push_coalesce_seconds: int = int(os.getenv("GMAIL_PUSH_COALESCE_SECONDS", "10"))
+    gmail_watch_renew_before_seconds: int = int(os.getenv("GMAIL_WATCH_RENEW_BEFORE_SECONDS", "86400"))
 
 
 settings = Settings()
@@ -1,3 +1,5 @@
+from collections import namedtuple
+from types import SimpleNamespace
 import pytest
 from sqlmodel import SQLModel, Session, create_engine
 from models.user import User
@@ -7,9 +9,122 @@ from models.privacy_request import PrivacyRequest
 from models.request_log import RequestLog
 
 
+EnqueuedJob = namedtuple("EnqueuedJob", "queue func args kwargs")
+
+
+class RecordingQueue:
+    def __init__(self, name, jobs):
+        self.name = name
+        self.jobs = jobs
+
+    def enqueue(self, func, *args, **kwargs):
+        self.jobs.append(EnqueuedJob(self.name, func, args, kwargs))
+
+
+class RecordingQueues:
+    """Stands in for `services.jobs.get_queue`: what every queue enqueued, in order."""
+
+    def __init__(self):
+        self.jobs = []
+        self._queues = {}
+
+    def __call__(self, name="default"):
+        if name not in self._queues:
+            self._queues[name] = RecordingQueue(name, self.jobs)
+        return self._queues[name]
+
+    def named(self, name):
+        return [job for job in self.jobs if job.queue == name]
+
+
+@pytest.fixture()
+def queues():
+    return RecordingQueues()
+
+
+@pytest.fixture()
+def queue(queues):
+    return queues()
+
+
+@pytest.fixture()
+def fake_user():
+    """A signed-in user for `get_current_user` overrides; tests may switch its id."""
+    return SimpleNamespace(id=1)
+
+
 @pytest.fixture()
 def session():
     engine = create_engine("sqlite://", echo=False)
     SQLModel.metadata.create_all(engine)
     with Session(engine) as session:
         yield session
+
+
+@pytest.fixture()
+def database(tmp_path):
+    """A file-backed SQLite database reachable from both sync and async engines."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    yield engine, async_engine
+    engine.dispose()
+
+
+@pytest.fixture()
+def fake_gmail():
+    from fake_gmail import FakeGmail
+
+    server = FakeGmail().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture()
+def gmail_client(fake_gmail):
+    from google.auth.credentials import AnonymousCredentials
+    from gmail.client import GmailClient
+
+    return GmailClient(AnonymousCredentials(), api_endpoint=fake_gmail.url)
+
+
+@pytest.fixture()
+def async_gmail_client(fake_gmail):
+    import httpx
+    from google.auth.credentials import AnonymousCredentials
+    from gmail.async_client import AsyncGmailClient
+
+    def build(**kwargs):
+        kwargs.setdefault("http_client", httpx.AsyncClient())
+        return AsyncGmailClient(AnonymousCredentials(), api_endpoint=fake_gmail.url, **kwargs)
+
+    return build
+
+
+@pytest.fixture()
+def redis(monkeypatch):
+    import fakeredis
+
+    client = fakeredis.FakeRedis(decode_responses=True)
+    for module in (
+        "services.redis_client",
+        "services.gmail_quota",
+        "services.gmail_service",
+        "services.scan_job",
+        "services.bulk_scan",
+        "services.send_batch",
+        "services.response_cache",
+        "services.sync_scheduler",
+        "security.deps",
+    ):
+        monkeypatch.setattr(f"{module}.get_redis", lambda: client)
+    return client
+
+
+@pytest.fixture()
+def encryption_key(monkeypatch):
+    monkeypatch.setattr("security.crypto._load_key", lambda: b"k" * 32)
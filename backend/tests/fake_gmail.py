@@ -0,0 +1,209 @@
+import base64
+import json
+import threading
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+USER_PATH = "/gmail/v1/users/me"
+MESSAGES_PATH = USER_PATH + "/messages"
+MESSAGES_PREFIX = MESSAGES_PATH + "/"
+
+
+class FakeGmail:
+    def __init__(self):
+        self.messages = {}
+        self.batch_calls = []
+        self.list_calls = []
+        self.history_calls = []
+        self.calls = []
+        self.thread_calls = []
+        self.failing_ids = set()
+        self.throttled = {}
+        self.history = []
+        self.history_id = 1000
+        self.history_floor = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "FakeGmail":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_message(
+        self,
+        message_id: str,
+        sender: str,
+        subject: str = "Welcome",
+        labels: tuple = ("INBOX",),
+        thread_id: str | None = None,
+        body: str | None = None,
+    ) -> None:
+        self.history_id += 1
+        self.history.append((self.history_id, message_id, list(labels)))
+        self.messages[message_id] = {
+            "id": message_id,
+            "threadId": thread_id or f"t-{message_id}",
+            "payload": {
+                "headers": [
+                    {"name": "From", "value": sender},
+                    {"name": "Subject", "value": subject},
+                    {"name": "Date", "value": "Mon, 1 Jan 2024 00:00:00 +0000"},
+                    {"name": "X-Mailer", "value": "fake"},
+                ]
+            },
+        }
+        if body is not None:
+            data = base64.urlsafe_b64encode(body.encode()).decode().rstrip("=")
+            self.messages[message_id]["payload"]["parts"] = [
+                {"mimeType": "text/plain", "body": {"data": data}},
+                {
+                    "mimeType": "application/pdf",
+                    "filename": "copy.pdf",
+                    "body": {"attachmentId": f"att-{message_id}", "size": 4096},
+                },
+            ]
+
+    def expire_history(self) -> None:
+        self.history_floor = self.history_id + 1
+
+    def get_profile(self):
+        return 200, {"emailAddress": "me@example.com", "historyId": str(self.history_id)}
+
+    def list_history(self, path: str):
+        params = parse_qs(urlsplit(path).query)
+        self.history_calls.append(params)
+        self.calls.append("history")
+        start = int(params["startHistoryId"][0])
+        if start < self.history_floor:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        records = [
+            {
+                "id": str(hid),
+                "messagesAdded": [
+                    {"message": {"id": mid, "threadId": f"t-{mid}", "labelIds": labels}}
+                ],
+            }
+            for hid, mid, labels in self.history
+            if hid > start
+        ]
+        offset = int(params.get("pageToken", ["0"])[0])
+        size = int(params.get("maxResults", ["100"])[0])
+        payload = {"history": records[offset : offset + size], "historyId": str(self.history_id)}
+        if offset + size < len(records):
+            payload["nextPageToken"] = str(offset + size)
+        return 200, payload
+
+    def list_messages(self, path: str):
+        params = parse_qs(urlsplit(path).query)
+        self.list_calls.append(params)
+        offset = int(params.get("pageToken", ["0"])[0])
+        size = int(params.get("maxResults", ["100"])[0])
+        ids = list(self.messages)[offset : offset + size]
+        payload = {"messages": [{"id": i, "threadId": f"t-{i}"} for i in ids]}
+        if offset + size < len(self.messages):
+            payload["nextPageToken"] = str(offset + size)
+        return 200, payload
+
+    def get_thread(self, path: str):
+        parts = urlsplit(path)
+        thread_id = parts.path.rsplit("/", 1)[1]
+        self.thread_calls.append(thread_id)
+        messages = [m for m in self.messages.values() if m["threadId"] == thread_id]
+        if not messages:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if parse_qs(parts.query).get("format") != ["full"]:
+            messages = [
+                {**m, "payload": {"headers": m["payload"]["headers"]}} for m in messages
+            ]
+        return 200, {"id": thread_id, "messages": messages}
+
+    def get_message(self, path: str):
+        parts = urlsplit(path)
+        message_id = parts.path[len(MESSAGES_PREFIX):]
+        if self.throttled.get(message_id):
+            self.throttled[message_id] -= 1
+            return 429, {"error": {"code": 429, "message": "Too many concurrent requests for user"}}
+        if message_id in self.failing_ids or message_id not in self.messages:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        message = json.loads(json.dumps(self.messages[message_id]))
+        wanted = parse_qs(parts.query).get("metadataHeaders")
+        if wanted:
+            headers = message["payload"]["headers"]
+            message["payload"]["headers"] = [h for h in headers if h["name"] in wanted]
+        return 200, message
+
+    def handle_batch(self, content_type: str, body: bytes) -> tuple[str, bytes]:
+        envelope = BytesParser().parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode() + body
+        )
+        boundary = "fake_batch_boundary"
+        chunks = []
+        paths = []
+        for part in envelope.get_payload():
+            request_line = part.get_payload().splitlines()[0]
+            _, path, _ = request_line.split(" ", 2)
+            paths.append(path)
+            status, payload = self.get_message(path)
+            reason = {200: "OK", 429: "Too Many Requests"}.get(status, "Not Found")
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            chunks.append(
+                f"--{boundary}\r\n"
+                "Content-Type: application/http\r\n"
+                f"Content-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        self.batch_calls.append(paths)
+        self.calls.append("batch")
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks).encode()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, content_type: str, body: bytes) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path == MESSAGES_PATH:
+                    status, payload = fake.list_messages(self.path)
+                elif path == USER_PATH + "/profile":
+                    status, payload = fake.get_profile()
+                elif path == USER_PATH + "/history":
+                    status, payload = fake.list_history(self.path)
+                elif path.startswith(USER_PATH + "/threads/"):
+                    status, payload = fake.get_thread(self.path)
+                else:
+                    status, payload = fake.get_message(self.path)
+                self._reply(status, "application/json", json.dumps(payload).encode())
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if self.path.startswith("/batch/gmail/v1"):
+                    content_type, content = fake.handle_batch(self.headers["Content-Type"], body)
+                    self._reply(200, content_type, content)
+                else:
+                    self._reply(404, "application/json", b"{}")
+
+        return Handler
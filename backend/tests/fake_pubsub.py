@@ -0,0 +1,34 @@
+import base64
+import json
+from itertools import count
+
+
+class FakePubSub:
+    """Pushes Gmail notifications the way a Pub/Sub push subscription does."""
+
+    def __init__(self, http_client, endpoint: str, max_attempts: int = 3):
+        self.http_client = http_client
+        self.endpoint = endpoint
+        self.max_attempts = max_attempts
+        self.deliveries = []
+        self._ids = count(1)
+
+    def envelope(self, email: str, history_id: int) -> dict:
+        data = json.dumps({"emailAddress": email, "historyId": history_id}).encode()
+        return {
+            "message": {
+                "data": base64.b64encode(data).decode(),
+                "messageId": str(next(self._ids)),
+                "publishTime": "2024-01-01T00:00:00Z",
+            },
+            "subscription": "projects/test/subscriptions/gmail-push",
+        }
+
+    def publish(self, email: str, history_id: int) -> int:
+        envelope = self.envelope(email, history_id)
+        for _ in range(self.max_attempts):
+            response = self.http_client.post(self.endpoint, json=envelope)
+            self.deliveries.append(response.status_code)
+            if 200 <= response.status_code < 300:
+                break
+        return response.status_code
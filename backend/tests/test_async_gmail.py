@@ -0,0 +1,81 @@
+import asyncio
+import httpx
+from google.auth.credentials import AnonymousCredentials
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from gmail.async_client import AsyncGmailClient
+from models.email_connection import EmailConnection
+from models.service_account import ServiceAccount
+from services.scan import scan_mailbox_async
+
+
+def test_async_client_lists_and_fetches(fake_gmail, async_gmail_client):
+    for i in range(7):
+        fake_gmail.add_message(f"m{i}", "Acme <hello@acme.com>", thread_id="shared")
+    fake_gmail.failing_ids.add("m3")
+
+    async def run():
+        client = async_gmail_client()
+        listed = [m["id"] async for m in client.iter_candidate_messages("q", page_size=3)]
+        batch = await client.get_messages_metadata_batch(listed)
+        thread = await client.list_thread_messages("shared")
+        return listed, batch, thread
+
+    listed, batch, thread = asyncio.run(run())
+    assert listed == [f"m{i}" for i in range(7)]
+    assert len(fake_gmail.list_calls) == 3
+    assert set(batch.errors) == {"m3"}
+    assert [h["name"] for h in batch.items["m0"]["payload"]["headers"]] == [
+        "From",
+        "Subject",
+        "Date",
+    ]
+    assert len(thread) == 7
+
+
+def test_async_client_bounds_in_flight_requests():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"id": request.url.path.rsplit("/", 1)[1]})
+
+    async def run():
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = AsyncGmailClient(AnonymousCredentials(), max_concurrency=4, http_client=http)
+        return await client.get_messages_metadata_batch(str(i) for i in range(40))
+
+    result = asyncio.run(run())
+    assert len(result.items) == 40
+    assert peak == 4
+
+
+def test_async_scan_mailbox(database, fake_gmail, async_gmail_client):
+    engine, async_engine = database
+    session = Session(engine)
+    session.add(
+        EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope="")
+    )
+    session.commit()
+    fake_gmail.add_message("a1", "Acme <hello@acme.com>")
+    fake_gmail.add_message("b1", "Beta <hello@beta.co.uk>")
+
+    async def scan():
+        async with AsyncSession(async_engine) as async_session:
+            result = await scan_mailbox_async(async_session, 1, async_gmail_client())
+            await async_session.commit()
+            return result
+
+    first = asyncio.run(scan())
+    fake_gmail.add_message("a2", "Acme <hi@mail.acme.com>", "Verify your email")
+    second = asyncio.run(scan())
+
+    assert (first.incremental, first.scanned) == (False, 2)
+    assert (second.incremental, second.scanned) == (True, 1)
+    counts = {s.domain: s.evidence_count for s in session.exec(select(ServiceAccount))}
+    assert counts == {"acme.com": 2, "beta.co.uk": 1}
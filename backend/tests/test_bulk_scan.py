@@ -0,0 +1,145 @@
+from collections import Counter
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import pytest
+from models.email_connection import EmailConnection
+from routers.gmail import router as gmail_router
+from services.bulk_scan import (
+    bulk_scan_report,
+    resume_bulk_scan,
+    run_shard,
+    shard_for_user,
+    start_bulk_scan,
+)
+from services.scan import ScanResult
+from services.scan_status import ACTIVE_KEY, get_scan_job, start_scan_job
+from settings import Settings
+
+
+class WorkerCrash(BaseException):
+    pass
+
+
+def connect_users(session, count):
+    for user_id in range(1, count + 1):
+        session.add(
+            EmailConnection(user_id=user_id, provider="google", refresh_token_encrypted="x", scope="")
+        )
+    session.commit()
+
+
+def recording_scanner(scanned, crash_after=None):
+    def scan_user(session, user_id):
+        if crash_after is not None and len(scanned) == crash_after:
+            raise WorkerCrash()
+        scanned.append(user_id)
+        return ScanResult(scanned=10)
+
+    return scan_user
+
+
+def test_consistent_hashing_spreads_and_mostly_keeps_users():
+    users = range(1, 2001)
+    four = {u: shard_for_user(u, 4) for u in users}
+    five = {u: shard_for_user(u, 5) for u in users}
+
+    sizes = Counter(four.values())
+    assert set(sizes) == {0, 1, 2, 3}
+    assert min(sizes.values()) > 2000 / 4 * 0.6
+    moved = sum(four[u] != five[u] for u in users)
+    assert moved < 2000 * 0.35
+    assert all(five[u] == 4 for u in users if four[u] != five[u])
+
+
+def test_start_enqueues_one_job_per_shard_queue(redis, queues):
+    run_id = start_bulk_scan(redis, queues, shards=3)
+
+    assert [(job.queue, job.args) for job in queues.jobs] == [
+        ("scan-0", (run_id, 0, 3)),
+        ("scan-1", (run_id, 1, 3)),
+        ("scan-2", (run_id, 2, 3)),
+    ]
+    assert bulk_scan_report(redis, run_id)["shards"] == 3
+
+
+def test_shards_cover_every_user_once_and_report_throughput(session, redis, queues):
+    connect_users(session, 20)
+    run_id = start_bulk_scan(redis, queues, shards=3)
+    scanned = []
+
+    for shard in range(3):
+        run_shard(session, redis, run_id, shard, 3, recording_scanner(scanned))
+
+    assert sorted(scanned) == list(range(1, 21))
+    report = bulk_scan_report(redis, run_id)
+    assert (report["users"], report["messages"], report["shards_done"]) == (20, 200, 3)
+    assert report["finished"] and report["messages_per_second"] > 0
+
+
+def test_crashed_shard_resumes_after_last_user(session, redis, queues):
+    connect_users(session, 12)
+    run_id = start_bulk_scan(redis, queues, shards=1)
+    scanned = []
+
+    with pytest.raises(WorkerCrash):
+        run_shard(session, redis, run_id, 0, 1, recording_scanner(scanned, crash_after=5))
+    assert resume_bulk_scan(redis, queues, run_id) == [0]
+    run_shard(session, redis, run_id, 0, 1, recording_scanner(scanned))
+
+    assert scanned == list(range(1, 13))
+    assert bulk_scan_report(redis, run_id)["finished"]
+    assert resume_bulk_scan(redis, queues, run_id) == []
+
+
+def test_resume_route_requeues_unfinished_shards(session, redis, queues, monkeypatch):
+    connect_users(session, 6)
+    monkeypatch.setattr("security.dev_api.settings", Settings(dev_api_key="dev"))
+    monkeypatch.setattr("routers.gmail.get_redis", lambda: redis)
+    monkeypatch.setattr("routers.gmail.get_queue", queues)
+    app = FastAPI()
+    app.include_router(gmail_router)
+    client = TestClient(app)
+    headers = {"X-Dev-Api-Key": "dev"}
+    run_id = client.post("/gmail/bulk-scan?shards=2", headers=headers).json()["run_id"]
+    run_shard(session, redis, run_id, 1, 2, recording_scanner([]))
+    queues.jobs.clear()
+
+    res = client.post(f"/gmail/bulk-scan/{run_id}/resume", headers=headers)
+
+    assert res.status_code == 202
+    assert res.json() == {"run_id": run_id, "resumed_shards": [0]}
+    assert [(job.queue, job.args) for job in queues.jobs] == [("scan-0", (run_id, 0, 2))]
+    assert client.post("/gmail/bulk-scan/unknown/resume", headers=headers).status_code == 404
+    assert client.post(f"/gmail/bulk-scan/{run_id}/resume").status_code == 401
+
+
+def test_users_already_scanning_are_skipped(session, redis, queues):
+    connect_users(session, 3)
+    redis.set(ACTIVE_KEY.format(user_id=2), "job-from-api")
+    run_id = start_bulk_scan(redis, queues, shards=1)
+    scanned = []
+
+    run_shard(session, redis, run_id, 0, 1, recording_scanner(scanned))
+
+    assert scanned == [1, 3]
+    assert bulk_scan_report(redis, run_id)["skipped"] == 1
+    assert redis.get(ACTIVE_KEY.format(user_id=2)) == "job-from-api"
+    assert redis.get(ACTIVE_KEY.format(user_id=1)) is None
+
+
+def test_api_scan_during_bulk_run_coalesces_onto_a_real_job(session, redis, queues, queue):
+    connect_users(session, 1)
+    run_id = start_bulk_scan(redis, queues, shards=1)
+    seen = []
+
+    def scan_user(session, user_id):
+        seen.append(start_scan_job(redis, queue, user_id))
+        return ScanResult(scanned=10)
+
+    run_shard(session, redis, run_id, 0, 1, scan_user)
+
+    [(job_id, coalesced)] = seen
+    assert coalesced
+    state = get_scan_job(redis, job_id)
+    assert (state["user_id"], state["status"]) == (1, "finished")
+    assert redis.get(ACTIVE_KEY.format(user_id=1)) is None
@@ -1,4 +1,11 @@
-from services.scan import upsert_service
+from datetime import datetime, timezone
+from sqlalchemy import text
+from sqlmodel import Session, SQLModel, create_engine, select
+from db import add_service_domain_index, rekey_service_domains
+from models.email_connection import EmailConnection
+from models.privacy_request import PrivacyRequest
+from models.service_account import ServiceAccount
+from services.scan import aggregate_evidence, bulk_upsert_services, upsert_service
 
 
 def test_deduplication(session):
@@ -10,3 +17,133 @@ def test_deduplication(session):
     assert service1.id == service2.id
     assert service2.evidence_count == 2
     assert service2.domain == "acme.com"
+
+
+def test_domain_index_is_added_after_merging_duplicates(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        # Tables created before the unique index, holding rows the old upsert duplicated.
+        session.exec(text("DROP INDEX ix_serviceaccount_user_id_domain"))
+        for day, count in [(3, 2), (1, 1), (5, 4)]:
+            seen = datetime(2024, 1, day, tzinfo=timezone.utc)
+            session.add(
+                ServiceAccount(
+                    user_id=1,
+                    service_name="Acme",
+                    domain="acme.com",
+                    first_seen_at=seen,
+                    last_seen_at=seen,
+                    evidence_count=count,
+                )
+            )
+        session.add(ServiceAccount(user_id=2, service_name="Acme", domain="acme.com"))
+        session.add(
+            PrivacyRequest(
+                user_id=1, service_account_id=3, request_type="delete_close", status="pending"
+            )
+        )
+        session.commit()
+
+    add_service_domain_index(engine)
+    add_service_domain_index(engine)
+
+    with Session(engine) as session:
+        rows = session.exec(select(ServiceAccount).order_by(ServiceAccount.id)).all()
+        assert [(row.id, row.user_id) for row in rows] == [(1, 1), (4, 2)]
+        assert rows[0].evidence_count == 7
+        assert (rows[0].first_seen_at.day, rows[0].last_seen_at.day) == (1, 5)
+        assert session.exec(select(PrivacyRequest)).one().service_account_id == 1
+        # The upsert's ON CONFLICT target now exists.
+        metadata = {"m": {"payload": {"headers": [{"name": "From", "value": "a@acme.com"}]}}}
+        bulk_upsert_services(session, 1, aggregate_evidence([{"id": "m"}], metadata).values())
+        session.commit()
+        session.refresh(rows[0])
+        assert rows[0].evidence_count == 8
+    engine.dispose()
+
+
+def test_services_keyed_by_the_old_normalizer_are_rekeyed(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        # The old normalizer kept two-label keys as sent and cut longer hosts to two labels.
+        for user_id, domain, count in [(1, "acme.com.", 2), (1, "acme.com", 1), (1, "co.uk", 3)]:
+            session.add(
+                ServiceAccount(
+                    user_id=user_id, service_name="X", domain=domain, evidence_count=count
+                )
+            )
+        session.add(ServiceAccount(user_id=2, service_name="Bbc", domain="co.uk"))
+        session.add(
+            PrivacyRequest(
+                user_id=2, service_account_id=4, request_type="delete_close", status="pending"
+            )
+        )
+        for user_id in (1, 2):
+            session.add(
+                EmailConnection(
+                    user_id=user_id,
+                    provider="google",
+                    refresh_token_encrypted="x",
+                    scope="gmail",
+                    history_id="100",
+                )
+            )
+        session.commit()
+
+    rekey_service_domains(engine)
+    rekey_service_domains(engine)
+
+    with Session(engine) as session:
+        rows = session.exec(select(ServiceAccount).order_by(ServiceAccount.id)).all()
+        assert [(row.id, row.user_id, row.domain) for row in rows] == [
+            (1, 1, "acme.com"),
+            (4, 2, "co.uk"),
+        ]
+        assert rows[0].evidence_count == 3
+        # "co.uk" cannot be re-derived, so user 1's next scan is a full one.
+        connections = session.exec(select(EmailConnection).order_by(EmailConnection.user_id))
+        assert [c.history_id for c in connections] == [None, "100"]
+    engine.dispose()
+
+
+def test_bulk_upsert_aggregates_by_domain(session):
+    from datetime import datetime, timezone
+    from sqlmodel import select
+    from models.service_account import ServiceAccount
+    from services.scan import aggregate_evidence, bulk_upsert_services, upsert_service
+
+    def message(msg_id, sender, day):
+        seen = datetime(2024, 1, day, tzinfo=timezone.utc)
+        return {
+            "id": msg_id,
+            "internalDate": str(int(seen.timestamp() * 1000)),
+            "payload": {"headers": [{"name": "From", "value": sender}]},
+        }
+
+    metadata = {
+        "1": message("1", "Acme <a@mail.acme.com>", 3),
+        "2": message("2", "Acme Billing <b@acme.com>", 1),
+        "3": message("3", "Acme <c@login.acme.com>", 5),
+        "4": message("4", "Beta <d@beta.io>", 2),
+    }
+    messages = [{"id": i} for i in metadata]
+    evidence = aggregate_evidence(messages, metadata)
+    assert evidence["acme.com"].count == 3
+    assert evidence["acme.com"].service_name == "Acme"
+
+    bulk_upsert_services(session, 1, evidence.values())
+    bulk_upsert_services(session, 1, aggregate_evidence(messages[:1], metadata).values())
+    session.commit()
+
+    rows = {s.domain: s for s in session.exec(select(ServiceAccount))}
+    assert set(rows) == {"acme.com", "beta.io"}
+    assert rows["acme.com"].evidence_count == 4
+    assert rows["acme.com"].first_seen_at.day == 1
+    assert rows["acme.com"].last_seen_at.day == 5
+
+    bulk_upsert_services(session, 1, evidence.values(), replace_counts=True)
+    session.commit()
+    session.refresh(rows["acme.com"])
+    assert rows["acme.com"].evidence_count == 3
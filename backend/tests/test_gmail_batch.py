@@ -0,0 +1,43 @@
+from sqlmodel import select
+from models.service_account import ServiceAccount
+from services.scan import aggregate_evidence, bulk_upsert_services
+
+
+def test_metadata_batch_splits_requests(fake_gmail, gmail_client):
+    for i in range(150):
+        fake_gmail.add_message(f"m{i}", f"Acme <hello@acme{i % 3}.com>")
+
+    result = gmail_client.get_messages_metadata_batch(f"m{i}" for i in range(150))
+
+    assert [len(call) for call in fake_gmail.batch_calls] == [100, 50]
+    assert len(result.items) == 150
+    assert result.errors == {}
+    headers = result.items["m7"]["payload"]["headers"]
+    assert [h["name"] for h in headers] == ["From", "Subject", "Date"]
+
+
+def test_metadata_batch_reports_item_failures(fake_gmail, gmail_client):
+    fake_gmail.add_message("ok", "Acme <hello@acme.com>")
+    fake_gmail.add_message("broken", "Beta <hello@beta.com>")
+    fake_gmail.failing_ids.add("broken")
+
+    result = gmail_client.get_messages_metadata_batch(["ok", "broken", "ok", "missing"])
+
+    assert list(result.items) == ["ok"]
+    assert set(result.errors) == {"broken", "missing"}
+    assert result.errors["broken"].resp.status == 404
+
+
+def test_batch_metadata_feeds_bulk_upsert(session, fake_gmail, gmail_client):
+    fake_gmail.add_message("a", "Acme <hello@mail.acme.com>")
+    fake_gmail.add_message("b", "Acme <news@acme.com>")
+    messages = [{"id": "a"}, {"id": "b"}]
+
+    result = gmail_client.get_messages_metadata_batch(m["id"] for m in messages)
+    evidence = aggregate_evidence(messages, result.items)
+    bulk_upsert_services(session, 1, evidence.values())
+    session.commit()
+
+    service = session.exec(select(ServiceAccount)).one()
+    assert service.domain == "acme.com"
+    assert service.evidence_count == 2
@@ -0,0 +1,102 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from google.oauth2.credentials import Credentials
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models.email_connection import EmailConnection
+from security.crypto import encrypt_text
+from services import gmail_service
+
+
+def connect(session, user_id=1):
+    session.add(
+        EmailConnection(
+            user_id=user_id,
+            provider="google",
+            refresh_token_encrypted=encrypt_text("refresh-token"),
+            scope="",
+        )
+    )
+    session.commit()
+
+
+def fake_refresh(calls):
+    def refresh(self, request):
+        calls.append(self.refresh_token)
+        self.token = f"access-{len(calls)}"
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+    return refresh
+
+
+def test_client_cache_skips_db_and_token_refresh(session, redis, encryption_key, monkeypatch):
+    connect(session)
+    calls = []
+    monkeypatch.setattr(Credentials, "refresh", fake_refresh(calls))
+    monkeypatch.setattr(gmail_service, "client_cache", gmail_service.GmailClientCache(8))
+
+    first = gmail_service.get_gmail_client(session, 1)
+    assert calls == ["refresh-token"]
+    assert first._service._http.credentials.token == "access-1"
+
+    stored = redis.get("gmail:token:1")
+    assert stored and "access-1" not in stored
+    assert 0 < redis.ttl("gmail:token:1") <= 3600
+
+    # Another process starts with an empty local cache but reuses the Redis token.
+    gmail_service.client_cache.clear()
+    gmail_service.get_gmail_client(session, 1)
+    assert calls == ["refresh-token"]
+
+
+def test_async_client_refreshes_off_the_event_loop(database, redis, encryption_key, monkeypatch):
+    engine, async_engine = database
+    with Session(engine) as session:
+        connect(session)
+    calls = []
+    refresh = fake_refresh(calls)
+    threads = []
+
+    def recording_refresh(self, request):
+        threads.append(threading.current_thread())
+        refresh(self, request)
+
+    monkeypatch.setattr(Credentials, "refresh", recording_refresh)
+    monkeypatch.setattr(gmail_service, "client_cache", gmail_service.GmailClientCache(8))
+
+    async def get_twice():
+        async with AsyncSession(async_engine) as session:
+            first = await gmail_service.get_async_gmail_client(session, 1)
+            return first, await gmail_service.get_async_gmail_client(session, 1)
+
+    first, second = asyncio.run(get_twice())
+    assert first is second
+    assert calls == ["refresh-token"]
+    assert threads and threads[0] is not threading.main_thread()
+
+
+def test_invalidate_forces_new_token(session, redis, encryption_key, monkeypatch):
+    connect(session)
+    calls = []
+    monkeypatch.setattr(Credentials, "refresh", fake_refresh(calls))
+    monkeypatch.setattr(gmail_service, "client_cache", gmail_service.GmailClientCache(8))
+
+    gmail_service.get_gmail_client(session, 1)
+    gmail_service.invalidate_gmail_client(1)
+    assert redis.get("gmail:token:1") is None
+
+    gmail_service.get_gmail_client(session, 1)
+    assert len(calls) == 2
+
+
+def test_cache_entries_expire_with_token():
+    cache = gmail_service.GmailClientCache(2)
+    expired = gmail_service.CachedGmailAuth(credentials=None, expires_at=0)
+    cache.put(1, expired)
+    assert cache.get(1) is None
+
+    for user_id in (1, 2, 3):
+        cache.put(user_id, gmail_service.CachedGmailAuth(None, expires_at=float("inf")))
+    assert cache.get(1) is None
+    assert cache.get(3) is not None
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.oauth2.credentials import Credentials
+from gmail.async_client import AsyncGmailClient
+from gmail.client import GmailClient
+from services.gmail_quota import QUOTA_KEY, QuotaGovernor
+from settings import Settings
+
+
+@pytest.fixture()
+def governor(redis, monkeypatch):
+    monkeypatch.setattr("services.gmail_quota.settings", Settings(gmail_retry_base_seconds=0))
+    return QuotaGovernor(redis_factory=lambda: redis, units_per_second=20, max_retries=3)
+
+
+def test_budget_throttles_until_bucket_refills(redis, governor, monkeypatch):
+    waits = []
+
+    def fake_sleep(seconds):
+        # Let the shared bucket refill instead of actually waiting.
+        waits.append(seconds)
+        ts = float(redis.hget(f"rate:{QUOTA_KEY}", "ts"))
+        redis.hset(f"rate:{QUOTA_KEY}", "ts", ts - seconds)
+
+    monkeypatch.setattr("services.gmail_quota.time.sleep", fake_sleep)
+    governor.acquire(20)
+    governor.acquire(10)
+
+    stats = governor.snapshot()
+    assert stats["units_spent"] == 30
+    assert stats["throttle_waits"] == 1
+    assert 0.4 < waits[0] <= 0.5
+
+
+def test_governor_is_shared_across_instances(redis, governor):
+    other = QuotaGovernor(redis_factory=lambda: redis, units_per_second=20)
+    governor._try_take(15)
+
+    assert other._try_take(10) > 0
+    assert other.snapshot()["throttle_waits"] == 1
+    # Counters are kept in Redis, so the API reports what workers spent.
+    assert governor.snapshot() == other.snapshot()
+    assert governor.snapshot()["units_spent"] == 15
+
+
+def test_batch_retries_throttled_items(fake_gmail, governor):
+    for i in range(3):
+        fake_gmail.add_message(f"m{i}", f"Acme <hello@acme{i}.com>")
+    fake_gmail.throttled = {"m1": 2}
+    client = GmailClient(AnonymousCredentials(), api_endpoint=fake_gmail.url, governor=governor)
+
+    result = client.get_messages_metadata_batch(["m0", "m1", "m2"])
+
+    assert set(result.items) == {"m0", "m1", "m2"}
+    assert result.errors == {}
+    assert [len(call) for call in fake_gmail.batch_calls] == [3, 1, 1]
+    stats = governor.snapshot()
+    assert stats["retries"] == 2
+    assert stats["units_spent"] == 25
+
+
+def test_non_retryable_errors_are_not_retried(fake_gmail, governor):
+    fake_gmail.add_message("ok", "Acme <hello@acme.com>")
+    fake_gmail.failing_ids.add("ok")
+    client = GmailClient(AnonymousCredentials(), api_endpoint=fake_gmail.url, governor=governor)
+
+    result = client.get_messages_metadata_batch(["ok"])
+
+    assert set(result.errors) == {"ok"}
+    assert len(fake_gmail.batch_calls) == 1
+    assert governor.snapshot()["retries"] == 0
+
+
+def test_async_client_retries_429(fake_gmail, async_gmail_client, governor):
+    fake_gmail.add_message("a", "Acme <hello@acme.com>")
+    fake_gmail.throttled = {"a": 1}
+    client = async_gmail_client(governor=governor)
+
+    message = asyncio.run(client.get_message_metadata("a"))
+
+    assert message["id"] == "a"
+    stats = governor.snapshot()
+    assert stats["retries"] == 1
+    assert stats["units_spent"] == 10
+
+
+def test_send_is_only_retried_for_rate_limit_rejections(redis, governor):
+    governor = QuotaGovernor(redis_factory=lambda: redis, units_per_second=1000, max_retries=3)
+    calls = []
+    outcomes = [httpx.Response(429), httpx.Response(500), httpx.ReadTimeout("slow")]
+
+    def handler(request):
+        calls.append(request.url.path)
+        outcome = outcomes[min(len(calls) - 1, len(outcomes) - 1)]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    credentials = Credentials(token="t", expiry=datetime.utcnow() + timedelta(hours=1))
+    client = AsyncGmailClient(
+        credentials,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        governor=governor,
+    )
+
+    # 429 is retried; the 500 after it may follow an executed send, so it is not.
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.send_email("a@acme.com", "Subject", "Body"))
+    assert len(calls) == 2
+
+    calls.clear()
+    outcomes[:] = [httpx.ReadTimeout("slow")]
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client.send_email("a@acme.com", "Subject", "Body"))
+    assert len(calls) == 1
+    assert governor.snapshot()["retries"] == 1
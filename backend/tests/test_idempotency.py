@@ -0,0 +1,120 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from models.privacy_request import PrivacyRequest
+from models.service_account import ServiceAccount
+from models.user import User
+from routers.gmail import router as gmail_router
+from security.deps import get_current_user
+from services.scan_status import ACTIVE_KEY
+from settings import Settings
+from test_request_flow import returning, setup_app
+
+
+class CountingGmailClient:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_email(self, to, subject, body, thread_id=None):
+        self.sent += 1
+        return {"id": f"msg-{self.sent}", "threadId": f"thread-{self.sent}"}
+
+
+PAYLOAD = {
+    "to": "support@acme.com",
+    "subject": "Privacy request for Acme",
+    "body": "Please delete my data",
+    "service_account_id": 1,
+    "request_type": "delete_close",
+    "confirm": True,
+}
+
+
+def send_app(monkeypatch, database):
+    engine, async_engine = database
+    with Session(engine) as session:
+        session.add(User(id=1, email="test@example.com", name="Test"))
+        session.add(ServiceAccount(id=1, user_id=1, service_name="Acme", domain="acme.com"))
+        session.commit()
+    gmail = CountingGmailClient()
+    monkeypatch.setattr("routers.requests.get_async_gmail_client", returning(gmail))
+    return TestClient(setup_app(async_engine)), gmail
+
+
+def test_retried_send_replays_the_first_response(redis, database, monkeypatch):
+    client, gmail = send_app(monkeypatch, database)
+    headers = {"Idempotency-Key": "k1"}
+
+    first = client.post("/requests/send", json=PAYLOAD, headers=headers)
+    retry = client.post("/requests/send", json=PAYLOAD, headers=headers)
+    fresh = client.post("/requests/send", json=PAYLOAD, headers={"Idempotency-Key": "k2"})
+
+    assert retry.status_code == 200 and retry.json() == first.json()
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert fresh.json()["id"] != first.json()["id"]
+    assert gmail.sent == 2
+    with Session(database[0]) as session:
+        assert len(session.exec(select(PrivacyRequest)).all()) == 2
+
+
+def test_replay_does_not_spend_rate_limit_tokens(redis, database, monkeypatch):
+    monkeypatch.setattr(
+        "security.deps.settings", Settings(rate_limit_send="1/60", rate_limit_send_cost=1)
+    )
+    client, gmail = send_app(monkeypatch, database)
+    headers = {"Idempotency-Key": "k1"}
+
+    first = client.post("/requests/send", json=PAYLOAD, headers=headers)
+    retry = client.post("/requests/send", json=PAYLOAD, headers=headers)
+    fresh = client.post("/requests/send", json=PAYLOAD, headers={"Idempotency-Key": "k2"})
+
+    assert first.status_code == 200
+    assert retry.status_code == 200 and retry.json() == first.json()
+    assert fresh.status_code == 429
+    assert not redis.exists("idem:send:1:k2:lock")
+    assert gmail.sent == 1
+
+
+def test_key_reuse_with_another_body_is_rejected(redis, database, monkeypatch):
+    client, gmail = send_app(monkeypatch, database)
+    headers = {"Idempotency-Key": "k1"}
+    client.post("/requests/send", json=PAYLOAD, headers=headers)
+
+    res = client.post("/requests/send", json={**PAYLOAD, "body": "Other"}, headers=headers)
+
+    assert res.status_code == 422
+    assert gmail.sent == 1
+
+
+def test_in_flight_duplicate_is_rejected_and_failures_are_not_stored(redis, database, monkeypatch):
+    client, gmail = send_app(monkeypatch, database)
+    redis.set("idem:send:1:busy:lock", "other-attempt")
+
+    assert client.post("/requests/send", json=PAYLOAD, headers={"Idempotency-Key": "busy"}).status_code == 409
+
+    headers = {"Idempotency-Key": "k3"}
+    failed = client.post("/requests/send", json={**PAYLOAD, "confirm": False}, headers=headers)
+    assert failed.status_code == 400
+    assert not redis.exists("idem:send:1:k3:lock")
+    assert client.post("/requests/send", json=PAYLOAD, headers=headers).status_code == 200
+    assert gmail.sent == 1
+
+
+def test_retried_scan_returns_the_same_job(redis, queue, monkeypatch):
+    monkeypatch.setattr("routers.gmail.get_redis", lambda: redis)
+    monkeypatch.setattr("routers.gmail.get_queue", lambda: queue)
+    app = FastAPI()
+    app.include_router(gmail_router)
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, email="a@b.c", name="A")
+    client = TestClient(app)
+    headers = {"Idempotency-Key": "scan-1"}
+
+    first = client.post("/gmail/scan?async_scan=true", headers=headers).json()
+    redis.delete(ACTIVE_KEY.format(user_id=1))
+    retry = client.post("/gmail/scan?async_scan=true", headers=headers).json()
+    other = client.post("/gmail/scan?async_scan=true", headers={"Idempotency-Key": "scan-2"}).json()
+
+    assert retry == first
+    assert other["job_id"] != first["job_id"]
+    assert [job.kwargs["job_id"] for job in queue.jobs] == [first["job_id"], other["job_id"]]
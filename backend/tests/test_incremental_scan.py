@@ -0,0 +1,94 @@
+from sqlmodel import select
+from models.email_connection import EmailConnection
+from models.service_account import ServiceAccount
+from services.scan import scan_mailbox
+from settings import Settings
+
+
+def counts(session):
+    services = session.exec(select(ServiceAccount)).all()
+    return {s.domain: s.evidence_count for s in services}
+
+
+def test_incremental_scan_uses_history_checkpoint(session, fake_gmail, gmail_client):
+    session.add(
+        EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope="")
+    )
+    session.commit()
+    fake_gmail.add_message("a1", "Acme <hello@acme.com>", "Welcome to Acme")
+    fake_gmail.add_message("a2", "Acme <hello@acme.com>", "Confirm your email")
+
+    first = scan_mailbox(session, 1, gmail_client)
+    session.commit()
+    assert not first.incremental
+    assert counts(session) == {"acme.com": 2}
+    connection = session.exec(select(EmailConnection)).one()
+    assert connection.history_id == str(fake_gmail.history_id)
+
+    list_calls, batch_calls = len(fake_gmail.list_calls), len(fake_gmail.batch_calls)
+    repeat = scan_mailbox(session, 1, gmail_client)
+    session.commit()
+    assert repeat.incremental
+    assert repeat.scanned == 0
+    assert len(fake_gmail.list_calls) == list_calls
+    assert len(fake_gmail.batch_calls) == batch_calls
+    assert counts(session) == {"acme.com": 2}
+
+    fake_gmail.add_message("b1", "Beta <hi@beta.com>", "Verify your account")
+    fake_gmail.add_message("n1", "News <news@acme.com>", "Weekly digest")
+    fake_gmail.add_message("d1", "Me <me@example.com>", "Welcome draft", labels=("DRAFT",))
+    scan_mailbox(session, 1, gmail_client)
+    session.commit()
+    assert fake_gmail.batch_calls[-1] == [
+        f"/gmail/v1/users/me/messages/{mid}?format=metadata"
+        "&metadataHeaders=From&metadataHeaders=Subject&metadataHeaders=Date&alt=json"
+        for mid in ("b1", "n1")
+    ]
+    assert counts(session) == {"acme.com": 2, "beta.com": 1}
+
+
+def test_expired_history_falls_back_to_full_recount(session, fake_gmail, gmail_client):
+    session.add(
+        EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope="")
+    )
+    session.commit()
+    fake_gmail.add_message("a1", "Acme <hello@acme.com>")
+    scan_mailbox(session, 1, gmail_client)
+    session.commit()
+
+    fake_gmail.add_message("a2", "Acme <hello@acme.com>")
+    fake_gmail.expire_history()
+    result = scan_mailbox(session, 1, gmail_client)
+    session.commit()
+
+    assert not result.incremental
+    assert result.scanned == 2
+    assert counts(session) == {"acme.com": 2}
+
+
+def test_history_pages_stream_into_the_scan(session, fake_gmail, gmail_client, monkeypatch):
+    monkeypatch.setattr(
+        "services.scan.settings",
+        Settings(scan_page_size=1, scan_chunk_size=1, scan_fetch_concurrency=1, scan_queue_size=1),
+    )
+    session.add(
+        EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope="")
+    )
+    session.commit()
+    scan_mailbox(session, 1, gmail_client)
+    session.commit()
+    for i in range(4):
+        fake_gmail.add_message(f"a{i}", "Acme <hello@acme.com>", "Welcome to Acme")
+    fake_gmail.calls.clear()
+
+    result = scan_mailbox(session, 1, gmail_client)
+    session.commit()
+
+    assert (result.incremental, result.scanned) == (True, 4)
+    assert fake_gmail.calls.count("history") == 4
+    # Metadata for the first page is fetched before the last history page is listed.
+    last_page = len(fake_gmail.calls) - fake_gmail.calls[::-1].index("history") - 1
+    assert fake_gmail.calls.index("batch") < last_page
+    assert counts(session) == {"acme.com": 4}
+    connection = session.exec(select(EmailConnection)).one()
+    assert connection.history_id == str(fake_gmail.history_id)
@@ -0,0 +1,85 @@
+import asyncio
+import base64
+from gmail.mime import compact_message, decode_base64url, extract_plain_text
+from services.status_sync import evaluate_status
+
+
+def encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def test_decode_is_bounded_and_handles_urlsafe_alphabet():
+    data = bytes(range(256)) * 1000
+
+    assert decode_base64url(encode(data), 10**9) == data
+    assert decode_base64url(encode(data), 1001) == data[:1001]
+    assert decode_base64url(encode(b"\xfb\xff"), 5) == b"\xfb\xff"
+    assert decode_base64url(encode(data), 0) == b""
+
+
+def test_extract_skips_attachments_and_honours_charset():
+    payload = {
+        "mimeType": "multipart/mixed",
+        "parts": [
+            {
+                "mimeType": "multipart/alternative",
+                "parts": [
+                    {"mimeType": "text/html", "body": {"data": encode(b"<b>deleted</b>")}},
+                    {
+                        "mimeType": "text/plain",
+                        "headers": [{"name": "Content-Type", "value": 'text/plain; charset="ISO-8859-1"'}],
+                        "body": {"data": encode("Données supprimées".encode("latin-1"))},
+                    },
+                ],
+            },
+            {"mimeType": "text/plain", "filename": "log.txt", "body": {"data": encode(b"deleted")}},
+            {"mimeType": "text/plain", "body": {"attachmentId": "a1", "size": 10}},
+        ],
+    }
+
+    assert extract_plain_text(payload, 1024) == "Données supprimées"
+    assert extract_plain_text(payload, 4) == "Donn"
+
+
+def test_cap_spans_parts_and_drops_split_characters():
+    payload = {
+        "parts": [
+            {"mimeType": "text/plain", "body": {"data": encode(b"abc")}},
+            {"mimeType": "text/plain", "body": {"data": encode("é!".encode())}},
+        ]
+    }
+
+    assert extract_plain_text(payload, 4) == "abc\n"
+    assert extract_plain_text(payload, 6) == "abc\né!"
+
+
+def test_compact_message_keeps_only_what_the_classifier_reads():
+    message = {
+        "id": "m1",
+        "threadId": "t1",
+        "snippet": "Hi",
+        "payload": {
+            "headers": [{"name": "Subject", "value": "Re: request"}],
+            "parts": [{"mimeType": "text/plain", "body": {"data": encode(b"x" * 100 + b" erased")}}],
+        },
+    }
+
+    compact = compact_message(message, 64)
+
+    assert compact["payload"] == {"headers": [{"name": "Subject", "value": "Re: request"}]}
+    assert compact["body_text"] == "x" * 64
+    assert evaluate_status([compact]) is None
+    assert evaluate_status([compact_message(message, 1024)]) == "completed"
+
+
+def test_clients_fetch_capped_bodies(fake_gmail, gmail_client, async_gmail_client):
+    fake_gmail.add_message("m1", "Acme <privacy@acme.com>", "Re: request", thread_id="t1",
+                           body="Your records were erased yesterday.")
+
+    assert "body_text" not in gmail_client.list_thread_messages("t1")[0]
+    assert gmail_client.list_thread_messages("t1", body_max_bytes=1024)[0]["body_text"] == (
+        "Your records were erased yesterday."
+    )
+    messages = asyncio.run(async_gmail_client().list_thread_messages("t1", body_max_bytes=17))
+    assert messages[0]["body_text"] == "Your records were"
+    assert evaluate_status(messages) is None
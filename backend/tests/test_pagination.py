@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlmodel import Session
+from models.privacy_request import PrivacyRequest
+from models.service_account import ServiceAccount
+from models.user import User
+from routers.services import router as services_router
+from test_request_flow import setup_app
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def seed(engine):
+    with Session(engine) as session:
+        session.add(User(id=1, email="test@example.com", name="Test"))
+        # Pairs of services share a timestamp so ties are broken by id.
+        for i in range(7):
+            session.add(
+                ServiceAccount(
+                    id=i + 1,
+                    user_id=1,
+                    service_name=f"S{i}",
+                    domain=f"shop{i}.com" if i % 2 else f"mail{i}.com",
+                    last_seen_at=T0 + timedelta(days=i // 2),
+                )
+            )
+        session.add(ServiceAccount(id=99, user_id=2, service_name="Theirs", domain="shop9.com"))
+        session.add(
+            ServiceAccount(id=8, user_id=1, service_name="Odd", domain="sh_p.com", last_seen_at=T0)
+        )
+        for i in range(5):
+            session.add(
+                PrivacyRequest(
+                    user_id=1,
+                    service_account_id=1,
+                    request_type="unsubscribe" if i == 4 else "delete_close",
+                    status="completed" if i % 2 else "pending",
+                    updated_at=T0 + timedelta(hours=i),
+                )
+            )
+        session.commit()
+
+
+def client_for(async_engine):
+    app = setup_app(async_engine)
+    app.include_router(services_router)
+    return TestClient(app)
+
+
+def walk(client, url):
+    ids, cursor = [], None
+    while True:
+        page = client.get(url + (f"&cursor={cursor}" if cursor else "")).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return ids
+
+
+def test_services_page_newest_first_without_gaps(redis, database):
+    engine, async_engine = database
+    seed(engine)
+    client = client_for(async_engine)
+
+    assert walk(client, "/services?limit=3") == [7, 6, 5, 4, 3, 8, 2, 1]
+    assert walk(client, "/services?limit=100") == [7, 6, 5, 4, 3, 8, 2, 1]
+
+
+def test_services_filter_by_domain_prefix_and_project_fields(redis, database):
+    engine, async_engine = database
+    seed(engine)
+    client = client_for(async_engine)
+
+    page = client.get("/services?domain=SHOP&fields=id,domain").json()
+    assert page == {
+        "items": [
+            {"id": 6, "domain": "shop5.com"},
+            {"id": 4, "domain": "shop3.com"},
+            {"id": 2, "domain": "shop1.com"},
+        ],
+        "next_cursor": None,
+    }
+    assert [s["id"] for s in client.get("/services?domain=sh_").json()["items"]] == [8]
+    assert client.get("/services?fields=id,secret").status_code == 400
+    assert client.get("/services?cursor=garbage").status_code == 400
+    assert client.get("/services?limit=0").status_code == 422
+
+
+def test_single_service_uses_the_slim_schema(redis, database):
+    engine, async_engine = database
+    seed(engine)
+    client = client_for(async_engine)
+
+    service = client.get("/services/2").json()
+    assert set(service) == {"id", "service_name", "domain", "first_seen_at", "last_seen_at", "evidence_count"}
+    assert client.get("/services/99").status_code == 404
+
+
+def test_requests_filter_and_page_by_updated_at(redis, database):
+    engine, async_engine = database
+    seed(engine)
+    client = client_for(async_engine)
+
+    assert walk(client, "/requests?limit=2&fields=id") == [5, 4, 3, 2, 1]
+    assert walk(client, "/requests?limit=1&status=pending&request_type=delete_close") == [3, 1]
+    page = client.get("/requests?status=completed&fields=status,updated_at").json()
+    assert page["items"][0] == {"status": "completed", "updated_at": "2024-01-01T03:00:00+00:00"}
+
+
+def test_page_queries_use_the_composite_indexes(database):
+    engine, _ = database
+    with engine.connect() as conn:
+        services = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM serviceaccount WHERE user_id = 1 "
+            "AND (last_seen_at, id) < ('2024-01-02', 5) ORDER BY last_seen_at DESC, id DESC LIMIT 3"
+        )).all()
+        requests = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id FROM privacyrequest WHERE user_id = 1 AND status = 'pending' "
+            "ORDER BY updated_at DESC, id DESC LIMIT 3"
+        )).all()
+    assert "ix_serviceaccount_user_id_last_seen_at_id" in str(services)
+    assert "ix_privacyrequest_user_id_status_updated_at_id" in str(requests)
+    assert "TEMP B-TREE" not in str(services) + str(requests)
@@ -14,3 +14,17 @@ def test_normalize_domain():
 def test_infer_service_name():
     assert infer_service_name("Acme Team <hello@acme.com>", "acme.com") == "Acme Team"
     assert infer_service_name("<hello@acme.com>", "acme.com") == "Acme"
+
+
+def test_normalize_domain_uses_public_suffix_list():
+    assert normalize_domain("mail.bbc.co.uk") == "bbc.co.uk"
+    assert normalize_domain("shop.acme.com.au") == "acme.com.au"
+    assert normalize_domain("alice.github.io") == "alice.github.io"
+    assert normalize_domain("docs.alice.github.io") == "alice.github.io"
+    assert normalize_domain("co.uk") == "co.uk"
+    assert normalize_domain("Mail.Example.UNKNOWNTLD.") == "example.unknowntld"
+
+
+def test_normalize_domain_wildcard_and_exception_rules():
+    assert normalize_domain("a.b.example.ck") == "b.example.ck"
+    assert normalize_domain("mail.www.ck") == "www.ck"
@@ -0,0 +1,58 @@
+from sqlalchemy import inspect
+from sqlmodel import Session, SQLModel, create_engine, select
+from db import add_missing_columns, async_database_url, engine_options
+from models.email_connection import EmailConnection
+from services import redis_client
+
+
+def test_redis_clients_share_one_pool_per_mode():
+    try:
+        first, second = redis_client.get_redis(), redis_client.get_redis()
+        raw = redis_client.get_queue_connection()
+
+        assert first.connection_pool is second.connection_pool
+        assert raw.connection_pool is not first.connection_pool
+        assert first.connection_pool.max_connections == redis_client.settings.redis_max_connections
+    finally:
+        redis_client.close_redis()
+    assert redis_client._pools == {}
+
+
+def test_engine_options_size_pool_for_server_databases():
+    options = engine_options("postgresql+psycopg://u:p@localhost/db")
+    assert {"pool_size", "max_overflow", "pool_timeout", "pool_pre_ping", "pool_recycle"} <= set(options)
+
+    sqlite_options = engine_options("sqlite://")
+    assert "pool_size" not in sqlite_options
+    assert sqlite_options["pool_pre_ping"] is True
+
+
+def test_async_database_url_picks_async_driver():
+    assert async_database_url("sqlite:///app.db") == "sqlite+aiosqlite:///app.db"
+    assert async_database_url("postgresql://u:p@db/app") == "postgresql+psycopg://u:p@db/app"
+    assert async_database_url("postgresql+asyncpg://u:p@db/app") == "postgresql+asyncpg://u:p@db/app"
+
+
+def test_missing_columns_are_added_to_existing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        # emailconnection as created before the checkpoint and watch columns existed.
+        connection.exec_driver_sql(
+            "CREATE TABLE emailconnection (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL,"
+            " provider VARCHAR NOT NULL, refresh_token_encrypted VARCHAR NOT NULL,"
+            " scope VARCHAR NOT NULL, created_at DATETIME NOT NULL)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO emailconnection VALUES (1, 7, 'google', 'x', '', '2024-01-01 00:00:00')"
+        )
+    SQLModel.metadata.create_all(engine)
+
+    add_missing_columns(engine)
+    add_missing_columns(engine)
+
+    indexes = {index["name"] for index in inspect(engine).get_indexes("emailconnection")}
+    assert "ix_emailconnection_email_address" in indexes
+    with Session(engine) as session:
+        connection = session.exec(select(EmailConnection)).one()
+        assert (connection.user_id, connection.history_id, connection.watch_expires_at) == (7, None, None)
+    engine.dispose()
@@ -0,0 +1,161 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, Session, create_engine, select
+from db import get_session
+from fake_pubsub import FakePubSub
+from models.email_connection import EmailConnection
+from models.privacy_request import PrivacyRequest
+from models.service_account import ServiceAccount
+from routers.gmail import router as gmail_router
+from services.push import PUSHED_KEY, renew_expiring_watches
+from services.scan import scan_mailbox
+from services.scan_job import run_scan_for_user
+from services.scan_status import ACTIVE_KEY
+from settings import Settings
+
+
+def setup(monkeypatch, redis, queues):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    session.add(
+        EmailConnection(
+            user_id=7,
+            provider="google",
+            refresh_token_encrypted="x",
+            scope="",
+            email_address="person@example.com",
+            history_id="100",
+        )
+    )
+    session.add(
+        PrivacyRequest(
+            user_id=7,
+            service_account_id=1,
+            request_type="delete_close",
+            status="pending",
+            gmail_thread_id="t1",
+        )
+    )
+    session.commit()
+
+    test_settings = Settings(gmail_push_token="secret", gmail_push_coalesce_seconds=30)
+    monkeypatch.setattr("routers.gmail.settings", test_settings)
+    monkeypatch.setattr("services.push.settings", test_settings)
+    monkeypatch.setattr("routers.gmail.get_redis", lambda: redis)
+    monkeypatch.setattr("routers.gmail.get_queue", queues)
+
+    app = FastAPI()
+    app.include_router(gmail_router)
+
+    def override_session():
+        yield session
+
+    app.dependency_overrides[get_session] = override_session
+    return TestClient(app)
+
+
+def test_push_notification_enqueues_scan_and_sync(monkeypatch, redis, queues):
+    client = setup(monkeypatch, redis, queues)
+    pubsub = FakePubSub(client, "/gmail/push?token=secret")
+
+    assert pubsub.publish("Person@example.com", 150) == 204
+    job_id = redis.get(ACTIVE_KEY.format(user_id=7))
+    assert [(job.queue, job.func.__name__, job.args) for job in queues.jobs] == [
+        ("default", "run_scan_for_user", (7, job_id)),
+        ("sync", "sync_user_requests", (7, [1])),
+    ]
+
+    # A burst of notifications for the same mailbox coalesces into the pending jobs.
+    assert pubsub.publish("person@example.com", 151) == 204
+    assert len(queues.named("default")) == 1
+    assert redis.zscore(PUSHED_KEY, "7") == 151
+
+    # Once the push window closes, a scan still queued or running absorbs the next one.
+    redis.delete("push:pending:7")
+    assert pubsub.publish("person@example.com", 152) == 204
+    assert len(queues.named("default")) == 1
+
+
+def test_push_ignores_stale_and_unknown_mailboxes(monkeypatch, redis, queues):
+    client = setup(monkeypatch, redis, queues)
+    pubsub = FakePubSub(client, "/gmail/push?token=secret")
+
+    assert pubsub.publish("person@example.com", 90) == 204
+    assert pubsub.publish("stranger@example.com", 500) == 204
+    assert queues.jobs == []
+
+
+def test_push_rejects_bad_token(monkeypatch, redis, queues):
+    client = setup(monkeypatch, redis, queues)
+    pubsub = FakePubSub(client, "/gmail/push?token=wrong", max_attempts=2)
+
+    assert pubsub.publish("person@example.com", 150) == 401
+    assert pubsub.deliveries == [401, 401]
+    assert queues.jobs == []
+
+
+class FakeWatchClient:
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def watch(self, topic):
+        if self.user_id == 1:
+            raise RuntimeError("invalid_grant")
+        return {"expiration": "4102444800000"}
+
+    def get_profile(self):
+        return {"emailAddress": f"user{self.user_id}@example.com"}
+
+
+def test_watch_renewal_continues_past_failing_connections(monkeypatch, database):
+    engine, _ = database
+    with Session(engine) as session:
+        for user_id in (1, 2):
+            session.add(
+                EmailConnection(user_id=user_id, provider="google", refresh_token_encrypted="x", scope="")
+            )
+        session.commit()
+    monkeypatch.setattr("services.push.engine", engine)
+    monkeypatch.setattr("services.push.settings", Settings(gmail_pubsub_topic="projects/p/topics/t"))
+    monkeypatch.setattr("services.push.get_gmail_client", lambda session, user_id: FakeWatchClient(user_id))
+
+    assert renew_expiring_watches() == 1
+
+    with Session(engine) as session:
+        connections = {c.user_id: c for c in session.exec(select(EmailConnection))}
+    assert connections[1].watch_expires_at is None
+    assert connections[2].email_address == "user2@example.com"
+    assert connections[2].watch_expires_at.year == 2100
+
+
+def test_scan_rescans_for_pushes_it_did_not_list(monkeypatch, redis, database, fake_gmail, gmail_client):
+    engine, _ = database
+    with Session(engine) as session:
+        session.add(EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope=""))
+        session.commit()
+    fake_gmail.add_message("a1", "Acme <hello@acme.com>")
+    passes = []
+
+    def scan_then_receive_mail(session, user_id, client, **kwargs):
+        passes.append(user_id)
+        result = scan_mailbox(session, user_id, client, **kwargs)
+        if len(passes) == 1:
+            # New mail arrives after the first pass listed the mailbox; its push is coalesced.
+            fake_gmail.add_message("a2", "Acme <hello@acme.com>")
+            redis.zadd(PUSHED_KEY, {"1": fake_gmail.history_id})
+        return result
+
+    monkeypatch.setattr("services.scan_job.engine", engine)
+    monkeypatch.setattr("services.scan_job.get_gmail_client", lambda *a: gmail_client)
+    monkeypatch.setattr("services.scan_job.scan_mailbox", scan_then_receive_mail)
+
+    assert run_scan_for_user(1) == 2
+
+    assert len(passes) == 2
+    with Session(engine) as session:
+        assert session.exec(select(ServiceAccount)).one().evidence_count == 2
+        assert session.exec(select(EmailConnection)).one().history_id == str(fake_gmail.history_id)
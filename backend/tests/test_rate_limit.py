@@ -0,0 +1,53 @@
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from security.deps import get_current_user, rate_limit
+from services.rate_limit import RateLimit, RateLimitError, enforce_rate_limit, take_tokens
+from settings import Settings
+
+
+def test_token_bucket_allows_capacity_then_blocks(redis):
+    limit = RateLimit(capacity=3, window_seconds=60)
+    results = [take_tokens(redis, "scan:1", limit)[0] for _ in range(4)]
+
+    assert results == [True, True, True, False]
+    ttl = redis.pttl("rate:scan:1")
+    assert 0 < ttl <= 60_000
+
+
+def test_token_bucket_reports_retry_after_and_refills(redis):
+    limit = RateLimit(capacity=2, window_seconds=60, cost=2)
+    enforce_rate_limit(redis, "send:1", limit=limit)
+    with pytest.raises(RateLimitError) as exc:
+        enforce_rate_limit(redis, "send:1", limit=limit)
+    assert 59 < exc.value.retry_after <= 60
+
+    # Rewind the bucket's clock by a full window: it is full again.
+    ts = float(redis.hget("rate:send:1", "ts"))
+    redis.hset("rate:send:1", "ts", ts - 60)
+    enforce_rate_limit(redis, "send:1", limit=limit)
+
+
+def test_no_burst_across_window_boundary(redis):
+    limit = RateLimit(capacity=5, window_seconds=60)
+    allowed = sum(take_tokens(redis, "scan:2", limit)[0] for _ in range(10))
+    assert allowed == 5
+
+
+def test_rate_limit_dependency_sets_retry_after(redis, fake_user, monkeypatch):
+    monkeypatch.setattr(
+        "security.deps.settings", Settings(rate_limit_sync="2/60", rate_limit_sync_cost=1)
+    )
+    app = FastAPI()
+
+    @app.post("/sync")
+    def sync(_: None = Depends(rate_limit("sync"))):
+        return {"ok": True}
+
+    app.dependency_overrides[get_current_user] = lambda: fake_user
+    client = TestClient(app)
+
+    assert [client.post("/sync").status_code for _ in range(2)] == [200, 200]
+    res = client.post("/sync")
+    assert res.status_code == 429
+    assert 1 <= int(res.headers["Retry-After"]) <= 30
@@ -1,36 +1,66 @@
 from fastapi import FastAPI
 from fastapi.testclient import TestClient
-from sqlmodel import SQLModel, Session, create_engine
+import asyncio
+from sqlalchemy import event
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models.user import User
 from models.service_account import ServiceAccount
+from models.privacy_request import PrivacyRequest
+from models.request_log import RequestLog
 from routers.requests import router as requests_router
 from security.deps import get_current_user
-from db import get_session
+from db import get_async_session
 
 
 class FakeGmailClient:
-    def send_email(self, to, subject, body, thread_id=None):
+    async def send_email(self, to, subject, body, thread_id=None):
         return {"id": "msg_123", "threadId": "thread_456"}
 
 
-def setup_app(session):
+class FakeAsyncGmailClient:
+    def __init__(self, threads):
+        self.threads = threads
+        self.in_flight = 0
+        self.peak = 0
+
+    async def list_thread_messages(self, thread_id, body_max_bytes=None):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if thread_id not in self.threads:
+            raise RuntimeError("thread not found")
+        subject = self.threads[thread_id]
+        return [{"payload": {"headers": [{"name": "Subject", "value": subject}]}}]
+
+
+def returning(client):
+    async def get_async_gmail_client(session, user_id):
+        return client
+
+    return get_async_gmail_client
+
+
+def setup_app(async_engine):
     app = FastAPI()
     app.include_router(requests_router)
 
-    def override_session():
-        yield session
+    async def override_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
 
-    def override_user():
-        return session.get(User, 1)
+    async def override_user():
+        async with AsyncSession(async_engine) as session:
+            return await session.get(User, 1)
 
     app.dependency_overrides[get_current_user] = override_user
-    app.dependency_overrides[get_session] = override_session
+    app.dependency_overrides[get_async_session] = override_session
     return app
 
 
-def test_request_send_flow(monkeypatch):
-    engine = create_engine("sqlite://", echo=False)
-    SQLModel.metadata.create_all(engine)
+def test_request_send_flow(monkeypatch, redis, database):
+    engine, async_engine = database
     with Session(engine) as session:
         user = User(id=1, email="test@example.com", name="Test")
         service = ServiceAccount(user_id=1, service_name="Acme", domain="acme.com")
@@ -38,11 +68,8 @@ def test_request_send_flow(monkeypatch):
         session.add(service)
         session.commit()
 
-        app = setup_app(session)
-        monkeypatch.setattr(
-            "routers.requests.get_gmail_client",
-            lambda *args, **kwargs: FakeGmailClient(),
-        )
+        app = setup_app(async_engine)
+        monkeypatch.setattr("routers.requests.get_async_gmail_client", returning(FakeGmailClient()))
         client = TestClient(app)
 
         payload = {
@@ -57,3 +84,82 @@ def test_request_send_flow(monkeypatch):
         assert res.status_code == 200
         data = res.json()
         assert data["status"] == "pending"
+        logs = session.exec(select(RequestLog)).all()
+        assert [(log.privacy_request_id, log.event_type) for log in logs] == [(data["id"], "sent")]
+
+        listed = client.get("/requests").json()["items"]
+        assert [r["gmail_thread_id"] for r in listed] == ["thread_456"]
+
+
+def test_request_sync_checks_threads_concurrently(monkeypatch, redis, database):
+    engine, async_engine = database
+    with Session(engine) as session:
+        session.add(User(id=1, email="test@example.com", name="Test"))
+        threads = {
+            "t1": "Your account has been deleted",
+            "t2": "Please verify your identity",
+            "t3": "We received your request",
+        }
+        for thread_id in [*threads, "t4"]:
+            session.add(
+                PrivacyRequest(
+                    user_id=1,
+                    service_account_id=1,
+                    request_type="delete_close",
+                    status="pending",
+                    gmail_thread_id=thread_id,
+                )
+            )
+        session.commit()
+
+        fake = FakeAsyncGmailClient(threads)
+        monkeypatch.setattr("routers.requests.get_async_gmail_client", returning(fake))
+        client = TestClient(setup_app(async_engine))
+
+        res = client.post("/requests/sync")
+        assert res.status_code == 200
+        data = res.json()
+        assert (data["checked"], data["updated"]) == (4, 2)
+        assert fake.peak == 4
+        by_status = {r["status"]: r for r in data["results"]}
+        assert set(by_status) == {"completed", "needs_info", "pending"}
+        assert all(r["elapsed_ms"] >= 0 for r in data["results"])
+        assert [r["error"] for r in data["results"]].count("thread not found") == 1
+
+        logs = session.exec(select(RequestLog)).all()
+        assert sorted(log.payload_json for log in logs) == [
+            "status:completed",
+            "status:needs_info",
+        ]
+
+
+def test_draft_batch_renders_many_services_in_one_query(redis, database):
+    engine, async_engine = database
+    with Session(engine) as session:
+        session.add(User(id=1, email="test@example.com", name="Test"))
+        session.add(User(id=2, email="other@example.com", name="Other"))
+        for i in range(5):
+            session.add(ServiceAccount(id=i + 1, user_id=1, service_name=f"S{i}", domain=f"s{i}.com"))
+        session.add(ServiceAccount(id=9, user_id=2, service_name="Theirs", domain="theirs.com"))
+        session.commit()
+
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *args: statements.append(sql))
+    client = TestClient(setup_app(async_engine))
+    res = client.post(
+        "/requests/draft/batch",
+        json={"service_account_ids": [3, 1, 9, 3, 42], "request_type": "delete_close",
+              "regime": "gdpr", "locale": "es-MX"},
+    )
+
+    assert res.status_code == 200
+    data = res.json()
+    assert [d["service_account_id"] for d in data["drafts"]] == [3, 1]
+    assert data["drafts"][0]["to"] == "support@s2.com"
+    assert data["drafts"][0]["subject"] == "Solicitud de privacidad para S2"
+    assert data["missing"] == [9, 42]
+    assert len([s for s in statements if "serviceaccount" in s]) == 1
+
+    bad = client.post("/requests/draft/batch", json={"service_account_ids": [], "request_type": "delete_close"})
+    assert bad.status_code == 400
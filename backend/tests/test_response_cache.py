@@ -0,0 +1,98 @@
+from datetime import datetime, timezone
+from fastapi.testclient import TestClient
+from redis import ConnectionError as RedisConnectionError
+from sqlalchemy import event
+from sqlmodel import Session, select
+from models.privacy_request import PrivacyRequest
+from models.user import User
+from routers.services import router as services_router
+from services.response_cache import VERSION_KEY
+from services.scan import DomainEvidence, bulk_upsert_services
+from services.status_sync import update_request_status
+from test_request_flow import setup_app
+
+
+def add_service(session, domain, name):
+    now = datetime.now(timezone.utc)
+    evidence = DomainEvidence(domain, 0, now, now)
+    evidence.add(name, now)
+    bulk_upsert_services(session, 1, [evidence])
+
+
+def setup(database):
+    engine, async_engine = database
+    with Session(engine) as session:
+        session.add(User(id=1, email="test@example.com", name="Test"))
+        session.commit()
+        add_service(session, "acme.com", "Acme")
+        session.add(
+            PrivacyRequest(user_id=1, service_account_id=1, request_type="delete_close", status="pending")
+        )
+        session.commit()
+    app = setup_app(async_engine)
+    app.include_router(services_router)
+    queries = []
+    event.listen(
+        async_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, sql, *args: queries.append(sql) if "FROM user" not in sql else None,
+    )
+    return TestClient(app), queries
+
+
+def test_unchanged_lists_are_served_without_queries(redis, database):
+    client, queries = setup(database)
+
+    first = client.get("/services")
+    etag = first.headers["ETag"]
+    queries.clear()
+    not_modified = client.get("/services", headers={"If-None-Match": etag})
+    cached = client.get("/services")
+
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert cached.json() == first.json() and cached.headers["ETag"] == etag
+    assert queries == []
+    assert client.get("/services?limit=1").headers["ETag"] != etag
+
+
+def test_writes_bump_only_their_resource_after_commit(redis, database):
+    client, _ = setup(database)
+    services_etag = client.get("/services").headers["ETag"]
+    requests_etag = client.get("/requests").headers["ETag"]
+    engine, _ = database
+
+    with Session(engine) as session:
+        add_service(session, "other.com", "Other")
+        session.rollback()
+        assert client.get("/services", headers={"If-None-Match": services_etag}).status_code == 304
+
+        request = session.exec(select(PrivacyRequest)).one()
+        update_request_status(session, request, "completed")
+
+    assert client.get("/services", headers={"If-None-Match": services_etag}).status_code == 304
+    res = client.get("/requests", headers={"If-None-Match": requests_etag})
+    assert res.status_code == 200
+    assert res.json()["items"][0]["status"] == "completed"
+    assert redis.get(VERSION_KEY.format(resource="requests", user_id=1)) == "1"
+
+    with Session(engine) as session:
+        add_service(session, "other.com", "Other")
+        session.commit()
+    res = client.get("/services", headers={"If-None-Match": services_etag})
+    assert [s["domain"] for s in res.json()["items"]] == ["other.com", "acme.com"]
+
+
+def test_lists_are_served_without_etag_when_redis_is_down(redis, database, monkeypatch):
+    client, _ = setup(database)
+
+    def down(*args, **kwargs):
+        raise RedisConnectionError("redis is down")
+
+    monkeypatch.setattr(redis, "get", down)
+    monkeypatch.setattr(redis, "set", down)
+
+    for path in ("/services", "/requests"):
+        res = client.get(path)
+        assert res.status_code == 200
+        assert "ETag" not in res.headers
+        assert len(res.json()["items"]) == 1
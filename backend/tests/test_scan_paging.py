@@ -0,0 +1,44 @@
+from itertools import islice
+from models.service_account import ServiceAccount
+from services.scan import collect_services
+from sqlmodel import select
+
+
+def test_iter_candidate_messages_follows_page_tokens(fake_gmail, gmail_client):
+    for i in range(25):
+        fake_gmail.add_message(f"m{i}", "Acme <hello@acme.com>")
+
+    ids = [m["id"] for m in gmail_client.iter_candidate_messages("q", page_size=10)]
+
+    assert ids == [f"m{i}" for i in range(25)]
+    assert [c.get("pageToken") for c in fake_gmail.list_calls] == [None, ["10"], ["20"]]
+
+
+def test_iter_candidate_messages_is_lazy_and_limited(fake_gmail, gmail_client):
+    for i in range(25):
+        fake_gmail.add_message(f"m{i}", "Acme <hello@acme.com>")
+
+    first = list(islice(gmail_client.iter_candidate_messages("q", page_size=10), 3))
+    assert len(first) == 3
+    assert len(fake_gmail.list_calls) == 1
+
+    limited = list(gmail_client.iter_candidate_messages("q", page_size=10, limit=12))
+    assert len(limited) == 12
+    assert fake_gmail.list_calls[-1]["maxResults"] == ["2"]
+
+
+def test_collect_services_works_in_chunks(session, fake_gmail, gmail_client):
+    for i in range(23):
+        fake_gmail.add_message(f"m{i}", f"Service <hello@svc{i % 4}.com>")
+
+    messages = gmail_client.iter_candidate_messages("q", page_size=10)
+    result = collect_services(session, 1, gmail_client, messages, chunk_size=10)
+    session.commit()
+
+    # Chunks are fetched concurrently, so batches may land in any order.
+    assert sorted(len(call) for call in fake_gmail.batch_calls) == [3, 10, 10]
+    assert result.scanned == 23
+    assert result.failed == 0
+    assert result.services == 4
+    services = session.exec(select(ServiceAccount)).all()
+    assert sum(s.evidence_count for s in services) == 23
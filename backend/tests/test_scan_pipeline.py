@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from sqlmodel import select
+from gmail.client import BatchResult
+from models.service_account import ServiceAccount
+from services.scan import ScanCancelled, collect_services, collect_services_async
+from settings import Settings
+
+
+def metadata(message_id):
+    sender = f"Svc <hello@svc{int(message_id[1:]) % 3}.com>"
+    return {"id": message_id, "payload": {"headers": [{"name": "From", "value": sender}]}}
+
+
+class SlowAsyncClient:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+
+    async def get_messages_metadata_batch(self, ids):
+        ids = list(ids)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return BatchResult(items={i: metadata(i) for i in ids})
+
+
+def pipeline_settings(monkeypatch, **overrides):
+    values = dict(scan_chunk_size=5, scan_fetch_concurrency=3, scan_queue_size=1)
+    values.update(overrides)
+    monkeypatch.setattr("services.scan.settings", Settings(**values))
+
+
+def test_pipeline_fetches_concurrently_and_times_stages(session, monkeypatch):
+    pipeline_settings(monkeypatch)
+    client = SlowAsyncClient()
+    messages = [{"id": f"m{i}"} for i in range(30)]
+    progress = []
+
+    result = asyncio.run(
+        collect_services_async(
+            session, 1, client, messages, on_progress=lambda r: progress.append(r.scanned)
+        )
+    )
+    session.commit()
+
+    assert (result.scanned, result.fetched, result.services) == (30, 30, 3)
+    assert client.peak > 1
+    assert progress == [5, 10, 15, 20, 25, 30]
+    assert set(result.timings) == {"list", "fetch", "write", "total"}
+    assert result.timings["fetch"] > result.timings["total"] * 0.9
+    counts = {s.domain: s.evidence_count for s in session.exec(select(ServiceAccount))}
+    assert counts == {"svc0.com": 10, "svc1.com": 10, "svc2.com": 10}
+
+
+def test_bounded_queues_apply_backpressure(session, monkeypatch):
+    pipeline_settings(monkeypatch, scan_fetch_concurrency=1)
+    listed = []
+
+    async def messages():
+        for i in range(100):
+            listed.append(i)
+            yield {"id": f"m{i}"}
+
+    ahead = []
+
+    def on_progress(result):
+        ahead.append(len(listed) - result.scanned)
+
+    result = asyncio.run(
+        collect_services_async(session, 1, SlowAsyncClient(), messages(), on_progress=on_progress)
+    )
+
+    assert result.scanned == 100
+    # One chunk in each queue, one in the fetcher and one in the lister's hand.
+    assert max(ahead) <= 4 * 5
+
+
+def test_pipeline_cancellation_stops_all_stages(session, monkeypatch):
+    pipeline_settings(monkeypatch)
+    client = SlowAsyncClient()
+    progress = []
+
+    with pytest.raises(ScanCancelled):
+        asyncio.run(
+            collect_services_async(
+                session,
+                1,
+                client,
+                [{"id": f"m{i}"} for i in range(50)],
+                on_progress=lambda r: progress.append(r.scanned),
+                is_cancelled=lambda: len(progress) >= 2,
+            )
+        )
+    assert progress == [5, 10]
+    assert client.in_flight == 0
+
+
+def test_sync_entry_point_shares_the_pipeline(session, fake_gmail, gmail_client, monkeypatch):
+    pipeline_settings(monkeypatch, scan_chunk_size=4)
+    for i in range(10):
+        fake_gmail.add_message(f"m{i}", f"Svc <hello@svc{i % 2}.com>")
+
+    messages = gmail_client.iter_candidate_messages("q", page_size=3)
+    result = collect_services(session, 1, gmail_client, messages)
+
+    assert (result.scanned, result.services) == (10, 2)
+    assert sorted(len(call) for call in fake_gmail.batch_calls) == [2, 4, 4]
+    assert result.timings["list"] > 0
@@ -0,0 +1,227 @@
+import json
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from db import get_async_session
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from models.email_connection import EmailConnection
+from routers.gmail import router as gmail_router
+from security.deps import get_current_user
+from services.gmail_service import GmailConnectionError
+from services.scan_job import run_scan_for_user
+from services.scan_status import (
+    ACTIVE_KEY,
+    JOB_KEY,
+    ScanProgress,
+    claim_scan_job,
+    get_scan_job,
+    request_cancel,
+    start_scan_job,
+)
+from settings import Settings
+
+
+def test_concurrent_scans_for_a_user_coalesce(redis, queue):
+    first, coalesced = start_scan_job(redis, queue, 1)
+    second, again = start_scan_job(redis, queue, 1)
+    other, _ = start_scan_job(redis, queue, 2)
+
+    assert (coalesced, again) == (False, True)
+    assert second == first and other != first
+    assert [(job.func.__name__, job.args, job.kwargs["job_id"]) for job in queue.jobs] == [
+        ("run_scan_for_user", (1, first), first),
+        ("run_scan_for_user", (2, other), other),
+    ]
+    assert get_scan_job(redis, first)["status"] == "queued"
+
+
+def test_scan_job_publishes_progress_and_result(
+    redis, queue, database, gmail_client, fake_gmail, monkeypatch
+):
+    engine, _ = database
+    with Session(engine) as session:
+        session.add(EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope=""))
+        session.commit()
+    for i in range(5):
+        fake_gmail.add_message(f"m{i}", f"Acme <hello@acme{i % 2}.com>")
+    monkeypatch.setattr("services.scan_job.engine", engine)
+    monkeypatch.setattr("services.scan_job.get_gmail_client", lambda *a: gmail_client)
+    monkeypatch.setattr("services.scan.settings", Settings(scan_chunk_size=2))
+    snapshots = []
+    original_set = redis.set
+
+    def recording_set(key, value, *args, **kwargs):
+        if key.startswith("scan:job:"):
+            snapshots.append(json.loads(value))
+        return original_set(key, value, *args, **kwargs)
+
+    monkeypatch.setattr(redis, "set", recording_set)
+    job_id, _ = start_scan_job(redis, queue, 1)
+
+    assert run_scan_for_user(1, job_id) == 5
+
+    state = get_scan_job(redis, job_id)
+    assert state["status"] == "finished"
+    assert (state["listed"], state["fetched"], state["services"]) == (5, 5, 2)
+    timings = state["result"].pop("timings")
+    assert state["result"] == {"scanned": 5, "failed": 0, "services": 2, "incremental": False}
+    assert set(timings) == {"list", "fetch", "write", "total"}
+    running = [s["listed"] for s in snapshots if s["status"] == "running"]
+    # One update per chunk of two; chunks may complete in any order.
+    assert len(running) == 4 and running == sorted(running) and running[-1] == 5
+    assert redis.get(ACTIVE_KEY.format(user_id=1)) is None
+    assert 0 < redis.ttl(JOB_KEY.format(job_id=job_id)) <= 3600
+
+
+def test_scan_job_stores_error(redis, queue, monkeypatch):
+    def not_connected(*args):
+        raise GmailConnectionError("Gmail not connected")
+
+    monkeypatch.setattr("services.scan_job.get_gmail_client", not_connected)
+    job_id, _ = start_scan_job(redis, queue, 1)
+
+    try:
+        run_scan_for_user(1, job_id)
+    except GmailConnectionError:
+        pass
+    state = get_scan_job(redis, job_id)
+    assert (state["status"], state["error"]) == ("failed", "Gmail not connected")
+    # The next request starts a fresh job instead of joining the failed one.
+    assert start_scan_job(redis, queue, 1)[0] != job_id
+
+
+def test_cancelled_scan_job_commits_nothing(
+    redis, queue, database, gmail_client, fake_gmail, monkeypatch
+):
+    engine, _ = database
+    fake_gmail.add_message("m1", "Acme <hello@acme.com>")
+    monkeypatch.setattr("services.scan_job.engine", engine)
+    monkeypatch.setattr("services.scan_job.get_gmail_client", lambda *a: gmail_client)
+    job_id, _ = start_scan_job(redis, queue, 1)
+    request_cancel(redis, job_id)
+
+    assert run_scan_for_user(1, job_id) == 0
+
+    assert get_scan_job(redis, job_id)["status"] == "cancelled"
+    assert redis.get(ACTIVE_KEY.format(user_id=1)) is None
+    assert fake_gmail.batch_calls == []
+
+
+def test_scan_status_routes(redis, queue, fake_user, monkeypatch):
+    monkeypatch.setattr("routers.gmail.get_redis", lambda: redis)
+    job_id, _ = start_scan_job(redis, queue, 1)
+    app = FastAPI()
+    app.include_router(gmail_router)
+    app.dependency_overrides[get_current_user] = lambda: fake_user
+    client = TestClient(app)
+
+    assert client.get(f"/gmail/scan/{job_id}").json()["status"] == "queued"
+    fake_user.id = 2
+    assert client.get(f"/gmail/scan/{job_id}").status_code == 404
+    fake_user.id = 1
+
+    state = get_scan_job(redis, job_id)
+    state.update(status="finished", result={"scanned": 3})
+    redis.set(JOB_KEY.format(job_id=job_id), json.dumps(state))
+    res = client.get(f"/gmail/scan/{job_id}/events")
+    assert res.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in res.text.split("\n\n") if block]
+    assert events[0].startswith("event: finished\ndata: ")
+    assert json.loads(events[0].split("data: ", 1)[1])["result"] == {"scanned": 3}
+
+
+def test_inline_scan_shares_the_per_user_slot(redis, queue, fake_user, monkeypatch):
+    async def not_connected(*args):
+        raise GmailConnectionError("Gmail not connected")
+
+    async def no_session():
+        yield None
+
+    monkeypatch.setattr("routers.gmail.get_redis", lambda: redis)
+    monkeypatch.setattr("routers.gmail.get_async_gmail_client", not_connected)
+    app = FastAPI()
+    app.include_router(gmail_router)
+    app.dependency_overrides[get_current_user] = lambda: fake_user
+    app.dependency_overrides[get_async_session] = no_session
+    client = TestClient(app, raise_server_exceptions=False)
+
+    queued, _ = start_scan_job(redis, queue, 1)
+    assert client.post("/gmail/scan").json() == {"queued": True, "job_id": queued, "coalesced": True}
+
+    redis.delete(ACTIVE_KEY.format(user_id=1))
+    assert client.post("/gmail/scan").status_code == 500
+    [failed] = [key for key in redis.scan_iter("scan:job:*") if not key.endswith(queued)]
+    state = json.loads(redis.get(failed))
+    assert (state["status"], state["error"]) == ("failed", "Gmail not connected")
+    assert redis.get(ACTIVE_KEY.format(user_id=1)) is None
+
+
+def test_inline_scan_reports_progress_and_honours_cancel(
+    redis, database, fake_gmail, async_gmail_client, fake_user, monkeypatch
+):
+    engine, async_engine = database
+    with Session(engine) as session:
+        session.add(EmailConnection(user_id=1, provider="google", refresh_token_encrypted="x", scope=""))
+        session.commit()
+    for i in range(4):
+        fake_gmail.add_message(f"m{i}", f"Acme <hello@acme{i}.com>")
+
+    async def get_client(*args):
+        return async_gmail_client()
+
+    async def override_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    monkeypatch.setattr("routers.gmail.get_redis", lambda: redis)
+    monkeypatch.setattr("routers.gmail.get_async_gmail_client", get_client)
+    monkeypatch.setattr("services.scan.settings", Settings(scan_chunk_size=2, scan_fetch_concurrency=1))
+    updates = []
+    original_update = ScanProgress.update
+
+    def recording_update(progress, result):
+        updates.append(result.scanned)
+        original_update(progress, result)
+        if cancel_after_first:
+            request_cancel(redis, progress._state["job_id"])
+
+    monkeypatch.setattr(ScanProgress, "update", recording_update)
+    app = FastAPI()
+    app.include_router(gmail_router)
+    app.dependency_overrides[get_current_user] = lambda: fake_user
+    app.dependency_overrides[get_async_session] = override_session
+    client = TestClient(app)
+
+    cancel_after_first = False
+    done = client.post("/gmail/scan").json()
+    assert updates == [2, 4]
+    assert get_scan_job(redis, done["job_id"])["fetched"] == 4
+
+    cancel_after_first = True
+    updates.clear()
+    with Session(engine) as session:
+        connection = session.exec(select(EmailConnection)).one()
+        connection.history_id = None
+        session.add(connection)
+        session.commit()
+    cancelled = client.post("/gmail/scan").json()
+    assert cancelled["status"] == "cancelled" and updates == [2]
+    assert get_scan_job(redis, cancelled["job_id"])["status"] == "cancelled"
+    assert redis.get(ACTIVE_KEY.format(user_id=1)) is None
+
+
+def test_claim_never_overwrites_a_scan_claimed_mid_claim(redis, monkeypatch):
+    original_get = redis.get
+    active_key = ACTIVE_KEY.format(user_id=1)
+
+    def racing_get(key):
+        # The holder finished after our SET NX failed, and another caller claimed the slot.
+        monkeypatch.setattr(redis, "get", original_get)
+        redis.set(active_key, "other-job")
+        return None
+
+    redis.set(active_key, "finishing-job")
+    monkeypatch.setattr(redis, "get", racing_get)
+
+    assert claim_scan_job(redis, 1) == ("other-job", True)
+    assert redis.get(active_key) == "other-job"
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from models.privacy_request import PrivacyRequest
+from models.request_log import RequestLog
+from models.service_account import ServiceAccount
+from models.user import User
+from services.send_batch import (
+    BatchSender,
+    get_send_job,
+    get_send_results,
+    send_batch_events,
+    start_send_batch,
+)
+from settings import Settings
+from test_request_flow import setup_app
+
+
+class FakeSender:
+    def __init__(self, failing=()):
+        self.sent = []
+        self.failing = set(failing)
+
+    def send_email(self, to, subject, body, thread_id=None):
+        if to in self.failing:
+            raise RuntimeError("bounced")
+        self.sent.append(to)
+        return {"id": f"msg-{len(self.sent)}", "threadId": f"thread-{to}"}
+
+
+def item(to, service_account_id=1):
+    return {
+        "to": to,
+        "subject": "Privacy request",
+        "body": "Please delete my data",
+        "service_account_id": service_account_id,
+        "request_type": "delete_close",
+    }
+
+
+def refill_sleep(redis, sleeps):
+    def sleep(seconds):
+        # Age every pacing bucket instead of actually waiting.
+        sleeps.append(seconds)
+        for key in redis.scan_iter("rate:send:*"):
+            redis.hset(key, "ts", float(redis.hget(key, "ts")) - seconds)
+
+    return sleep
+
+
+def test_busy_domains_are_deferred_and_rows_written_in_bulk(redis, database, monkeypatch):
+    engine, _ = database
+    monkeypatch.setattr(
+        "services.send_batch.settings",
+        Settings(send_pace_per_domain="2/60", send_pace_per_user="100/60", send_batch_flush_size=10),
+    )
+    items = [item("a1@a.com"), item("a2@a.com"), item("Acme <a3@a.com>"), item("b1@b.com"), item("b2@b.com")]
+    client = FakeSender()
+    sleeps = []
+    state = {"job_id": "j1", "user_id": 1, "sent": 0, "failed": 0}
+    flushes = []
+
+    with Session(engine) as session:
+        original_commit = session.commit
+        monkeypatch.setattr(session, "commit", lambda: flushes.append(1) or original_commit())
+        BatchSender(session, redis, 1, client, state, sleep=refill_sleep(redis, sleeps)).run(items)
+
+        assert client.sent == ["a1@a.com", "a2@a.com", "b1@b.com", "b2@b.com", "Acme <a3@a.com>"]
+        assert len(sleeps) == 1 and 0 < sleeps[0] <= 30
+        assert len(flushes) == 2
+        requests = session.exec(select(PrivacyRequest).order_by(PrivacyRequest.id)).all()
+        assert [r.gmail_thread_id for r in requests] == [f"thread-{to}" for to in client.sent]
+        logs = session.exec(select(RequestLog)).all()
+        assert sorted(log.privacy_request_id for log in logs) == [r.id for r in requests]
+    assert [r["index"] for r in get_send_results(redis, "j1")] == [0, 1, 3, 4, 2]
+    assert (state["sent"], state["failed"]) == (5, 0)
+
+
+def test_failed_sends_are_reported_without_rows(redis, database):
+    engine, _ = database
+    state = {"job_id": "j2", "user_id": 1, "sent": 0, "failed": 0}
+    with Session(engine) as session:
+        client = FakeSender(failing={"bad@x.com"})
+        BatchSender(session, redis, 1, client, state).run([item("ok@x.com"), item("bad@x.com")])
+        assert len(session.exec(select(PrivacyRequest)).all()) == 1
+
+    results = {r["index"]: r for r in get_send_results(redis, "j2")}
+    assert results[1] == {"index": 1, "service_account_id": 1, "status": "failed", "error": "bounced"}
+    assert results[0]["status"] == "sent"
+    assert (state["sent"], state["failed"]) == (1, 1)
+
+
+def test_sent_emails_are_recorded_when_pacing_fails(redis, database, monkeypatch):
+    engine, _ = database
+    monkeypatch.setattr("services.send_batch.settings", Settings(send_batch_flush_size=10))
+    calls = []
+
+    def flaky_take_tokens(*args):
+        calls.append(1)
+        if len(calls) > 4:
+            raise ConnectionError("redis went away")
+        return True, 0, 0
+
+    monkeypatch.setattr("services.send_batch.take_tokens", flaky_take_tokens)
+    state = {"job_id": "j3", "user_id": 1, "sent": 0, "failed": 0}
+    with Session(engine) as session:
+        client = FakeSender()
+        sender = BatchSender(session, redis, 1, client, state)
+        with pytest.raises(ConnectionError):
+            sender.run([item("a@a.com"), item("b@b.com"), item("c@c.com")])
+
+        assert client.sent == ["a@a.com", "b@b.com"]
+        assert len(session.exec(select(PrivacyRequest)).all()) == 2
+    assert [r["status"] for r in get_send_results(redis, "j3")] == ["sent", "sent"]
+    assert state["sent"] == 2
+
+
+def test_batch_route_queues_job_and_streams_results(redis, queue, database, monkeypatch):
+    engine, async_engine = database
+    with Session(engine) as session:
+        session.add(User(id=1, email="test@example.com", name="Test"))
+        session.add(ServiceAccount(id=1, user_id=1, service_name="Acme", domain="acme.com"))
+        session.add(ServiceAccount(id=2, user_id=2, service_name="Other", domain="other.com"))
+        session.commit()
+
+    monkeypatch.setattr("routers.requests.get_redis", lambda: redis)
+    monkeypatch.setattr("routers.requests.get_queue", lambda: queue)
+    client = TestClient(setup_app(async_engine))
+
+    foreign = client.post("/requests/send/batch", json={"confirm": True, "items": [item("x@other.com", 2)]})
+    assert foreign.status_code == 400
+    unconfirmed = client.post("/requests/send/batch", json={"items": [item("support@acme.com")]})
+    assert unconfirmed.status_code == 400
+
+    res = client.post("/requests/send/batch", json={"confirm": True, "items": [item("support@acme.com", "1")]})
+    assert res.status_code == 202
+    job_id = res.json()["job_id"]
+    [(_, func, args, _)] = queue.jobs
+    assert args[2][0]["service_account_id"] == 1
+
+    monkeypatch.setattr("services.send_batch.engine", engine)
+    monkeypatch.setattr("services.send_batch.get_gmail_client", lambda *a: FakeSender())
+    assert func(*args) == 1
+
+    status = client.get(f"/requests/send/batch/{job_id}").json()
+    assert (status["status"], status["sent"]) == ("finished", 1)
+    assert status["results"][0]["status"] == "sent"
+    events = client.get(f"/requests/send/batch/{job_id}/events").text
+    assert events.count("event: item") == 1 and "event: finished" in events
+
+
+def test_events_follow_a_running_job(redis, queue, monkeypatch):
+    monkeypatch.setattr("services.send_batch.settings", Settings(scan_events_poll_seconds=0))
+    job_id = start_send_batch(redis, queue, 1, [item("a@a.com"), item("b@b.com")])
+    redis.rpush(f"send:job:{job_id}:results", json.dumps({"index": 0}))
+
+    async def collect():
+        events = []
+        async for event in send_batch_events(redis, job_id):
+            events.append(event.split("\n", 1)[0])
+            if len(events) == 1:
+                # The worker publishes the second result and finishes between polls.
+                redis.rpush(f"send:job:{job_id}:results", json.dumps({"index": 1}))
+                state = get_send_job(redis, job_id)
+                redis.set(f"send:job:{job_id}", json.dumps({**state, "status": "finished"}))
+        return events
+
+    assert asyncio.run(collect()) == ["event: item", "event: item", "event: finished"]
@@ -0,0 +1,61 @@
+import base64
+import json
+from services.keyword_matcher import KeywordMatcher
+from services.status_sync import StatusClassifier, StatusRule, evaluate_status, load_status_rules
+
+
+def message(subject="", snippet="", body=None):
+    payload = {"headers": [{"name": "Subject", "value": subject}]}
+    if body is not None:
+        data = base64.urlsafe_b64encode(body.encode()).decode().rstrip("=")
+        payload["parts"] = [
+            {"mimeType": "text/html", "body": {"data": "PGI+aGk8L2I+"}},
+            {"mimeType": "text/plain", "body": {"data": data}},
+        ]
+    return {"snippet": snippet, "payload": payload}
+
+
+def test_matcher_prefers_leftmost_then_longest():
+    matcher = KeywordMatcher([("he", 1), ("she", 2), ("hers", 3), ("his", 4), ("her", 5)])
+
+    assert list(matcher.iter_matches("ushers his")) == [(1, 4, 2), (7, 10, 4)]
+    assert list(matcher.iter_matches("hers")) == [(0, 4, 3)]
+    assert list(matcher.iter_matches("a.b")) == []
+    assert list(KeywordMatcher([("a.b", 1)]).iter_matches("axb a.b")) == [(4, 7, 1)]
+
+
+def test_default_rules_cover_subject_snippet_and_body():
+    assert evaluate_status([message("Your account has been deleted")]) == "completed"
+    assert evaluate_status([message("Re: request", snippet="Please verify your email")]) == "needs_info"
+    assert evaluate_status([message("Re: request", body="We have ERASED all records.")]) == "completed"
+    assert evaluate_status([message("Re: request", snippet="We received it")]) is None
+
+
+def test_negation_suppresses_only_the_covered_hit():
+    assert evaluate_status([message("Your data was not deleted yet")]) is None
+    assert evaluate_status([message("Data will be deleted in 30 days")]) is None
+    assert evaluate_status([message("Not deleted yet", snippet="It has now been deleted")]) == "completed"
+
+
+def test_priority_wins_across_messages():
+    thread = [message("Please verify your identity"), message("Your account was removed")]
+    assert evaluate_status(thread) == "completed"
+
+
+def test_rules_load_from_a_data_file(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            {
+                "rules": [
+                    {"status": "rejected", "priority": 10, "patterns": ["Cannot Process"]},
+                    {"status": "completed", "priority": 5, "patterns": ["done"], "negations": ["not done"]},
+                ]
+            }
+        )
+    )
+    classifier = StatusClassifier(load_status_rules(path))
+
+    assert classifier.classify([message("we cannot process this")]) == "rejected"
+    assert classifier.classify([message("not done")]) is None
+    assert StatusRule("x", 1, ("a",)).negations == ()
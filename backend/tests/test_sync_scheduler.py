@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta, timezone
+from models.privacy_request import PrivacyRequest
+from services import sync_scheduler
+from services.status_sync import SyncOutcome
+from settings import Settings
+
+
+def add_requests(session):
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        (1, "pending", 3),
+        (1, "needs_info", 1),
+        (2, "pending", 2),
+        (2, "completed", 0),
+        (3, "pending", 4),
+    ]
+    requests = []
+    for user_id, status, age in rows:
+        request = PrivacyRequest(
+            user_id=user_id,
+            service_account_id=1,
+            request_type="delete_close",
+            status=status,
+            gmail_thread_id=f"t-{user_id}-{age}",
+            updated_at=base + timedelta(days=age),
+        )
+        session.add(request)
+        requests.append(request)
+    session.commit()
+    return requests
+
+
+def test_plan_orders_by_staleness_and_respects_budget(session, redis, monkeypatch):
+    requests = add_requests(session)
+    monkeypatch.setattr(
+        sync_scheduler, "settings", Settings(sync_budget_per_tick=3, sync_max_per_user=5)
+    )
+
+    plan = sync_scheduler.plan_sync(session, redis, now=1000)
+
+    assert plan == {1: [requests[1].id, requests[0].id], 2: [requests[2].id]}
+
+
+def test_backoff_state_skips_requests_until_due(session, redis, monkeypatch):
+    requests = add_requests(session)
+    monkeypatch.setattr(
+        sync_scheduler,
+        "settings",
+        Settings(sync_backoff_base_seconds=100, sync_backoff_max_seconds=1000),
+    )
+    unchanged = SyncOutcome(requests[0])
+    done = SyncOutcome(requests[2], status="completed")
+
+    sync_scheduler.record_outcomes(redis, [unchanged, done], now=1000)
+    first_due = redis.zscore(sync_scheduler.DUE_KEY, str(requests[0].id))
+    sync_scheduler.record_outcomes(redis, [unchanged], now=1000)
+    second_due = redis.zscore(sync_scheduler.DUE_KEY, str(requests[0].id))
+
+    assert 1100 <= first_due <= 1110
+    assert 1200 <= second_due <= 1220
+    assert redis.zscore(sync_scheduler.DUE_KEY, str(requests[2].id)) is None
+
+    plan = sync_scheduler.plan_sync(session, redis, now=1150)
+    assert requests[0].id not in plan.get(1, [])
+    plan = sync_scheduler.plan_sync(session, redis, now=1300)
+    assert requests[0].id in plan[1]
+
+
+def test_tick_fans_out_one_job_per_user(session, redis, queue):
+    add_requests(session)
+
+    scheduled = sync_scheduler.run_status_sync_tick(session, redis, queue)
+
+    assert scheduled == 4
+    assert sorted(job.args[0] for job in queue.jobs) == [1, 2, 3]
+    assert {job.func.__name__ for job in queue.jobs} == {"sync_user_requests"}
@@ -0,0 +1,59 @@
+import json
+import pytest
+from models.service_account import ServiceAccount
+from services.templates import TemplateRegistry, draft_template, get_template_registry
+
+ACME = ServiceAccount(user_id=1, service_name="Acme", domain="acme.com")
+
+
+def test_default_templates_match_the_original_drafts():
+    subject, body = draft_template(ACME, "delete_close", "gdpr")
+    assert subject == "Privacy request for Acme"
+    assert body == (
+        "Hello Acme team,\n\n"
+        "I am requesting deletion of my personal data and closure of my account. "
+        "This request is made under GDPR. "
+        "Please confirm once complete.\n\n"
+        "Thank you"
+    )
+    assert "under" not in draft_template(ACME, "delete_close")[1]
+    assert "under" not in draft_template(ACME, "delete_close", "hipaa")[1]
+    assert draft_template(ACME, "unsubscribe", "ccpa")[1].startswith(
+        "Hello Acme team,\n\nPlease unsubscribe me"
+    )
+
+
+def test_every_locale_renders_every_regime():
+    registry = get_template_registry()
+    for locale in registry.locales:
+        for regime, name in registry.regimes.items():
+            subject, body = registry.get("delete_close", regime, locale).render("Acme")
+            assert "Acme" in subject and name in body and "{" not in body
+
+
+def test_locale_falls_back_to_language_then_default():
+    registry = get_template_registry()
+    assert registry.resolve_locale("pt-BR") == "pt"
+    assert registry.resolve_locale("pt_br") == "pt"
+    assert registry.resolve_locale("ja") == "en"
+    assert registry.resolve_locale(None) == "en"
+    assert "LGPD" in draft_template(ACME, "delete_close", "LGPD", "pt-BR")[1]
+
+
+def test_service_names_are_inserted_verbatim(tmp_path):
+    path = tmp_path / "templates.json"
+    path.write_text(json.dumps({
+        "default_locale": "en",
+        "regimes": {},
+        "locales": {"en": {
+            "subject": "{service_name}",
+            "regime_clause": "",
+            "unsubscribe": "Hi {service_name}, bye {service_name}",
+            "delete_close": "",
+        }},
+    }))
+    registry = TemplateRegistry.load(path)
+
+    assert registry.get("unsubscribe").render("{x}") == ("{x}", "Hi {x}, bye {x}")
+    with pytest.raises(ValueError):
+        TemplateRegistry({"default_locale": "fr", "regimes": {}, "locales": {}})
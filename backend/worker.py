@@ -1,7 +1,18 @@
+import sys
 from rq import Worker
-from services.jobs import get_queue
+from services.jobs import DEFAULT_QUEUE, SYNC_QUEUE, get_queue, scan_shard_queue
+from services.sync_scheduler import ensure_status_sync_scheduled
+from settings import settings
 
 if __name__ == "__main__":
-    queue = get_queue()
-    worker = Worker([queue])
-    worker.work()
+    # `python worker.py scan-0 scan-1` runs a worker dedicated to some bulk scan shards.
+    names = sys.argv[1:] or [
+        DEFAULT_QUEUE,
+        SYNC_QUEUE,
+        *(scan_shard_queue(shard) for shard in range(settings.scan_shards)),
+    ]
+    queues = [get_queue(name) for name in names]
+    if SYNC_QUEUE in names:
+        ensure_status_sync_scheduled(get_queue(SYNC_QUEUE))
+    worker = Worker(queues, connection=queues[0].connection)
+    worker.work(with_scheduler=True)
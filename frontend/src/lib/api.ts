@@ -25,6 +25,19 @@ export async function apiFetch(path: string, options: RequestInit = {}) {
   return res.json();
 }
 
+export async function apiFetchAll<T>(path: string): Promise<T[]> {
+  const items: T[] = [];
+  const separator = path.includes("?") ? "&" : "?";
+  let cursor: string | null = null;
+  do {
+    const suffix = cursor ? `${separator}cursor=${encodeURIComponent(cursor)}` : "";
+    const page = await apiFetch(`${path}${suffix}`);
+    items.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return items;
+}
+
 export async function getAuthUrl() {
   return apiFetch("/auth/google/login");
 }
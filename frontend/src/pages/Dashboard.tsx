@@ -2,7 +2,7 @@ import { useEffect, useState } from "react";
 import { Link } from "react-router-dom";
 import AppShell from "@/components/AppShell";
 import { Button } from "@/components/ui/button";
-import { apiFetch, getGmailConnectUrl } from "@/lib/api";
+import { apiFetch, apiFetchAll, getGmailConnectUrl } from "@/lib/api";
 import { useRequireAuth } from "@/lib/auth";
 
 interface ServiceAccount {
@@ -20,7 +20,9 @@ export default function Dashboard() {
   const [loading, setLoading] = useState(false);
 
   const loadServices = async () => {
-    const data = await apiFetch("/services");
+    const data = await apiFetchAll<ServiceAccount>(
+      "/services?limit=500&fields=id,service_name,domain,first_seen_at,last_seen_at,evidence_count"
+    );
     setServices(data);
   };
 
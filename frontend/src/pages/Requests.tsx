@@ -2,7 +2,7 @@ import { useEffect, useState } from "react";
 import AppShell from "@/components/AppShell";
 import { Button } from "@/components/ui/button";
 import { Badge } from "@/components/ui/badge";
-import { apiFetch } from "@/lib/api";
+import { apiFetch, apiFetchAll } from "@/lib/api";
 import { useRequireAuth } from "@/lib/auth";
 
 interface RequestItem {
@@ -26,7 +26,9 @@ export default function Requests() {
   const [loading, setLoading] = useState(false);
 
   const loadRequests = async () => {
-    const data = await apiFetch("/requests");
+    const data = await apiFetchAll<RequestItem>(
+      "/requests?limit=500&fields=id,service_account_id,request_type,status,created_at"
+    );
     setRequests(data);
   };
 
@@ -29,9 +29,16 @@ def trigger_scan(user_id: int) -> dict:
 def list_services(user_id: int) -> list:
     """List discovered services for a user."""
     with _client() as client:
-        res = client.get("/services", headers={"X-User-Id": str(user_id)})
-        res.raise_for_status()
-        return res.json()
+        services, cursor = [], None
+        while True:
+            params = {"cursor": cursor} if cursor else {}
+            res = client.get("/services", headers={"X-User-Id": str(user_id)}, params=params)
+            res.raise_for_status()
+            page = res.json()
+            services.extend(page["items"])
+            cursor = page["next_cursor"]
+            if not cursor:
+                return services
 
 
 @mcp.tool()